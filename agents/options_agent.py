@@ -25,7 +25,7 @@ from langchain.tools import tool as lc_tool
 
 
 @lc_tool
-def analyze_technicals(ticker: str, period: str = "6mo") -> dict:
+def analyze_technicals(ticker: str, period: str = "6mo", indicators: str = None, timeframe: str = "1d") -> dict:
     """
     Run full technical analysis on a stock.
     Returns: price, trend, RSI, MACD, Bollinger Bands, Stochastic, ATR,
@@ -34,9 +34,14 @@ def analyze_technicals(ticker: str, period: str = "6mo") -> dict:
     Args:
         ticker: Stock symbol e.g. "TSLA"
         period: Data period "1mo", "3mo", "6mo", "1y"
+        indicators: Optional comma-separated subset, e.g. "rsi,macd". Choices:
+                    trend, rsi, macd, bollinger, stochastic, atr, volume, levels, signal
+        timeframe: Bar size "1d" (default), or intraday "1m", "5m", "15m", "30m", "1h"
+                   (intraday history covers the last few weeks; use period "1d"/"5d")
     """
     from tools.technical import full_technical_analysis
-    return full_technical_analysis(ticker, period=period)
+    subset = indicators.split(",") if indicators else None
+    return full_technical_analysis(ticker, period=period, indicators=subset, timeframe=timeframe)
 
 
 @lc_tool
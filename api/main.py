@@ -84,10 +84,12 @@ async def root():
             "/api/scanner/unusual",
             "/api/iv/{ticker}",
             "/api/technical/{ticker}",
+            "/api/signals",
             "/api/news/{ticker}",
             "/api/account",
             "/api/positions",
             "/api/strategy/{ticker}",
+            "/api/metrics/polygon",
             "/ws/alerts",
         ],
     }
@@ -137,15 +139,46 @@ def iv_data(ticker: str):
     return data
 
 
+@app.get("/api/iv/{ticker}/skew")
+def iv_skew(ticker: str, tenor: int = Query(30), delta: float = Query(0.25), days: int = Query(365)):
+    """Risk-reversal skew history from stored IV surfaces (e.g. 25-delta, 30-day)."""
+    from tools.iv_surface import TENORS, DELTAS, skew_history
+
+    if tenor not in TENORS or delta not in DELTAS or delta >= 0.5:
+        return {"error": f"tenor must be one of {TENORS}; delta one of {[d for d in DELTAS if d < 0.5]}"}
+    return {"ticker": ticker.upper(), "tenor": tenor, "delta": delta,
+            "history": skew_history(ticker, tenor, delta, days)}
+
+
 @app.get("/api/technical/{ticker}")
-def technical_analysis(ticker: str):
-    """Get technical analysis for a ticker."""
+def technical_analysis(
+    ticker: str,
+    indicators: str = Query(None),
+    timeframe: str = Query("1d"),
+    period: str = Query("6mo"),
+):
+    """Get technical analysis for a ticker, optionally only some indicators (e.g. ?indicators=rsi,macd)."""
     from tools.technical import full_technical_analysis
 
-    result = full_technical_analysis(ticker)
+    subset = indicators.split(",") if indicators else None
+    result = full_technical_analysis(ticker, period=period, indicators=subset, timeframe=timeframe)
     return result
 
 
+@app.get("/api/signals")
+def signals(tickers: str = Query(None)):
+    """Latest technical signals from streaming indicator state (cheap to poll every minute)."""
+    from tools.streaming import refresh_signals
+    from config import WATCHLIST
+
+    ticker_list = tickers.split(",") if tickers else WATCHLIST
+    results = refresh_signals(ticker_list)
+    return {
+        "updated": datetime.now().isoformat(),
+        "signals": results,
+    }
+
+
 @app.get("/api/news/{ticker}")
 def news(ticker: str, limit: int = Query(10)):
     """Get news for a ticker."""
@@ -182,16 +215,14 @@ def price_history(ticker: str, period: str = Query("6mo")):
     if df.empty:
         return {"ticker": ticker, "period": period, "data": []}
 
-    records = []
-    for date, row in df.iterrows():
-        records.append({
-            "time": date.strftime("%Y-%m-%d"),
-            "open": round(row["Open"], 2) if row["Open"] is not None else None,
-            "high": round(row["High"], 2) if row["High"] is not None else None,
-            "low": round(row["Low"], 2) if row["Low"] is not None else None,
-            "close": round(row["Close"], 2) if row["Close"] is not None else None,
-            "volume": int(row["Volume"]) if row["Volume"] is not None else 0,
-        })
+    times = df.index.strftime("%Y-%m-%d").tolist()
+    ohlc = df[["Open", "High", "Low", "Close"]].round(2)
+    ohlc = ohlc.astype(object).where(ohlc.notna(), None).to_numpy().tolist()
+    volumes = df["Volume"].fillna(0).astype("int64").tolist()
+    records = [
+        {"time": t, "open": o, "high": h, "low": l, "close": c, "volume": v}
+        for t, (o, h, l, c), v in zip(times, ohlc, volumes)
+    ]
     return {"ticker": ticker, "period": period, "count": len(records), "data": records}
 
 
@@ -258,6 +289,14 @@ def strategy_recommendation(
     }
 
 
+@app.get("/api/metrics/polygon")
+def polygon_metrics():
+    """Per-endpoint Polygon request counts, retries and latency histograms."""
+    from tools import polygon_client
+
+    return {"endpoints": polygon_client.latency_stats()}
+
+
 # --- WebSocket for real-time alerts ---
 
 class ConnectionManager:
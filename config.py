@@ -25,12 +25,45 @@ DEFAULT_ACCOUNT_SIZE = 10000
 DEFAULT_RISK_LEVEL = "moderate"  # conservative / moderate / aggressive
 DEFAULT_DTE = 30  # days to expiry target
 
+RISK_FREE_RATE = float(os.getenv("RISK_FREE_RATE", "0.04"))  # annual, continuous; used by the local IV/Greeks solver
+
 # --- Paths ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 REPORTS_DIR = os.path.join(BASE_DIR, "reports")
 DB_PATH = os.path.join(DATA_DIR, "iv_history.db")
+BARS_DB_PATH = os.path.join(DATA_DIR, "bars.db")
 WATCHLIST_PATH = os.path.join(DATA_DIR, "watchlist.json")
+SQLITE_BUSY_TIMEOUT = 10.0  # seconds a connection waits for another writer's lock
 
 # --- Request settings ---
-REQUEST_DELAY = 0.5
+# Polygon request quota shared by every thread in the process
+# (free tier: 5/min; paid plans are effectively unlimited but should stay polite)
+POLYGON_REQUESTS_PER_MINUTE = float(os.getenv("POLYGON_REQUESTS_PER_MINUTE", "600"))
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))  # tickers fetched in parallel
+POLYGON_POOL_SIZE = 16         # keep-alive connections kept open to api.polygon.io
+POLYGON_TIMEOUT = 10.0         # seconds, connect and read
+POLYGON_MAX_RETRIES = 4        # retries on 429 / 5xx / timeouts
+POLYGON_BACKOFF_BASE = 0.25    # seconds; doubles per attempt, full jitter
+POLYGON_BACKOFF_MAX = 8.0
+BREAKER_FAILURE_THRESHOLD = 5  # consecutive failures before an endpoint is cut off
+BREAKER_COOLDOWN = 30.0        # seconds before a tripped endpoint is tried again
+
+# --- Offline record / replay ---
+# live: talk to Polygon | record: talk to Polygon and save responses | replay: serve saved responses
+POLYGON_MODE = os.getenv("POLYGON_MODE", "live")
+POLYGON_FIXTURES_DIR = os.getenv("POLYGON_FIXTURES_DIR", os.path.join(DATA_DIR, "fixtures"))
+POLYGON_REPLAY_LATENCY_MS = float(os.getenv("POLYGON_REPLAY_LATENCY_MS", "0"))
+
+# --- Cache settings ---
+CHAIN_CACHE_TTL = float(os.getenv("CHAIN_CACHE_TTL", "300"))  # seconds
+CHAIN_CACHE_MAX_DTE = 180  # widest expiration window fetched per ticker
+QUOTE_CACHE_TTL = float(os.getenv("QUOTE_CACHE_TTL", "15"))  # seconds a snapshot price is reused
+BAR_SYNC_INTERVAL = float(os.getenv("BAR_SYNC_INTERVAL", "60"))  # seconds between bar store top-ups
+MINUTE_BAR_RETENTION_DAYS = int(os.getenv("MINUTE_BAR_RETENTION_DAYS", "30"))  # minute bars kept locally
+NEAR_ATM_ATR_MULT = 2.0  # near-ATM chain fetches bound strikes to spot +/- this many 14-day ATRs
+NEAR_ATM_MIN_BAND = 0.02  # ...but never narrower than this fraction of spot
+IV_SURFACE_CAPTURE = os.getenv("IV_SURFACE_CAPTURE", "0") == "1"  # store the full IV surface with each daily record
+IV_INDEX_LOOKBACKS = (30, 60, 126, 252)  # IV percentile/rank windows kept precomputed (days with IV)
+TA_CACHE_SIZE = int(os.getenv("TA_CACHE_SIZE", "512"))  # technical analysis results kept in memory
+TA_CACHE_DB = os.getenv("TA_CACHE_DB", "")  # SQLite path to also persist them; empty = memory only
@@ -26,6 +26,12 @@ class IVHistory(Base):
     hv20 = Column(Float)            # 20-day historical volatility
     hv60 = Column(Float)            # 60-day historical volatility
     close_price = Column(Float)
+    pk20 = Column(Float)            # Parkinson (high-low) realized vol, 20 days
+    pk60 = Column(Float)
+    gk20 = Column(Float)            # Garman-Klass realized vol, 20 days
+    gk60 = Column(Float)
+    yz20 = Column(Float)            # Yang-Zhang realized vol, 20 days
+    yz60 = Column(Float)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     __table_args__ = (
@@ -70,6 +76,22 @@ class AnalysisReport(Base):
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
 
+class TickerReference(Base):
+    """Slow-changing per-ticker reference data, refreshed once a day."""
+    __tablename__ = "ticker_reference"
+
+    ticker = Column(String(10), primary_key=True)
+    name = Column(String(200))
+    sector = Column(String(200))           # SIC description
+    market_cap = Column(Float)
+    w52_high = Column(Float)               # derived from stored daily bars
+    w52_low = Column(Float)
+    avg_volume_20d = Column(Integer)
+    refreshed_on = Column(Date, nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc))
+
+
 class TradeLog(Base):
     """Paper/live trade execution log."""
     __tablename__ = "trade_log"
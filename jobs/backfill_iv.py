@@ -0,0 +1,231 @@
+"""
+Historical IV backfill.
+
+Reconstructs iv_history for a date range, so a ticker added to the
+watchlist gets a full percentile history right away instead of growing it
+one daily record at a time:
+
+- Close and every realized vol estimator (HV20/HV60, Parkinson,
+  Garman-Klass, Yang-Zhang; see tools/realized_vol.py) per trading day come
+  from the local daily bar store.
+- ATM IV per trading day uses the call picked the way _get_atm_iv picks it:
+  the first expiry 20-45 days out, strike nearest that day's close. That
+  contract's daily close is solved for IV with tools.greeks.implied_vol.
+
+Work is split into (ticker, month) chunks, fanned out across threads under
+the shared Polygon rate limit. Each chunk's rows are bulk-inserted in one
+batch and the chunk is checkpointed in backfill_progress, so an interrupted
+run picks up where it stopped. Existing iv_history values are never
+overwritten.
+
+Usage:
+    python -m jobs.backfill_iv                          # Watchlist, last 365 days
+    python -m jobs.backfill_iv --tickers NVDA,AMD --start 2025-01-01 --end 2025-06-30
+    python -m jobs.backfill_iv --force                  # Redo checkpointed chunks
+"""
+
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from rich.console import Console
+from log import setup_logging
+
+setup_logging()
+
+from config import DB_PATH, WATCHLIST
+from tools import db, polygon_client as _client
+from tools.realized_vol import COLUMNS as VOL_COLUMNS, WARMUP_DAYS, estimate_frames
+from tools.bar_store import aggs_to_arrays, get_daily_bars
+from tools.fetch import fan_out
+from tools.greeks import implied_vol
+from tools.iv_tracker import rebuild_iv_index, store_history
+from log import get_logger
+
+console = Console()
+logger = get_logger(__name__)
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS backfill_progress (
+        ticker TEXT NOT NULL,
+        month TEXT NOT NULL,
+        first_date TEXT NOT NULL,
+        last_date TEXT NOT NULL,
+        rows INTEGER NOT NULL,
+        finished_at TEXT NOT NULL,
+        PRIMARY KEY (ticker, month)
+    );
+"""
+
+# ATM IV expiry window (days to expiry), as in iv_tracker._get_atm_iv
+_MIN_DTE, _MAX_DTE = 20, 45
+# Strikes listed around a month's closing range
+_STRIKE_BAND = 0.15
+
+
+def _get_db():
+    """This thread's pooled connection to the IV database (checkpoint table ensured once)."""
+    return db.connect(DB_PATH, _SCHEMA)
+
+
+def history_frame(ticker: str, start: str, end: str) -> pd.DataFrame:
+    """Trading days in [start, end] with Close and realized vol columns (NaN until enough history)."""
+    # Bars from before the range give the 60-day estimators their first values
+    days = (datetime.now() - datetime.strptime(start, "%Y-%m-%d")).days + WARMUP_DAYS
+    df = get_daily_bars(ticker, days)
+    if df.empty:
+        return pd.DataFrame()
+    return estimate_frames({ticker: df}, since=start)[ticker].loc[:end]
+
+
+def atm_ivs(ticker: str, dates: np.ndarray, closes: np.ndarray) -> np.ndarray:
+    """
+    ATM call IV for each trading day ("YYYY-MM-DD" dates, ascending), NaN
+    where no contract or no trade is found. Lists the month's contracts once,
+    then fetches one daily aggs series per contract used.
+    """
+    day = dates.astype("datetime64[D]")
+    today = np.datetime64(datetime.now().date())
+    exp_gte, exp_lte = day[0] + _MIN_DTE, day[-1] + _MAX_DTE
+    # Polygon lists expired and active contracts separately
+    listings = [flag for flag, wanted in ((True, exp_gte < today), (False, exp_lte >= today)) if wanted]
+    contracts = [
+        c for expired in listings
+        for c in _client.list_options_contracts(
+            underlying_ticker=ticker, contract_type="call",
+            expiration_date_gte=str(exp_gte), expiration_date_lte=str(exp_lte),
+            strike_price_gte=round(float(closes.min()) * (1 - _STRIKE_BAND), 2),
+            strike_price_lte=round(float(closes.max()) * (1 + _STRIKE_BAND), 2),
+            expired=expired, limit=1000,
+        )
+        if c.ticker and c.expiration_date and c.strike_price
+    ]
+    out = np.full(len(dates), np.nan)
+    if not contracts:
+        return out
+
+    symbols = np.array([c.ticker for c in contracts], dtype=object)
+    expiry = np.array([c.expiration_date for c in contracts], dtype="datetime64[D]")
+    strike = np.array([c.strike_price for c in contracts], dtype=np.float64)
+
+    # First expiry at least _MIN_DTE out, if it's within _MAX_DTE
+    expiries = np.unique(expiry)
+    first = np.searchsorted(expiries, day + _MIN_DTE)
+    picks: dict[int, list[int]] = {}
+    for i, e in enumerate(first):
+        if e == len(expiries) or expiries[e] > day[i] + _MAX_DTE:
+            continue
+        rows = np.flatnonzero(expiry == expiries[e])
+        picks.setdefault(int(rows[np.argmin(np.abs(strike[rows] - closes[i]))]), []).append(i)
+
+    price = np.full(len(dates), np.nan)
+    contract = np.zeros(len(dates), dtype=np.int64)
+    for j, days in picks.items():
+        aggs = _client.get_aggs(symbols[j], 1, "day", str(dates[days[0]]), str(dates[days[-1]]),
+                                adjusted=True, sort="asc", limit=50000)
+        stamps, values = aggs_to_arrays(aggs)
+        traded = dict(zip(stamps.astype("datetime64[D]").astype(str).tolist(), values[:, 3].tolist()))
+        for i in days:
+            price[i] = traded.get(dates[i], np.nan)
+            contract[i] = j
+
+    t = (expiry[contract] - day).astype(np.float64) / 365
+    return implied_vol(price, True, closes, strike[contract], t)
+
+
+def backfill_chunk(ticker: str, frame: pd.DataFrame) -> int:
+    """Reconstruct, store and checkpoint one (ticker, month) chunk. Returns rows written."""
+    dates = frame.index.strftime("%Y-%m-%d").to_numpy(dtype="U10")
+    closes = frame["Close"].to_numpy()
+    ivs = atm_ivs(ticker, dates, closes)
+
+    def opt(x):
+        return None if np.isnan(x) else float(x)
+
+    # Rows in store_history's (date, atm_iv, close_price, *realized vol) layout
+    days = dates.tolist()
+    vols = frame[list(VOL_COLUMNS)].to_numpy()
+    rows = [
+        (d, opt(iv), float(c), *(opt(v) for v in vol))
+        for d, iv, c, vol in zip(days, ivs, closes, vols)
+    ]
+    store_history(ticker, rows)
+    with _get_db() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO backfill_progress (ticker, month, first_date, last_date, rows, finished_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (ticker, days[0][:7], days[0], days[-1], len(rows), datetime.now().isoformat(timespec="seconds"))
+        )
+    return len(rows)
+
+
+def backfill(tickers: list[str], start: str, end: str, force: bool = False) -> dict:
+    """
+    Backfill iv_history for `tickers` over [start, end]. Chunks finished by
+    an earlier run are skipped unless `force`. Returns a summary.
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    frames = fan_out(lambda t: history_frame(t, start, end), tickers)
+
+    # (ticker, month) -> (first_date, last_date) covered by an earlier run
+    done = {} if force else {
+        (ticker, month): (first, last) for ticker, month, first, last in _get_db().execute(
+            "SELECT ticker, month, first_date, last_date FROM backfill_progress"
+        )
+    }
+
+    chunks, skipped, failed = [], 0, []
+    for ticker, frame in zip(tickers, frames):
+        if isinstance(frame, Exception) or frame.empty:
+            failed.append(ticker)
+            logger.warning("%s: no daily bars to backfill from (%s)", ticker, frame if isinstance(frame, Exception) else "empty")
+            continue
+        for month, part in frame.groupby(frame.index.strftime("%Y-%m")):
+            covered = done.get((ticker, month))
+            if covered and covered[0] <= part.index[0].strftime("%Y-%m-%d") \
+                    and covered[1] >= part.index[-1].strftime("%Y-%m-%d"):
+                skipped += 1
+                continue
+            chunks.append((ticker, part))
+
+    results = fan_out(lambda chunk: backfill_chunk(*chunk), chunks)
+    rows, backfilled = 0, set()
+    for (ticker, part), result in zip(chunks, results):
+        if isinstance(result, Exception):
+            failed.append(ticker)
+            logger.warning("%s %s: backfill failed - %s", ticker, part.index[0].strftime("%Y-%m"), result)
+            continue
+        rows += result
+        backfilled.add(ticker)
+
+    if backfilled:
+        rebuild_iv_index(sorted(backfilled))
+    return {
+        "chunks": len(chunks),
+        "skipped": skipped,
+        "failed": sorted(set(failed)),
+        "rows": rows,
+    }
+
+
+def main(argv: list[str] = None):
+    yesterday = datetime.now() - timedelta(days=1)
+    parser = argparse.ArgumentParser(description="Backfill historical ATM IV and HV into iv_history.")
+    parser.add_argument("--tickers", help="Comma-separated tickers (default: watchlist)")
+    parser.add_argument("--start", default=(yesterday - timedelta(days=365)).strftime("%Y-%m-%d"))
+    parser.add_argument("--end", default=yesterday.strftime("%Y-%m-%d"))
+    parser.add_argument("--force", action="store_true", help="Redo chunks already checkpointed")
+    args = parser.parse_args(argv)
+    tickers = args.tickers.split(",") if args.tickers else WATCHLIST
+
+    console.print(f"[bold]IV Backfill - {len(tickers)} tickers, {args.start} to {args.end}[/bold]")
+    summary = backfill(tickers, args.start, args.end, force=args.force)
+    console.print(f"  Chunks: {summary['chunks']} run, {summary['skipped']} already done")
+    console.print(f"  Rows written: {summary['rows']:,}")
+    if summary["failed"]:
+        console.print(f"  [red]Failed (re-run to retry): {', '.join(summary['failed'])}[/red]")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,9 @@ setup_logging()
 from config import WATCHLIST
 from tools.iv_tracker import batch_record, iv_dashboard
 from tools.unusual_activity import scan_unusual
+from tools.streaming import refresh_signals
+from tools.bar_store import sync_minute_bars
+from tools.fetch import fan_out
 from log import get_logger
 
 console = Console()
@@ -37,6 +40,17 @@ def daily_iv_collection():
     success = sum(1 for r in results if "error" not in r)
     console.print(f"  Collected: {success}/{len(WATCHLIST)} tickers")
 
+    try:
+        from tools.reference import refresh_reference
+        refs = refresh_reference(WATCHLIST)
+        console.print(f"  Reference data refreshed: {len(refs)}/{len(WATCHLIST)} tickers")
+    except ImportError as e:
+        console.print(f"  [dim]Reference cache unavailable: {e}[/dim]")
+
+    minutes = fan_out(sync_minute_bars, WATCHLIST)
+    stored = sum(m for m in minutes if isinstance(m, int))
+    console.print(f"  Minute bars stored: {stored:,}")
+
     # Print dashboard
     dash = iv_dashboard(WATCHLIST)
     for d in dash:
@@ -51,23 +65,29 @@ def daily_iv_collection():
             console.print(f" HV20={hv:.1f}%" if hv else " HV20=N/A")
 
 
-def intraday_unusual_scan():
-    """Intraday unusual activity scan. Run every 30 minutes during market hours."""
-    now_et = datetime.now(_ET)
-    # Skip weekends
+def _market_open(now_et: datetime) -> bool:
+    """Weekday and within regular hours (9:30-16:00 ET)."""
     if now_et.weekday() >= 5:
-        return
-    # Skip outside market hours (9:30-16:00 ET)
+        return False
     market_minutes = now_et.hour * 60 + now_et.minute
-    if market_minutes < 9 * 60 + 30 or market_minutes >= 16 * 60:
+    return 9 * 60 + 30 <= market_minutes < 16 * 60
+
+
+def intraday_unusual_scan():
+    """
+    Intraday unusual activity scan. Run every 30 minutes during market hours.
+    Only flow since the previous scan is considered, so a contract alerts once, when it trades.
+    """
+    now_et = datetime.now(_ET)
+    if not _market_open(now_et):
         return
     now = now_et
 
     console.print(f"\n[bold]Unusual Activity Scan - {now.strftime('%H:%M')}[/bold]")
 
-    results = scan_unusual(WATCHLIST)
+    results = scan_unusual(WATCHLIST, incremental=True)
     if results:
-        console.print(f"  Found {len(results)} alerts")
+        console.print(f"  Found {len(results)} alerts on new flow")
         for r in results[:5]:
             console.print(
                 f"  {r.get('ticker')} {r.get('type')} "
@@ -78,6 +98,18 @@ def intraday_unusual_scan():
         console.print("  No unusual activity detected")
 
 
+def intraday_signal_refresh():
+    """Refresh technical signals from streaming indicator state. Run every minute during market hours."""
+    if not _market_open(datetime.now(_ET)):
+        return
+
+    signals = refresh_signals(WATCHLIST)
+    ok = [s for s in signals if "error" not in s]
+    bullish = sum(1 for s in ok if s["signal"] == "bullish")
+    bearish = sum(1 for s in ok if s["signal"] == "bearish")
+    logger.info("Signals refreshed for %d tickers: %d bullish, %d bearish", len(ok), bullish, bearish)
+
+
 def run_once():
     """Run all collection tasks once."""
     console.print("[bold]Running one-time data collection...[/bold]")
@@ -142,11 +174,13 @@ def run_scheduler():
     console.print("[bold]Starting scheduled data collector...[/bold]")
     console.print("  IV collection: daily at 17:00")
     console.print("  Unusual scan: every 30 minutes during market hours")
+    console.print("  Signal refresh: every minute during market hours")
     console.print("  Press Ctrl+C to stop\n")
 
     # Schedule tasks
     schedule.every().day.at("17:00").do(daily_iv_collection)
     schedule.every(30).minutes.do(intraday_unusual_scan)
+    schedule.every(1).minutes.do(intraday_signal_refresh)
 
     # Run IV collection immediately on first start
     daily_iv_collection()
@@ -154,7 +188,7 @@ def run_scheduler():
     try:
         while True:
             schedule.run_pending()
-            time.sleep(60)
+            time.sleep(1)
     except KeyboardInterrupt:
         console.print("\n[bold]Scheduler stopped.[/bold]")
 
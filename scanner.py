@@ -9,6 +9,7 @@ from config import WATCHLIST, DEFAULT_ACCOUNT_SIZE, DEFAULT_RISK_LEVEL, DEFAULT_
 from tools.iv_tracker import batch_record, iv_dashboard
 from tools.unusual_activity import scan_unusual
 from tools.technical import full_technical_analysis
+from tools.indicator_panel import technical_panel
 from tools.strategy import recommend_strategies
 from tools.market_data import get_current_price
 from agent import full_analysis
@@ -47,13 +48,10 @@ def daily_scan():
 
     # Step 3: Quick technical overview
     console.print("[bold cyan]Step 3: Technical Overview[/bold cyan]")
-    tech_summary = []
-    for ticker in WATCHLIST:
-        try:
-            ta = full_technical_analysis(ticker)
-            tech_summary.append(ta)
-        except Exception as e:
-            console.print(f"  [red]{ticker}: Error - {e}[/red]")
+    tech_summary = technical_panel(WATCHLIST)
+    for ta in tech_summary:
+        if "error" in ta:
+            console.print(f"  [red]{ta['error']}[/red]")
     _print_tech_overview(tech_summary)
 
     # Step 4: Scan unusual activity
@@ -170,19 +168,24 @@ def _print_iv_dashboard(data):
     table.add_column("Close")
     table.add_column("IV%")
     table.add_column("HV20%")
+    table.add_column("YZ20%")
     table.add_column("IV-HV")
+    table.add_column("IV-YZ")
 
     for d in data:
         if "status" in d:
-            table.add_row(d["ticker"], "", "", "", d["status"])
+            table.add_row(d["ticker"], "", "", "", "", "", d["status"])
         else:
             iv_hv = d.get("iv_hv_diff")
+            iv_yz = d.get("iv_yz_diff")
             table.add_row(
                 d["ticker"],
                 f"${d['close']:.2f}" if d.get("close") else "N/A",
                 f"{d['current_iv']:.1f}" if d.get("current_iv") else "N/A",
                 f"{d['hv20']:.1f}" if d.get("hv20") else "N/A",
+                f"{d['yz20']:.1f}" if d.get("yz20") else "N/A",
                 f"{iv_hv:+.1f}" if iv_hv is not None else "N/A",
+                f"{iv_yz:+.1f}" if iv_yz is not None else "N/A",
             )
 
     console.print(table)
@@ -0,0 +1,1216 @@
+"""Offline tests for data-layer components (no API keys required)."""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+from polygon.rest.models import OptionContractSnapshot
+
+
+def _snapshot(ctype, days, strike, volume=100, oi=1000, iv=0.3, bid=1.0, ask=1.2):
+    expiry = (datetime.now() + timedelta(days=days)).strftime("%Y-%m-%d")
+    return OptionContractSnapshot.from_dict({
+        "details": {
+            "contract_type": ctype, "expiration_date": expiry,
+            "strike_price": strike, "ticker": f"O:TEST{expiry}{ctype[0]}{strike}",
+        },
+        "day": {"volume": volume},
+        "open_interest": oi,
+        "implied_volatility": iv,
+        "last_quote": {"bid": bid, "ask": ask, "midpoint": (bid + ask) / 2},
+    })
+
+
+def _sample_chain():
+    snaps = []
+    for days in (10, 40):
+        for strike in (90, 95, 100, 105, 110):
+            snaps.append(_snapshot("call", days, strike, volume=strike, oi=2 * strike))
+            snaps.append(_snapshot("put", days, strike, volume=strike // 2, oi=strike))
+    return snaps
+
+
+# --- ChainFrame ---
+
+def test_chain_frame_atm_and_totals():
+    from tools.chain_frame import ChainFrame
+
+    frame = ChainFrame.from_snapshots(_sample_chain())
+    assert len(frame) == 20
+
+    nearest = frame.expirations()[0]
+    i = frame.atm_index(101.0, nearest, "call")
+    assert frame.strike[i] == 100 and frame.expiration[i] == nearest
+
+    totals = frame.totals()
+    assert totals["call_volume"] == 2 * sum((90, 95, 100, 105, 110))
+    vol_ratio, oi_ratio = frame.put_call_ratios()
+    assert abs(oi_ratio - 0.5) < 1e-9
+
+    per_expiry = frame.by_expiry()
+    assert [e["contracts"] for e in per_expiry] == [10, 10]
+
+
+def test_chain_frame_select_and_missing_values():
+    from tools.chain_frame import ChainFrame
+
+    snaps = _sample_chain() + [_snapshot("call", 10, 120, iv=None)]
+    frame = ChainFrame.from_snapshots(snaps)
+
+    view = frame.select(contract_type="put", strike_gte=95, strike_lte=105)
+    assert len(view) == 6 and (view.contract_type == "put").all()
+
+    assert np.isnan(frame.iv[-1])
+    assert frame.atm_index(125.0, require_iv=True) != len(frame) - 1
+    assert frame.record(len(frame) - 1)["iv"] is None
+
+
+# --- Fetch engine ---
+
+def test_token_bucket_limits_rate():
+    import time
+    from tools.fetch import TokenBucket
+
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # First token is free, the remaining five need 1/50 s each
+    assert time.monotonic() - start >= 0.09
+
+
+def test_fan_out_runs_concurrently_in_order():
+    import time
+    from tools.fetch import fan_out
+
+    def work(x):
+        time.sleep(0.1)
+        if x == 3:
+            raise ValueError("boom")
+        return x * 2
+
+    start = time.monotonic()
+    results = fan_out(work, range(6), concurrency=6)
+    assert time.monotonic() - start < 0.4
+    assert results[:3] == [0, 2, 4] and isinstance(results[3], ValueError)
+
+
+# --- Bar store ---
+
+class _Agg:
+    def __init__(self, day: datetime, close: float):
+        self.timestamp = int(day.replace(hour=5).timestamp() * 1000)
+        self.open = self.high = self.low = self.close = close
+        self.volume = 1000
+
+
+def test_bar_store_fetches_only_new_days(tmp_path, monkeypatch):
+    from tools import bar_store
+
+    calls = []
+
+    def fake_aggs(ticker, mult, span, from_date, to_date, **kwargs):
+        calls.append((from_date, to_date))
+        days = (datetime.strptime(to_date, "%Y-%m-%d") - datetime.strptime(from_date, "%Y-%m-%d")).days
+        first = datetime.strptime(from_date, "%Y-%m-%d")
+        return [_Agg(first + timedelta(days=i), 100 + i) for i in range(days + 1)]
+
+    monkeypatch.setattr(bar_store, "BARS_DB_PATH", str(tmp_path / "bars.db"))
+    monkeypatch.setattr(bar_store, "BAR_SYNC_INTERVAL", 0)
+    monkeypatch.setattr(bar_store._client, "get_aggs", fake_aggs)
+    bar_store._last_sync.clear()
+
+    df = bar_store.get_daily_bars("test", 30)
+    assert list(df.columns) == ["Open", "High", "Low", "Close", "Volume"]
+    assert len(calls) == 1 and len(df) == 31
+
+    bar_store.get_daily_bars("TEST", 30)
+    # Second read only re-fetches from the last stored bar
+    assert calls[1][0] == calls[1][1] == datetime.now().strftime("%Y-%m-%d")
+
+
+def test_bar_store_failed_fetch_leaves_no_open_transaction(tmp_path, monkeypatch):
+    from tools import bar_store
+
+    def list_aggs(*args, **kwargs):
+        yield from (_Agg(datetime(2025, 6, 2) + timedelta(minutes=i), 100) for i in range(2))
+        raise ConnectionError("dropped")
+
+    monkeypatch.setattr(bar_store, "BARS_DB_PATH", str(tmp_path / "bars.db"))
+    monkeypatch.setattr(bar_store, "_MINUTE_CHUNK", 2)
+    monkeypatch.setattr(bar_store._client, "list_aggs", list_aggs, raising=False)
+
+    conn = bar_store._get_db()
+    try:
+        bar_store._fetch_minutes_into(conn, "TEST", "2025-06-02", "2025-06-02")
+        assert False, "fetch should fail"
+    except ConnectionError:
+        pass
+    # The page stored before the failure is committed, nothing is left pending
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM minute_bars").fetchone()[0] == 2
+
+
+# --- Quotes ---
+
+def test_current_prices_use_one_bulk_snapshot(monkeypatch):
+    from polygon.rest.models import TickerSnapshot
+    from tools import market_data
+
+    calls = []
+
+    def fake_snapshot_all(market, tickers=None):
+        calls.append(tickers)
+        return [
+            TickerSnapshot.from_dict({"ticker": t, "lastTrade": {"p": 10.0 + i}})
+            for i, t in enumerate(tickers) if t != "GONE"
+        ]
+
+    monkeypatch.setattr(market_data._client, "get_snapshot_all", fake_snapshot_all)
+    monkeypatch.setattr(market_data._client, "get_previous_close_agg", lambda t: [])
+    market_data._quotes.clear()
+
+    prices = market_data.get_current_prices(["aaa", "BBB", "GONE"])
+    assert prices == {"AAA": 10.0, "BBB": 11.0, "GONE": 0.0}
+    assert market_data.get_current_price("bbb") == 11.0
+    assert market_data.get_current_price("GONE") == 0.0
+    # Cached tickers are not requested again; the unknown one is retried
+    assert calls == [["AAA", "BBB", "GONE"], ["GONE"]]
+
+
+def test_aggs_to_frame_and_shared_slices(tmp_path, monkeypatch):
+    from tools import bar_store
+
+    first = datetime.now() - timedelta(days=40)
+    aggs = [_Agg(first + timedelta(days=i), 100 + i) for i in range(41)]
+    df = bar_store.aggs_to_frame(aggs, float32=True)
+    assert df["Close"].dtype == np.float32 and len(df) == 41
+
+    monkeypatch.setattr(bar_store, "BARS_DB_PATH", str(tmp_path / "bars.db"))
+    monkeypatch.setattr(bar_store._client, "get_aggs", lambda *a, **k: aggs)
+    for cache in (bar_store._last_sync, bar_store._coverage, bar_store._frames):
+        cache.clear()
+
+    wide = bar_store.get_daily_bars("TEST", 40)
+    narrow = bar_store.get_daily_bars("TEST", 10)
+    assert len(narrow) < len(wide)
+    assert np.shares_memory(wide["Close"].to_numpy(), narrow["Close"].to_numpy())
+    assert not wide.to_numpy().flags.writeable
+
+
+# --- Resilient client ---
+
+class _FakeResponse:
+    def __init__(self, status, data=b"{}", headers=None):
+        self.status = status
+        self.data = data
+        self.headers = headers or {}
+
+
+class _FakePool:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def request(self, method, url, fields=None, headers=None):
+        self.calls += 1
+        return _FakeResponse(self.statuses.pop(0))
+
+
+def test_transport_retries_then_trips_breaker(monkeypatch):
+    from tools import client
+
+    monkeypatch.setattr(client, "POLYGON_BACKOFF_BASE", 0.001)
+    monkeypatch.setattr(client.time, "sleep", lambda s: None)
+
+    pool = _FakePool([429, 503, 200])
+    transport = client._ResilientTransport(pool)
+    resp = transport.request("GET", "https://api.polygon.io/v2/aggs/ticker/AAPL/range/1/day/2025-01-01/2025-02-01")
+    assert resp.status == 200 and pool.calls == 3
+    stats = transport.latency_stats()["/v2/aggs/ticker/range/day"]
+    assert stats["requests"] == 3 and stats["retries"] == 2
+
+    pool.statuses = [500] * 20
+    transport.request("GET", "https://api.polygon.io/v3/snapshot/options/SPY")
+    try:
+        transport.request("GET", "https://api.polygon.io/v3/snapshot/options/QQQ")
+        assert False, "breaker should be open"
+    except client.CircuitOpenError:
+        pass
+
+
+# --- Record / replay ---
+
+def test_record_then_replay_round_trip(tmp_path):
+    from datetime import date
+    from tools.client import PolygonClient
+    from tools.replay import RecordingPool, ReplayPool, request_key
+
+    def body(close):
+        return ('{"results": [{"t": 1700000000000, "c": %s, "o": 100, "h": 102, "l": 99, "v": 5}], '
+                '"status": "OK"}' % close).encode()
+
+    class _Upstream:
+        def request(self, method, url, fields=None, headers=None, **kwargs):
+            # Each range answers with its own bar
+            return _FakeResponse(200, body(101.5 if "2025-01-01" in url else 99.5))
+
+    live = PolygonClient(api_key="test", pool=RecordingPool(_Upstream(), str(tmp_path), today=date(2025, 2, 1)))
+    history = live.get_aggs("AAPL", 1, "day", "2025-01-01", "2025-02-01")
+    top_up = live.get_aggs("AAPL", 1, "day", "2025-01-31", "2025-02-01")
+
+    # Dates are keyed relative to the day, so a later run with the same relative windows still hits
+    replay = PolygonClient(api_key="test", pool=ReplayPool(str(tmp_path), today=date(2025, 4, 1)))
+    assert [a.close for a in replay.get_aggs("AAPL", 1, "day", "2025-03-01", "2025-04-01")] == \
+        [a.close for a in history] == [101.5]
+    assert [a.close for a in replay.get_aggs("AAPL", 1, "day", "2025-03-31", "2025-04-01")] == \
+        [a.close for a in top_up] == [99.5]
+
+    assert request_key("https://x/v1/a/2025-01-01?b=2", {"a": 1}, date(2025, 1, 3)) == "/v1/a/<today-2>?a=1&b=2"
+    missing = ReplayPool(str(tmp_path)).request("GET", "https://api.polygon.io/v3/reference/tickers/NONE")
+    assert missing.status == 404
+
+
+# --- Reference data ---
+
+def test_reference_cache_reads_locally_until_stale(tmp_path, monkeypatch):
+    import sys
+    from datetime import date
+    from types import SimpleNamespace
+    from sqlalchemy import create_engine
+    from data import models
+    from tools import bar_store, market_data, reference
+
+    calls = []
+
+    def fake_details(ticker):
+        calls.append(ticker)
+        return SimpleNamespace(name=f"{ticker} Inc", sic_description="Software", market_cap=1e9)
+
+    first = datetime.now() - timedelta(days=40)
+    bars = [_Agg(first + timedelta(days=i), 100 + i) for i in range(41)]
+    monkeypatch.setattr(models, "_engine", create_engine(f"sqlite:///{tmp_path / 'ref.db'}"))
+    monkeypatch.setattr(models, "_SessionFactory", None)
+    monkeypatch.setattr(reference, "_schema_ready", False)
+    monkeypatch.setattr(market_data._client, "get_ticker_details", fake_details)
+    monkeypatch.setattr(market_data, "get_daily_bars", lambda t, d: bar_store.aggs_to_frame(bars))
+
+    refs = reference.refresh_reference(["aaa", "bbb"])
+    assert set(refs) == {"AAA", "BBB"} and refs["AAA"]["52w_high"] == 140.0
+
+    info = reference.get_reference("aaa")
+    assert info["name"] == "AAA Inc" and info["avg_volume"] == 1000
+    assert calls == ["AAA", "BBB"]
+
+    # A row from an earlier day is refreshed on read
+    session = models.get_session()
+    session.get(models.TickerReference, "BBB").refreshed_on = date(2000, 1, 1)
+    session.commit()
+    session.close()
+    assert reference.get_reference("BBB")["refreshed_on"] == date.today().isoformat()
+    assert calls == ["AAA", "BBB", "BBB"]
+
+    # Without the DB layer (SQLAlchemy), stock info falls back to a direct lookup
+    monkeypatch.setitem(sys.modules, "tools.reference", None)
+    info = market_data.get_stock_info("CCC")
+    assert info["name"] == "CCC Inc" and info["52w_low"] == 100.0 and calls[-1] == "CCC"
+
+
+# --- Shared chain cache ---
+
+def test_chain_cache_shares_fetches_until_stale(monkeypatch):
+    from types import SimpleNamespace
+    from tools import chain_store
+
+    calls = []
+
+    def fake_chain(ticker, params=None):
+        calls.append(params)
+        return iter(_sample_chain())
+
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(chain_store._client, "list_snapshot_options_chain", fake_chain)
+    monkeypatch.setattr(chain_store, "time", SimpleNamespace(monotonic=lambda: clock["now"]))
+    chain_store.invalidate()
+
+    # Two callers in one run share the single wide-window fetch
+    near_calls = chain_store.get_chain("test", *chain_store.dte_window(0, 30), contract_type="call")
+    puts = chain_store.get_chain("TEST", contract_type="put")
+    assert len(calls) == 1 and len(near_calls) == 5 and len(puts) == 10
+
+    # TTL expiry refetches
+    clock["now"] += chain_store.CHAIN_CACHE_TTL + 1
+    chain_store.get_chain("TEST")
+    assert len(calls) == 2
+
+    # A cache filled on an earlier day refetches, in get_chain and in the ATM lookup
+    fetched_at, _, lte, frame = chain_store._cache["TEST"]
+    chain_store._cache["TEST"] = (fetched_at, "2000-01-01", lte, frame)
+    monkeypatch.setattr(chain_store, "strike_band", lambda t, price: (90.0, 110.0))
+    atm = chain_store.get_atm_contracts("TEST", 100.0, *chain_store.dte_window(0, 30))
+    assert len(calls) == 3 and "strike_price.gte" in calls[-1] and len(atm) == 2
+    chain_store.get_chain("TEST")
+    assert len(calls) == 4 and "strike_price.gte" not in calls[-1]
+
+    # Windows wider than CHAIN_CACHE_MAX_DTE bypass the cache every time
+    wide = chain_store.dte_window(0, chain_store.CHAIN_CACHE_MAX_DTE + 30)
+    chain_store.get_chain("TEST", *wide)
+    chain_store.get_chain("TEST", *wide)
+    assert len(calls) == 6 and chain_store._cache["TEST"][0] == clock["now"]
+
+
+# --- Near-ATM chain fetch ---
+
+def test_atm_fetch_bounds_strikes_and_stops_early(monkeypatch):
+    import pandas as pd
+    from tools import chain_store, market_data
+
+    snaps = sorted(
+        (_snapshot(t, days, strike) for days in (25, 32, 39)
+         for t in ("call", "put") for strike in range(80, 121)),
+        # Same order as sorting real (zero-padded) option tickers
+        key=lambda o: (o.details.expiration_date, o.details.contract_type, o.details.strike_price),
+    )
+    seen = {"n": 0}
+    requests = []
+
+    def fake_chain(ticker, params=None):
+        requests.append(params)
+        for o in snaps:
+            if params["strike_price.gte"] <= o.details.strike_price <= params["strike_price.lte"]:
+                if params.get("contract_type") in (None, o.details.contract_type):
+                    seen["n"] += 1
+                    yield o
+
+    bars = pd.DataFrame({"High": [101.0] * 20, "Low": [99.0] * 20, "Close": [100.0] * 20})
+    monkeypatch.setattr(chain_store, "get_daily_bars", lambda t, d: bars)
+    monkeypatch.setattr(chain_store._client, "list_snapshot_options_chain", fake_chain)
+    chain_store.invalidate()
+
+    gte, lte = chain_store.dte_window(20, 45)
+    atm = chain_store.get_atm_contracts("TEST", 100.4, gte, lte, contract_type="call")
+    # ATR is 2 -> band 100.4 +/- 4
+    assert (requests[0]["strike_price.gte"], requests[0]["strike_price.lte"]) == (96.4, 104.4)
+    assert len(atm) == 1 and atm.strike[0] == 100 and atm.expiration[0] == atm.expirations()[0]
+    # Stream abandoned right after the first strike above spot in the first expiry
+    assert seen["n"] == 5
+
+    both = chain_store.get_atm_contracts("TEST", 100.6, gte, lte)
+    assert sorted(both.contract_type.tolist()) == ["call", "put"] and set(both.strike) == {101}
+
+    # get_options_chain's ATM-only mode takes the same bounded fetch
+    monkeypatch.setattr(market_data, "get_current_price", lambda t: 100.6)
+    requests.clear()
+    chain = market_data.get_options_chain("TEST", atm_only=True)
+    assert len(requests) == 1 and requests[0]["strike_price.lte"] == 104.6
+    assert chain["atm_call"]["strike"] == chain["atm_put"]["strike"] == 101
+    assert chain["expirations"] == [snaps[0].details.expiration_date]
+
+
+def test_atm_fetch_stops_after_a_one_sided_expiry(monkeypatch):
+    import pandas as pd
+    from tools import chain_store
+
+    # The first expiry only lists calls inside the strike band
+    snaps = [_snapshot("call", 25, k) for k in (98, 99, 100)] + [
+        _snapshot(t, days, k) for days in (32, 39) for t in ("call", "put") for k in (99, 100, 101)
+    ]
+    seen = {"n": 0}
+
+    def fake_chain(ticker, params=None):
+        for o in snaps:
+            seen["n"] += 1
+            yield o
+
+    monkeypatch.setattr(chain_store, "get_daily_bars", lambda t, d: pd.DataFrame())
+    monkeypatch.setattr(chain_store._client, "list_snapshot_options_chain", fake_chain)
+    chain_store.invalidate()
+
+    gte, lte = chain_store.dte_window(20, 45)
+    atm = chain_store.get_atm_contracts("TEST", 100.5, gte, lte)
+    assert atm.contract_type.tolist() == ["call"] and atm.strike.tolist() == [100]
+    assert atm.expirations() == [snaps[0].details.expiration_date]
+    # Stopped at the first contract of the next expiry instead of paging everything
+    assert seen["n"] == 4
+
+
+# --- Indicator panel ---
+
+def test_indicator_panel_matches_single_ticker_analysis(monkeypatch):
+    import pandas as pd
+    from tools import technical
+    from tools.indicator_panel import panel_analysis
+
+    rng = np.random.default_rng(7)
+    frames = {}
+    for k, n in enumerate((126, 60, 30)):
+        close = 100 + np.cumsum(rng.normal(0, 1, n))
+        frames[f"T{k}"] = pd.DataFrame({
+            "Open": close, "High": close + rng.random(n), "Low": close - rng.random(n),
+            "Close": close, "Volume": rng.integers(100_000, 1_000_000, n).astype(float),
+        }, index=pd.bdate_range(end="2025-06-30", periods=n))
+
+    panel = panel_analysis(frames)
+    for ticker, df in frames.items():
+        monkeypatch.setattr(technical, "get_stock_data", lambda *a, **k: df)
+        expected = technical.full_technical_analysis(ticker)
+        got = panel[ticker]
+        assert got.keys() == expected.keys()
+        for key, value in expected.items():
+            if isinstance(value, float):
+                assert np.isclose(got[key], value, rtol=1e-10), key
+            else:
+                assert got[key] == value, key
+
+
+# --- Streaming indicators ---
+
+def test_streaming_state_matches_batch_and_persists(tmp_path, monkeypatch):
+    import pandas as pd
+    from tools import streaming, technical
+
+    rng = np.random.default_rng(11)
+    n = 130
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    high, low = close + rng.random(n), close - rng.random(n)
+    volume = rng.integers(100_000, 1_000_000, n).astype(float)
+    index = pd.bdate_range(end=datetime.now().strftime("%Y-%m-%d"), periods=n)
+    df = pd.DataFrame({"Open": close, "High": high, "Low": low, "Close": close, "Volume": volume}, index=index)
+
+    monkeypatch.setattr(technical, "get_stock_data", lambda *a, **k: df)
+    expected = technical.full_technical_analysis("TEST")
+
+    monkeypatch.setattr(streaming, "BARS_DB_PATH", str(tmp_path / "bars.db"))
+    monkeypatch.setattr(streaming, "get_daily_bars", lambda t, d: df)
+    # Today's bar arrives as a live snapshot and is only previewed
+    monkeypatch.setattr(streaming, "get_intraday_bars",
+                        lambda tickers: {"TEST": (close[-1], high[-1], low[-1], close[-1], volume[-1])})
+    streaming._states.clear()
+
+    today = index[-1].strftime("%Y-%m-%d")
+    monkeypatch.setattr(streaming, "datetime", type("_dt", (), {
+        "now": staticmethod(lambda: datetime.strptime(today, "%Y-%m-%d")),
+        "strptime": datetime.strptime, "fromordinal": datetime.fromordinal,
+    }))
+    got = streaming.refresh_signals(["test"])[0]
+    for key, value in expected.items():
+        if isinstance(value, float):
+            assert np.isclose(got[key], value, rtol=1e-9), key
+        else:
+            assert got[key] == value, key
+
+    # The committed state (through yesterday) was persisted and reloads identically
+    state = streaming._states.pop("TEST")
+    assert state.n == n - 1 and state.last_date == index[-2].strftime("%Y-%m-%d")
+    reloaded = streaming._load_state("TEST")
+    assert reloaded.result("TEST") == state.result("TEST")
+
+
+def test_streaming_state_skips_catch_up_after_a_market_holiday(tmp_path, monkeypatch):
+    import pandas as pd
+    from tools import streaming
+
+    rng = np.random.default_rng(12)
+    index = pd.bdate_range(end="2025-08-28", periods=60)  # Friday's bar not stored yet
+    close = 100 + np.cumsum(rng.normal(0, 1, len(index)))
+    df = pd.DataFrame({"Open": close, "High": close + 1, "Low": close - 1, "Close": close, "Volume": 1e6},
+                      index=index)
+    stored = {"last": "2025-08-28"}
+    loads = []
+
+    monkeypatch.setattr(streaming, "BARS_DB_PATH", str(tmp_path / "bars.db"))
+    monkeypatch.setattr(streaming, "get_daily_bars", lambda t, d: loads.append(t) or df)
+    monkeypatch.setattr(streaming, "last_bar_date", lambda t, before=None: stored["last"])
+    streaming._states.clear()
+    streaming._caught_up.clear()
+
+    # Tuesday after Labor Day: one catch-up, then every refresh reuses the state
+    for _ in range(3):
+        state, _ = streaming.get_state("test", "2025-09-02")
+    assert state.last_date == "2025-08-28" and loads == ["TEST"]
+
+    # Friday's bar landing in the store triggers another catch-up
+    df = pd.concat([df, df.iloc[-1:].set_axis(pd.DatetimeIndex(["2025-08-29"]))])
+    stored["last"] = "2025-08-29"
+    state, changed = streaming.get_state("test", "2025-09-02")
+    assert changed and state.last_date == "2025-08-29" and loads == ["TEST", "TEST"]
+
+
+# --- Indicator graph ---
+
+def test_indicator_graph_matches_ta_and_computes_only_requested(monkeypatch):
+    import pandas as pd
+    import ta
+    from tools import technical
+    from tools.indicator_graph import IndicatorGraph
+
+    rng = np.random.default_rng(5)
+    n = 120
+    close = pd.Series(100 + np.cumsum(rng.normal(0, 1, n)))
+    df = pd.DataFrame({"High": close + rng.random(n), "Low": close - rng.random(n),
+                       "Close": close, "Volume": rng.integers(1_000, 9_000, n).astype(float)})
+    g = IndicatorGraph(df)
+
+    macd = ta.trend.MACD(close)
+    bb = ta.volatility.BollingerBands(close, window=20, window_dev=2)
+    stoch = ta.momentum.StochasticOscillator(df["High"], df["Low"], close, window=14, smooth_window=3)
+    atr = ta.volatility.average_true_range(df["High"], df["Low"], close, window=14)
+    pairs = [
+        ("rsi", ta.momentum.rsi(close, window=14)), ("macd", macd.macd()),
+        ("macd_signal", macd.macd_signal()), ("macd_hist", macd.macd_diff()),
+        ("bb_upper", bb.bollinger_hband()), ("bb_lower", bb.bollinger_lband()),
+        ("stoch_k", stoch.stoch()), ("stoch_d", stoch.stoch_signal()), ("atr", atr.where(atr > 0)),
+    ]
+    for name, expected in pairs:
+        assert np.allclose(g[name], expected, rtol=1e-10, equal_nan=True), name
+    # SMA20 is shared with the Bollinger middle band
+    assert g["sma20"] is g["sma20"] and np.allclose(g["sma20"], bb.bollinger_mavg(), equal_nan=True)
+
+    monkeypatch.setattr(technical, "get_stock_data", lambda *a, **k: df)
+    built = []
+    monkeypatch.setattr(technical, "IndicatorGraph", lambda d: built.append(IndicatorGraph(d)) or built[-1])
+    result = technical.full_technical_analysis("TEST", indicators=["rsi"])
+    assert set(result) == {"ticker", "current_price", "change", "change_pct", "rsi", "rsi_signal"}
+    assert "macd" not in built[0].computed() and "atr" not in built[0].computed()
+    assert "error" in technical.full_technical_analysis("TEST", indicators=["nope"])
+
+
+# --- Minute bars / resampling ---
+
+def test_resampler_and_intraday_frame(tmp_path, monkeypatch):
+    from datetime import timezone
+    from tools import bar_store
+    from tools.resample import resample, resample_many
+
+    # 2 hours of minute bars starting on a half-hour boundary
+    start = int(datetime.now().replace(minute=0, second=0, microsecond=0).timestamp() * 1000) - 3 * 3600_000 + 1800_000
+    rows = [(start + i * 60_000, 100 + i, 100.5 + i, 99.5 + i, 100.2 + i, 10.0) for i in range(120)]
+
+    five = list(resample(iter(rows), 5))
+    assert len(five) == 24
+    ts, o, h, l, c, v = five[1]
+    assert ts == start + 5 * 60_000 and o == 105 and h == 109.5 and l == 104.5 and c == 109.2 and v == 50
+    many = resample_many(iter(rows), ["15m", "1h"])
+    assert len(many["15m"]) == 8 and len(many["1h"]) == 2 and many["1h"][0][5] == 600
+    # Hourly buckets open with the 9:30 ET session (13:30 UTC in summer)
+    open_ms = int(datetime(2025, 6, 2, 13, 30, tzinfo=timezone.utc).timestamp() * 1000)
+    session = [(open_ms + i * 60_000, 1.0, 1.0, 1.0, 1.0, 1.0) for i in range(390)]
+    hourly = list(resample(iter(session), 60))
+    assert hourly[0][0] == open_ms and [b[5] for b in hourly] == [60.0] * 6 + [30.0]
+
+    class _Minute:
+        def __init__(self, row):
+            self.timestamp, self.open, self.high, self.low, self.close, self.volume = row
+
+    calls = []
+
+    def fake_list_aggs(ticker, mult, span, from_date, to_date, **kwargs):
+        calls.append((span, from_date, to_date))
+        return (_Minute(r) for r in rows)
+
+    monkeypatch.setattr(bar_store, "BARS_DB_PATH", str(tmp_path / "bars.db"))
+    monkeypatch.setattr(bar_store, "_MINUTE_CHUNK", 7)
+    monkeypatch.setattr(bar_store._client, "list_aggs", fake_list_aggs)
+    bar_store._minute_sync.clear()
+
+    df = bar_store.get_intraday_frame("TEST", "15m", days=1)
+    assert len(df) == 8 and df["Volume"].iloc[0] == 150 and str(df.index.tz) == "UTC"
+    # A second read inside the sync interval is served from the store
+    bar_store.get_intraday_frame("test", "1h", days=1)
+    assert len(calls) == 1 and calls[0][0] == "minute"
+
+
+# --- Backtest ---
+
+def test_backtest_scores_match_latest_bar_analysis(monkeypatch):
+    import pandas as pd
+    from tools import technical
+    from tools.backtest import SIGNALS, bucket_stats, composite_scores
+    from tools.indicator_panel import align
+
+    rng = np.random.default_rng(1)
+    frames = {}
+    for k, n in enumerate((150, 70)):
+        close = 100 + np.cumsum(rng.normal(0, 2, n))
+        volume = rng.integers(100_000, 1_000_000, n).astype(float)
+        volume[::7] *= 3
+        frames[f"T{k}"] = pd.DataFrame({
+            "Open": close, "High": close + 2 * rng.random(n), "Low": close - 2 * rng.random(n),
+            "Close": close, "Volume": volume,
+        }, index=pd.bdate_range(end="2025-06-30", periods=n))
+
+    names, p, lengths = align(frames)
+    scores = composite_scores(p)
+    rows = len(p["Close"])
+    for j, ticker in enumerate(names):
+        df = frames[ticker]
+        for cut in range(30, len(df) + 1, 7):
+            monkeypatch.setattr(technical, "get_stock_data", lambda *a, **k: df.iloc[:cut])
+            expected = technical.full_technical_analysis(ticker)
+            r = rows - len(df) + cut - 1
+            assert SIGNALS[scores["signal"][r, j]] == expected["signal"], (ticker, cut)
+            assert scores["strength"][r, j] == expected["strength"], (ticker, cut)
+
+    buckets = bucket_stats(scores, p["Close"], ~np.isnan(p["Close"]), horizons=(5,))
+    assert sum(b["bars"] for b in buckets) == 220
+    assert all(b["fwd_5"]["n"] <= b["bars"] for b in buckets)
+
+
+# --- TA result cache ---
+
+def test_ta_cache_hits_until_a_new_bar_lands(tmp_path, monkeypatch):
+    import pandas as pd
+    from tools import ta_cache, technical
+
+    monkeypatch.setattr(ta_cache, "TA_CACHE_DB", str(tmp_path / "ta.db"))
+    ta_cache.clear()
+    rng = np.random.default_rng(11)
+    close = 100 + np.cumsum(rng.normal(0, 1, 80))
+    df = pd.DataFrame({"Open": close, "High": close + 1, "Low": close - 1, "Close": close,
+                       "Volume": np.full(80, 1e6)}, index=pd.bdate_range(end="2025-06-30", periods=80))
+    bars = {"df": df}
+    monkeypatch.setattr(technical, "get_stock_data", lambda *a, **k: bars["df"])
+    built = []
+    real_graph = technical.IndicatorGraph
+    monkeypatch.setattr(technical, "IndicatorGraph", lambda d: built.append(d) or real_graph(d))
+
+    first = technical.full_technical_analysis("CACHE")
+    first["rsi"] = -1  # callers get copies
+    again = technical.full_technical_analysis("CACHE")
+    assert len(built) == 1 and again["rsi"] != -1
+
+    # Today's bar revised in place, then a new bar: both recompute
+    revised = df.copy()
+    revised.iloc[-1, revised.columns.get_loc("Close")] += 5
+    bars["df"] = revised
+    assert technical.full_technical_analysis("CACHE")["current_price"] == close[-1] + 5
+    bars["df"] = pd.concat([revised, df.iloc[-1:].set_axis([pd.Timestamp("2025-07-01")])])
+    technical.full_technical_analysis("CACHE")
+    assert len(built) == 3
+
+    # The disk layer warms a cold in-memory cache
+    ta_cache.clear()
+    technical.full_technical_analysis("CACHE")
+    assert len(built) == 3
+    ta_cache.clear()
+
+
+# --- Pooled SQLite ---
+
+def test_pooled_connections_are_per_thread_wal_and_readable_during_writes(tmp_path, monkeypatch):
+    import threading
+    from tools import db, iv_tracker
+
+    path = str(tmp_path / "iv.db")
+    monkeypatch.setattr(iv_tracker, "DB_PATH", path)
+    conn = iv_tracker._get_db()
+    assert iv_tracker._get_db() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    with conn:
+        conn.executemany(
+            "INSERT INTO iv_history (ticker, date, atm_iv) VALUES (?, ?, ?)",
+            [("SPY", f"2025-01-{d:02d}", 0.1 + d / 100) for d in range(1, 21)],
+        )
+
+    # A writer holds an open transaction while another thread reads
+    conn.execute("INSERT INTO iv_history (ticker, date, atm_iv) VALUES ('SPY', '2025-02-01', 0.9)")
+    seen = {}
+
+    def read():
+        seen["conn"] = iv_tracker._get_db()
+        seen["pct"] = iv_tracker.get_iv_percentile("SPY")
+        db.close_all()
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    reader.join(timeout=5)
+    conn.commit()
+    assert seen["conn"] is not conn
+    assert seen["pct"]["data_points"] == 20 and seen["pct"]["iv_percentile"] == 100.0
+    assert iv_tracker.get_iv_percentile("SPY")["data_points"] == 21
+
+
+# --- IV dashboard ---
+
+def test_iv_dashboard_single_query_matches_per_ticker_percentiles(tmp_path, monkeypatch):
+    import random
+    from tools import iv_tracker
+
+    monkeypatch.setattr(iv_tracker, "DB_PATH", str(tmp_path / "iv.db"))
+    rnd = random.Random(4)
+    rows = []
+    for i, ticker in enumerate(["A", "B", "C", "D"]):
+        for d in range((0, 1, 3, 40)[i] if i < 3 else 300):
+            iv = None if rnd.random() < 0.1 else round(rnd.uniform(0.1, 0.9), 2)
+            rows.append((ticker, f"2024-{1 + d // 28:02d}-{1 + d % 28:02d}", iv, 0.3, 0.25, 100.0 + d))
+    rows.append(("E", "2024-01-01", None, 0.2, None, 50.0))
+    with iv_tracker._get_db() as conn:
+        conn.executemany(
+            "INSERT INTO iv_history (ticker, date, atm_iv, hv20, hv60, close_price) VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+
+    tickers = ["B", "C", "D", "E", "ZZZ", "C"]
+    dash = iv_tracker.iv_dashboard(tickers)
+    assert [d["ticker"] for d in dash] == tickers and dash[4] == {"ticker": "ZZZ", "status": "no data"}
+    for entry in dash[:4]:
+        pct = iv_tracker.get_iv_percentile(entry["ticker"])
+        assert entry["iv_percentile"] == pct["iv_percentile"] and entry["iv_rank"] == pct["iv_rank"]
+        assert entry["data_points"] == pct["data_points"]
+    assert dash[2]["data_points"] == 252
+
+    def no_cte(*a):
+        raise iv_tracker.sqlite3.OperationalError("near MATERIALIZED: syntax error")
+
+    monkeypatch.setattr(iv_tracker, "_dashboard_stats_sql", no_cte)
+    assert iv_tracker.iv_dashboard(tickers) == dash
+
+
+# --- IV percentile index ---
+
+def test_iv_index_tracks_recorded_days_for_every_lookback(tmp_path, monkeypatch):
+    import random
+    from datetime import date, timedelta
+    from tools import iv_index, iv_tracker
+
+    monkeypatch.setattr(iv_tracker, "DB_PATH", str(tmp_path / "iv.db"))
+    iv_index._indexes.clear()
+    conn = iv_tracker._get_db()
+    rnd = random.Random(2)
+    for day in range(300):
+        d = (date(2024, 1, 1) + timedelta(day)).isoformat()
+        iv = None if rnd.random() < 0.1 else round(rnd.uniform(0.1, 0.9), 2)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO iv_history (ticker, date, atm_iv) VALUES ('X', ?, ?)", (d, iv))
+        if iv is not None:
+            iv_index.record(conn, "X", d, iv)
+
+    def scanned(lookback):
+        rows = conn.execute(
+            "SELECT atm_iv FROM iv_history WHERE ticker = 'X' AND atm_iv IS NOT NULL ORDER BY date DESC LIMIT ?",
+            (lookback,)
+        ).fetchall()
+        return iv_tracker._percentile_result("X", iv_tracker._percentile_stats([r[0] for r in rows]))
+
+    by_lookback = iv_tracker.get_iv_percentiles("X")
+    assert set(by_lookback) == {30, 60, 126, 252}
+    for lookback, result in by_lookback.items():
+        assert result == scanned(lookback)
+
+    # Persisted state reloads without a rebuild; rows written behind its back trigger one
+    iv_index._indexes.clear()
+    rebuilds = []
+    real_rebuild = iv_index._rebuild
+    monkeypatch.setattr(iv_index, "_rebuild", lambda *a, **k: rebuilds.append(a) or real_rebuild(*a, **k))
+    assert iv_tracker.get_iv_percentile("X", 30) == scanned(30) and not rebuilds
+    with conn:
+        conn.execute("INSERT INTO iv_history (ticker, date, atm_iv) VALUES ('X', '2030-01-01', 0.95)")
+    assert iv_tracker.get_iv_percentile("X") == scanned(252)
+    assert iv_tracker.get_iv_percentile("X")["iv_percentile"] == 100.0 and len(rebuilds) == 1
+
+
+# --- IV surface ---
+
+def test_iv_surface_grid_and_compact_round_trip(tmp_path, monkeypatch):
+    from math import erf, sqrt
+    from tools import iv_surface
+    from tools.chain_frame import ChainFrame
+
+    monkeypatch.setattr(iv_surface, "DB_PATH", str(tmp_path / "iv.db"))
+    today = datetime.now().date()
+
+    def chain(put_skew):
+        rows = []
+        for dte in (10, 30, 60, 120, 150):
+            for k in np.linspace(60, 140, 81):
+                for typ in ("call", "put"):
+                    iv = 0.3 + (put_skew if k < 100 else 0.0)
+                    t = dte / 365
+                    d1 = (np.log(100 / k) + 0.5 * iv * iv * t) / (iv * sqrt(t))
+                    nd = 0.5 * (1 + erf(d1 / sqrt(2)))
+                    rows.append((typ, (today + timedelta(dte)).isoformat(), k, iv, nd if typ == "call" else nd - 1))
+        n = len(rows)
+        nan = np.full(n, np.nan)
+        col = lambda i, dtype=float: np.array([r[i] for r in rows], dtype=dtype)
+        return ChainFrame(np.full(n, "", dtype=object), col(0, object), col(1, "U10"), col(2),
+                          nan, nan, nan, nan, nan, col(3), col(4), nan, nan, nan, nan)
+
+    surface = iv_surface.surface_from_chain(chain(0.05), 100, today)
+    put25, call25 = iv_surface.DELTAS.index(0.75), iv_surface.DELTAS.index(0.25)
+    assert np.allclose(surface[1:, call25], 0.30) and np.allclose(surface[1:, put25], 0.35)
+    assert np.isnan(surface[iv_surface.TENORS.index(7)]).all()  # nothing quoted below 7 days to bracket it
+
+    # A year of daily surfaces stays small and decodes to within half a basis point
+    days = [(today - timedelta(d)).isoformat() for d in range(300, -1, -1)]
+    rng = np.random.default_rng(0)
+    stored = {}
+    for d in days:
+        stored[d] = surface + rng.normal(0, 0.002)
+        iv_surface.store_surface("tsla", d, stored[d])
+    iv_surface.store_surface("TSLA", days[-1], surface)  # re-capture replaces the day
+    stored[days[-1]] = surface
+    size = iv_surface._get_db().execute("SELECT SUM(LENGTH(data)) FROM iv_surface").fetchone()[0]
+    assert size < 40_000
+
+    dates, ivs = iv_surface.load_surfaces("TSLA", start=days[100])
+    assert dates.tolist() == days[100:]
+    assert np.allclose(ivs, np.array([stored[d] for d in days[100:]]), atol=0.5e-4, equal_nan=True)
+
+    skew = iv_surface.skew_history("TSLA", tenor=30, delta=0.25, days=30)
+    assert len(skew) == 31 and skew[-1] == {"date": days[-1], "put_iv": 35.0, "call_iv": 30.0,
+                                            "atm_iv": 30.0, "skew": 5.0}
+
+
+# --- Local IV / Greeks ---
+
+def test_fill_chain_solves_missing_iv_and_greeks_including_0dte():
+    from datetime import timezone
+    from tools.chain_frame import ChainFrame
+    from tools.greeks import bs_price, fill_chain, greeks, implied_vol, years_to_expiry
+
+    now = datetime(2025, 6, 20, 14, 0, tzinfo=timezone.utc)  # 10:00 ET on expiration day
+    expiry = np.array(["2025-06-20", "2025-06-20", "2025-06-23", "2025-07-18", "2025-07-18", "2025-07-18"], dtype="U10")
+    is_call = np.array([True, False, True, False, True, True])
+    strike = np.array([100.0, 99.0, 103.0, 90.0, 110.0, 100.0])
+    sigma = np.array([0.25, 0.30, 0.40, 0.55, 0.35, 0.30])
+    t = years_to_expiry(expiry, now)
+    assert np.isclose(t[0] * 365 * 24, 6.0)
+    price = bs_price(is_call, 100.0, strike, t, sigma)
+
+    n = len(strike)
+    nan = np.full(n, np.nan)
+    frame = ChainFrame(np.full(n, "", dtype=object), np.where(is_call, "call", "put").astype(object), expiry, strike,
+                       price - 0.005, price + 0.005, nan.copy(), nan.copy(), nan.copy(), nan.copy(), nan.copy(),
+                       nan.copy(), nan.copy(), nan.copy(), nan.copy())
+    frame.iv[5], frame.delta[5] = 0.31, 0.55    # Polygon values are kept
+    frame.bid[4], frame.ask[4] = 0.0, 0.0       # no quote, no midpoint: unsolvable
+
+    filled = fill_chain(frame, 100.0, now=now)
+    assert np.isnan(frame.iv[0])                 # input frame untouched
+    assert np.allclose(filled.iv[:4], sigma[:4], atol=2e-3)
+    assert np.isnan(filled.iv[4]) and filled.iv[5] == 0.31 and filled.delta[5] == 0.55
+    expected = greeks(is_call[:4], 100.0, strike[:4], t[:4], filled.iv[:4])
+    for name in ("delta", "gamma", "theta", "vega"):
+        assert np.allclose(getattr(filled, name)[:4], expected[name])
+    assert filled.delta[1] < 0 < filled.delta[0] and (filled.theta[:4] < 0).all()
+
+    # Wide random chain: recovers sigma wherever the option has real time value
+    rng = np.random.default_rng(0)
+    k, tt, vol = rng.uniform(60, 140, 10_000), rng.uniform(0.5, 365, 10_000) / 365, rng.uniform(0.05, 1.5, 10_000)
+    calls = rng.random(10_000) < 0.5
+    p = bs_price(calls, 100.0, k, tt, vol)
+    solved = implied_vol(p, calls, 100.0, k, tt)
+    vega = greeks(calls, 100.0, k, tt, vol)["vega"]
+    sensitive = vega > 0.01
+    assert np.allclose(solved[sensitive], vol[sensitive], atol=1e-4)
+
+
+# --- IV backfill ---
+
+def test_iv_backfill_reconstructs_history_and_resumes_from_checkpoints(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+    import pandas as pd
+    from jobs import backfill_iv
+    from tools import iv_index, iv_tracker
+    from tools.greeks import bs_price
+
+    monkeypatch.setattr(iv_tracker, "DB_PATH", str(tmp_path / "iv.db"))
+    monkeypatch.setattr(backfill_iv, "DB_PATH", str(tmp_path / "iv.db"))
+    iv_index._indexes.clear()
+
+    days = pd.bdate_range("2024-01-02", "2024-12-31")
+    closes = 100 * np.exp(np.cumsum(np.random.default_rng(1).normal(0, 0.015, len(days))))
+    bars = pd.DataFrame({"Open": closes, "High": closes * 1.01, "Low": closes * 0.99, "Close": closes,
+                         "Volume": 1e6}, index=days)
+    monkeypatch.setattr(backfill_iv, "get_daily_bars", lambda ticker, n: bars)
+    sigma = dict(zip(days.strftime("%Y-%m-%d"), 0.2 + 0.3 * np.linspace(0, 1, len(days))))
+    spot = dict(zip(days.strftime("%Y-%m-%d"), closes))
+
+    fridays = pd.date_range("2024-01-05", "2025-03-28", freq="W-FRI").strftime("%Y-%m-%d")
+    listed = [SimpleNamespace(ticker=f"O:X{e}C{k}", expiration_date=e, strike_price=float(k))
+              for e in fridays for k in range(50, 200)]
+    calls = []
+
+    def list_options_contracts(**kw):
+        calls.append("list")
+        assert kw["expired"] is True and kw["contract_type"] == "call"
+        return [c for c in listed if kw["expiration_date_gte"] <= c.expiration_date <= kw["expiration_date_lte"]
+                and kw["strike_price_gte"] <= c.strike_price <= kw["strike_price_lte"]]
+
+    def get_aggs(symbol, mult, span, start, end, **kw):
+        calls.append(symbol)
+        if fail and start.startswith(fail):
+            raise RuntimeError("boom")
+        c = next(c for c in listed if c.ticker == symbol)
+        out = []
+        for d in pd.bdate_range(start, end).strftime("%Y-%m-%d"):
+            t = (np.datetime64(c.expiration_date) - np.datetime64(d)).astype(float) / 365
+            price = float(bs_price(True, spot[d], c.strike_price, t, sigma[d]))
+            out.append(SimpleNamespace(timestamp=int(pd.Timestamp(d).value // 10**6), open=price, high=price,
+                                       low=price, close=price, volume=10))
+        return out
+
+    monkeypatch.setattr(backfill_iv._client, "list_options_contracts", list_options_contracts, raising=False)
+    monkeypatch.setattr(backfill_iv._client, "get_aggs", get_aggs, raising=False)
+
+    # A live daily record already exists for one day and must survive the backfill
+    with iv_tracker._get_db() as conn:
+        conn.execute("INSERT INTO iv_history (ticker, date, atm_iv) VALUES ('XYZ', '2024-06-03', 0.99)")
+
+    fail = "2024-07"
+    summary = backfill_iv.backfill(["xyz"], "2024-04-01", "2024-12-31")
+    assert summary["chunks"] == 9 and summary["failed"] == ["XYZ"]
+
+    fail = None
+    calls.clear()
+    summary = backfill_iv.backfill(["XYZ"], "2024-04-01", "2024-12-31")
+    assert summary == {"chunks": 1, "skipped": 8, "failed": [], "rows": len(bars.loc["2024-07"])}
+    assert calls.count("list") == 1
+
+    rows = iv_tracker._get_db().execute(
+        "SELECT date, atm_iv, hv20, hv60, close_price FROM iv_history WHERE ticker = 'XYZ' ORDER BY date"
+    ).fetchall()
+    assert len(rows) == len(bars.loc["2024-04-01":]) and rows[0][0] == "2024-04-01"
+    by_date = {r[0]: r for r in rows}
+    assert by_date["2024-06-03"][1] == 0.99
+    ivs = np.array([r[1] for r in rows if r[0] != "2024-06-03"])
+    expected = np.array([sigma[r[0]] for r in rows if r[0] != "2024-06-03"])
+    assert np.allclose(ivs, expected, atol=1e-4)
+
+    # HV matches record_daily_iv's formula on the closes up to each day
+    i = days.get_loc(pd.Timestamp("2024-10-01"))
+    log_returns = np.diff(np.log(closes[:i + 1]))
+    assert np.isclose(by_date["2024-10-01"][2], np.std(log_returns[-20:]) * np.sqrt(252))
+    assert np.isclose(by_date["2024-10-01"][3], np.std(log_returns[-60:]) * np.sqrt(252))
+
+    # The percentile index is rebuilt to cover the backfilled history
+    assert iv_tracker.get_iv_percentile("XYZ", 126)["data_points"] == 126
+
+
+def test_iv_index_picks_up_backfill_from_another_process(tmp_path, monkeypatch):
+    import json
+    from datetime import date, timedelta
+    from tools import iv_index, iv_tracker
+
+    monkeypatch.setattr(iv_tracker, "DB_PATH", str(tmp_path / "iv.db"))
+    iv_index._indexes.clear()
+    conn = iv_tracker._get_db()
+
+    def put(d, iv):
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO iv_history (ticker, date, atm_iv) VALUES ('NEW', ?, ?)", (d, iv))
+
+    # A long-running process records the first day and holds that index in memory
+    put("2025-01-01", 0.5)
+    iv_index.record(conn, "NEW", "2025-01-01", 0.5)
+    stale = iv_index._indexes["NEW"]
+    assert "Need more data" in iv_tracker.get_iv_percentile("NEW")["message"]
+
+    # Another process backfills 200 older days and persists its rebuilt index
+    days = [(date(2024, 1, 1) + timedelta(d)).isoformat() for d in range(200)]
+    iv_tracker.store_history("NEW", [(d, 0.2 + d.count("5") / 100, None) + (None,) * 8 for d in days])
+    iv_tracker.rebuild_iv_index(["NEW"])
+    iv_index._indexes["NEW"] = stale
+
+    rebuilds = []
+    real_rebuild = iv_index._rebuild
+    monkeypatch.setattr(iv_index, "_rebuild", lambda *a, **k: rebuilds.append(a) or real_rebuild(*a, **k))
+    assert iv_tracker.get_iv_percentile("NEW")["data_points"] == 201 and not rebuilds  # persisted state re-read
+
+    # Recording the next day extends the backfilled window instead of overwriting it with a stale one
+    iv_index._indexes["NEW"] = stale
+    put("2025-01-02", 0.6)
+    iv_index.record(conn, "NEW", "2025-01-02", 0.6)
+    persisted = conn.execute("SELECT state FROM iv_index WHERE ticker = 'NEW'").fetchone()[0]
+    assert len(iv_index.IVIndex.from_state(json.loads(persisted)).window) == 202
+
+    # Backfilled rows nobody persisted are still noticed (rebuilt in memory)
+    put("2023-12-31", 0.1)
+    assert iv_tracker.get_iv_percentile("NEW")["data_points"] == 203
+
+
+# --- Realized volatility ---
+
+def test_realized_vol_panel_matches_per_ticker_formulas_and_migrates_history(tmp_path, monkeypatch):
+    import sqlite3
+    import pandas as pd
+    from tools import iv_index, iv_tracker, realized_vol
+
+    rng = np.random.default_rng(3)
+    frames = {}
+    for ticker, n in (("AAA", 300), ("BBB", 130), ("CCC", 40)):
+        index = pd.bdate_range(end="2025-06-30", periods=n)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+        open_ = close * np.exp(rng.normal(0, 0.01, n))
+        high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.01, n)))
+        low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.01, n)))
+        frames[ticker] = pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close, "Volume": 1e6},
+                                      index=index)
+
+    def by_hand(df, n):
+        o, h, l, c = (df[k].to_numpy()[-n - 1:] for k in ("Open", "High", "Low", "Close"))
+        returns = np.diff(np.log(c))
+        o, h, l, c, prev = o[1:], h[1:], l[1:], c[1:], c[:-1]
+        hl, co = np.log(h / l), np.log(c / o)
+        k = 0.34 / (1.34 + (n + 1) / (n - 1))
+        rs = np.log(h / c) * np.log(h / o) + np.log(l / c) * np.log(l / o)
+        return {
+            f"hv{n}": np.std(returns) * np.sqrt(252),
+            f"pk{n}": np.sqrt(np.mean(hl ** 2) / (4 * np.log(2)) * 252),
+            f"gk{n}": np.sqrt(np.mean(0.5 * hl ** 2 - (2 * np.log(2) - 1) * co ** 2) * 252),
+            f"yz{n}": np.sqrt((np.var(np.log(o / prev), ddof=1) + k * np.var(co, ddof=1) + (1 - k) * np.mean(rs)) * 252),
+        }
+
+    latest = realized_vol.estimate_frames(frames)
+    assert [len(df) for df in latest.values()] == [1, 1, 1]
+    for ticker, df in frames.items():
+        for n in realized_vol.WINDOWS:
+            for name, value in by_hand(df, n).items():
+                got = latest[ticker][name].iloc[-1]
+                assert np.isnan(got) if len(df) <= n else np.isclose(got, value), (ticker, name)
+
+    # An iv_history created before the estimator columns is migrated on first use
+    path = str(tmp_path / "iv.db")
+    with sqlite3.connect(path) as old:
+        old.execute("CREATE TABLE iv_history (id INTEGER PRIMARY KEY AUTOINCREMENT, ticker TEXT NOT NULL, "
+                    "date TEXT NOT NULL, atm_iv REAL, hv20 REAL, hv60 REAL, close_price REAL, UNIQUE(ticker, date))")
+        old.execute("INSERT INTO iv_history (ticker, date, atm_iv, close_price) VALUES ('AAA', '2025-06-30', 0.4, 1.0)")
+    loads = []
+    monkeypatch.setattr(iv_tracker, "DB_PATH", path)
+    monkeypatch.setattr(realized_vol, "get_daily_bars", lambda t, days: loads.append(t) or frames[t])
+    monkeypatch.setattr(iv_tracker, "_get_atm_iv", lambda t, price: 0.4)
+    monkeypatch.setattr(iv_tracker, "IV_SURFACE_CAPTURE", False)
+    iv_index._indexes.clear()
+
+    # The daily batch runs one panel over all tickers' bars
+    results = iv_tracker.batch_record(["AAA", "BBB", "CCC"])
+    assert all("error" not in r for r in results) and sorted(loads) == ["AAA", "BBB", "CCC"]
+    rows = iv_tracker._get_db().execute(
+        "SELECT date, atm_iv, close_price, hv20, yz60 FROM iv_history WHERE ticker = 'AAA' ORDER BY date"
+    ).fetchall()
+    assert rows[0] == ("2025-06-30", 0.4, 1.0, None, None) and rows[1][0] == results[0]["date"]
+    assert rows[1][1] == 0.4 and np.isclose(rows[1][2], frames["AAA"]["Close"].iloc[-1])
+    assert np.isclose(rows[1][3], latest["AAA"]["hv20"].iloc[-1])
+    assert np.isclose(rows[1][4], latest["AAA"]["yz60"].iloc[-1])
+
+    dash = {d["ticker"]: d for d in iv_tracker.iv_dashboard(["AAA", "CCC"])}
+    assert dash["AAA"]["yz20"] == round(latest["AAA"]["yz20"].iloc[-1] * 100, 1)
+    assert dash["AAA"]["iv_yz_diff"] == round((0.4 - latest["AAA"]["yz20"].iloc[-1]) * 100, 1)
+    assert dash["CCC"]["hv20"] is not None and dash["CCC"]["yz60"] is None
+
+
+def test_daily_record_writes_every_estimator_into_the_atm_iv_row(tmp_path, monkeypatch):
+    import pandas as pd
+    from tools import iv_index, iv_tracker, realized_vol
+
+    rng = np.random.default_rng(5)
+    index = pd.bdate_range(end="2025-06-27", periods=80)  # Friday; recorded on the weekend
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(index))))
+    bars = pd.DataFrame({"Open": close * 1.001, "High": close * 1.01, "Low": close * 0.99,
+                         "Close": close, "Volume": 1e6}, index=index)
+    monkeypatch.setattr(iv_tracker, "DB_PATH", str(tmp_path / "iv.db"))
+    monkeypatch.setattr(realized_vol, "get_daily_bars", lambda t, days: bars)
+    monkeypatch.setattr(iv_tracker, "_get_atm_iv", lambda t, price: 0.45)
+    monkeypatch.setattr(iv_tracker, "IV_SURFACE_CAPTURE", False)
+    iv_index._indexes.clear()
+
+    results = iv_tracker.batch_record(["AAA"])
+    expected = realized_vol.estimate_frames({"AAA": bars})["AAA"].iloc[-1]
+    rows = iv_tracker._get_db().execute(
+        f"SELECT date, atm_iv, close_price, {', '.join(realized_vol.COLUMNS)} FROM iv_history"
+    ).fetchall()
+    assert len(rows) == 1 and rows[0][0] == results[0]["date"] and rows[0][1] == 0.45
+    assert np.allclose(rows[0][2:], expected[["Close", *realized_vol.COLUMNS]].to_numpy())
+    assert all(np.isclose(results[0][name], expected[name]) for name in realized_vol.COLUMNS)
+
+    # A single-ticker record (agent / API) runs the same panel for that ticker alone
+    single = iv_tracker.record_daily_iv("AAA")
+    assert all(np.isclose(single[name], results[0][name]) for name in realized_vol.COLUMNS)
+
+
+# --- Unusual activity rules ---
+
+def test_unusual_rules_mask_whole_chain_and_report_each_contract_once(monkeypatch):
+    from tools import unusual_activity as ua
+    from tools.chain_frame import ChainFrame
+
+    snaps = [
+        _snapshot("call", 30, 100, volume=400, oi=100, bid=1.0, ask=1.2),        # VOL/OI surge only
+        _snapshot("put", 30, 95, volume=6000, oi=1000, bid=2.0, ask=2.2),        # surge and high volume
+        _snapshot("call", 120, 110, volume=2000, oi=5000, bid=9.0, ask=9.4),     # far-month only
+        _snapshot("call", 10, 101, volume=50, oi=20000, bid=1.0, ask=1.1),       # ATM magnet
+        _snapshot("put", 10, 80, volume=10, oi=10, bid=0.05, ask=0.07),          # nothing
+    ]
+    frame = ChainFrame.from_snapshots(snaps)
+    monkeypatch.setattr(ua, "get_current_price", lambda t: 100.0)
+    monkeypatch.setattr(ua, "get_chain", lambda *a, **k: frame)
+    monkeypatch.setattr(ua, "RULES", dict(ua.RULES))
+
+    alerts = ua._scan_ticker("TEST")
+    by_type = {}
+    for a in alerts:
+        by_type.setdefault(a["type"], []).append(a)
+    surge = by_type["VOL/OI_SURGE"]
+    assert [a["strike"] for a in surge] == [100.0, 95.0] and "HIGH_VOLUME" not in by_type
+    assert surge[0]["vol_oi_ratio"] == 4.0 and surge[0]["interpretation"].endswith("Bullish signal.")
+    assert surge[1]["interpretation"] == "New positions surging: 6.0x OI traded today. Bearish signal."
+    far = by_type["INSTITUTIONAL_FAR_MONTH"][0]
+    assert far["premium_flow"] == 1_840_000 and far["interpretation"] == (
+        "Possible institutional positioning: 120 DTE, $1,840,000 flow in far-month CALL.")
+    assert by_type["ATM_OI_MAGNET"][0]["strike"] == 101.0
+    assert by_type["EXTREME_PC_RATIO"][0]["pc_ratio"] == round(6010 / 2450, 2)
+
+    # A new detector is one registration; the scan picks it up unchanged
+    @ua.rule("DEEP_OTM_LOTTO", "{side} lotto at {strike:.0f}: {volume:,} contracts, {dte} DTE.")
+    def _lotto(c):
+        return (np.abs(c["moneyness"]) > 0.15) & (c["mid"] < 0.10) & (c["vol"] >= 10)
+
+    lotto = [a for a in ua._scan_ticker("TEST") if a["type"] == "DEEP_OTM_LOTTO"]
+    assert len(lotto) == 1 and lotto[0]["interpretation"] == "PUT lotto at 80: 10 contracts, 10 DTE."
+
+
+# --- Intraday flow diffing ---
+
+def test_incremental_scan_alerts_only_on_flow_since_previous_scan(tmp_path, monkeypatch):
+    from datetime import timezone
+    from tools import chain_diff, unusual_activity as ua
+    from tools.chain_frame import ChainFrame
+
+    monkeypatch.setattr(chain_diff, "DB_PATH", str(tmp_path / "iv.db"))
+    monkeypatch.setattr(ua, "get_current_price", lambda t: 100.0)
+
+    def chain(volumes, extra=()):
+        snaps = [_snapshot("call", 30, k, volume=v, oi=100) for k, v in zip((90, 95, 100, 105), volumes)]
+        return ChainFrame.from_snapshots(snaps + list(extra))
+
+    frames = []
+    monkeypatch.setattr(ua, "get_chain", lambda *a, **k: frames[-1])
+
+    def scan(frame, hour, day=16):
+        frames.append(frame)
+        now = datetime(2025, 6, day, hour, 0, tzinfo=timezone.utc)
+        monkeypatch.setattr(chain_diff, "datetime", type("_dt", (), {"now": staticmethod(lambda tz=None: now)}))
+        return {a["strike"]: a for a in ua._scan_ticker("TEST", incremental=True) if "contract" in a}
+
+    # First scan of the day: the whole day's flow is new
+    first = scan(chain((500, 50, 50, 50)), 14)
+    assert set(first) == {90.0} and first[90.0]["since"] is None and first[90.0]["volume"] == 500
+
+    # Same cumulative volume later: nothing new, no re-alert. Row order doesn't matter.
+    assert scan(ChainFrame.take(chain((500, 50, 50, 50)), [3, 1, 0, 2]), 15) == {}
+
+    # Flow on another contract, plus a newly listed one
+    late = _snapshot("put", 30, 110, volume=300, oi=10)
+    third = scan(chain((520, 50, 450, 50), extra=[late]), 16)
+    assert set(third) == {100.0, 110.0}
+    assert third[100.0]["volume"] == 400 and third[100.0]["day_volume"] == 450
+    assert third[100.0]["since"] == "2025-06-16T15:00:00+00:00" and third[100.0]["oi_change"] == 0
+    assert third[100.0]["premium_flow"] == round(400 * 1.1 * 100)
+    assert third[110.0]["volume"] == 300
+
+    # Next trading day: volume reset, the earlier snapshot no longer counts
+    assert set(scan(chain((500, 50, 50, 50)), 14, day=17)) == {90.0}
+
+    # The snapshot round-trips compactly
+    snap = chain_diff.load("TEST")
+    last = frames[-1]
+    assert snap.date == "2025-06-17" and list(snap.symbols) == sorted(last.symbol)
+    assert dict(zip(snap.symbols, snap.volume.tolist())) == dict(zip(last.symbol, last.volume.astype(int).tolist()))
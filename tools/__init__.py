@@ -1,12 +1,28 @@
 """Options analysis tools."""
 
 import logging
-from polygon import RESTClient
-from config import POLYGON_API_KEY
+from tools.client import PolygonClient
+from config import (
+    POLYGON_API_KEY, POLYGON_MODE, POLYGON_FIXTURES_DIR, POLYGON_REPLAY_LATENCY_MS,
+)
 
-if not POLYGON_API_KEY:
-    logging.getLogger(__name__).warning(
-        "POLYGON_API_KEY not set. Market data API calls will fail."
+if POLYGON_MODE == "replay":
+    from tools.replay import ReplayPool
+
+    logging.getLogger(__name__).info("Replaying Polygon responses from %s", POLYGON_FIXTURES_DIR)
+    polygon_client = PolygonClient(
+        api_key=POLYGON_API_KEY or "replay",
+        pool=ReplayPool(POLYGON_FIXTURES_DIR, POLYGON_REPLAY_LATENCY_MS),
     )
+else:
+    if not POLYGON_API_KEY:
+        logging.getLogger(__name__).warning(
+            "POLYGON_API_KEY not set. Market data API calls will fail."
+        )
+
+    polygon_client = PolygonClient(api_key=POLYGON_API_KEY)
+
+    if POLYGON_MODE == "record":
+        from tools.replay import RecordingPool
 
-polygon_client = RESTClient(api_key=POLYGON_API_KEY)
+        polygon_client.client.pool = RecordingPool(polygon_client.client.pool, POLYGON_FIXTURES_DIR)
@@ -0,0 +1,187 @@
+"""
+Vectorized backtest of the composite technical signal.
+
+Scores every historical bar of every ticker at once: the panel indicators
+(tools/indicator_panel.py) are kept as full (bars x tickers) arrays and the
+rules of _determine_trend / _composite_signal are applied as array masks, so
+bar t gets exactly the signal full_technical_analysis would have produced
+from the history up to t. Forward returns are then grouped by signal and
+strength.
+
+Usage:
+    python -m tools.backtest                 # watchlist, 5 years
+    python -m tools.backtest AAPL MSFT NVDA
+"""
+
+import sys
+import numpy as np
+import pandas as pd
+from tools.fetch import fan_out
+from tools.indicator_panel import align, panel_series
+from tools.market_data import get_stock_data
+from log import get_logger
+
+logger = get_logger(__name__)
+
+SIGNALS = np.array(["bearish", "neutral", "bullish"])
+DEFAULT_HORIZONS = (1, 5, 10, 20)
+
+
+def composite_scores(p: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """
+    Composite score, strength (1-5) and signal for every bar of an aligned
+    panel. Returns (rows x tickers) arrays: score, strength, signal (index
+    into SIGNALS) and trend (-1 bearish, 0 neutral/unknown, 1 bullish).
+    """
+    s = panel_series(p)
+    price = p["Close"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # --- Trend (SMA alignment); NaN comparisons count as bearish like the scalar rules ---
+        sma20, sma50, sma200 = s["sma20"], s["sma50"], s["sma200"]
+        known = ~np.isnan(sma20) & ~np.isnan(sma50)
+        has200 = ~np.isnan(sma200)
+        votes = (price > sma20).astype(int) + (sma20 > sma50)
+        votes200 = np.where(has200, (price > sma200).astype(int) + (sma50 > sma200), 0)
+        bull = votes + votes200
+        bear = (2 - votes) + np.where(has200, 2 - votes200, 0)
+        trend = np.where(known & (bull >= 3), 1, np.where(known & (bear >= 3), -1, 0))
+        score = 2.0 * trend
+
+        # --- RSI ---
+        rsi = s["rsi"]
+        score += np.where(rsi < 30, 1.0, 0.0) - np.where(rsi > 70, 1.0, 0.0)
+
+        # --- MACD: crossover +/-1.5, otherwise histogram sign +/-0.5 ---
+        macd, sig = s["macd"], s["macd_signal"]
+        prev_macd = np.vstack([np.full((1, macd.shape[1]), np.nan), macd[:-1]])
+        prev_sig = np.vstack([np.full((1, sig.shape[1]), np.nan), sig[:-1]])
+        have = ~np.isnan(macd) & ~np.isnan(sig) & ~np.isnan(prev_macd) & ~np.isnan(prev_sig)
+        bull_x = have & (prev_macd <= prev_sig) & (macd > sig)
+        bear_x = have & (prev_macd >= prev_sig) & (macd < sig)
+        hist = macd - sig
+        score += np.select(
+            [bull_x, bear_x, ~np.isnan(hist)],
+            [1.5, -1.5, np.where(hist > 0, 0.5, -0.5)],
+            0.0,
+        )
+
+        # --- Bollinger position ---
+        width = s["bb_upper"] - s["bb_lower"]
+        position = np.where(width != 0, (price - s["bb_lower"]) / width, np.nan)
+        score += np.where(position < 0.1, 1.0, 0.0) - np.where(position > 0.9, 1.0, 0.0)
+
+        # --- Stochastic ---
+        k = s["stoch_k"]
+        score += np.where(k < 20, 1.0, 0.0) - np.where(k > 80, 1.0, 0.0)
+
+        # --- Volume confirmation ---
+        vol_sma = s["vol_sma20"]
+        vol_ratio = np.where(vol_sma > 0, p["Volume"] / vol_sma, 1.0)
+        score += np.where(vol_ratio > 1.5, 0.5 * np.sign(score), 0.0)
+
+    strength = np.select(
+        [np.abs(score) >= 5, np.abs(score) >= 3.5, np.abs(score) >= 2, np.abs(score) >= 1],
+        [5, 4, 3, 2], 1,
+    )
+    signal = np.where(score > 1, 2, np.where(score < -1, 0, 1))
+    return {"score": score, "strength": strength, "signal": signal, "trend": trend}
+
+
+def forward_returns(close: np.ndarray, horizon: int) -> np.ndarray:
+    """close[t + horizon] / close[t] - 1 per column; NaN where the future bar doesn't exist."""
+    out = np.full(close.shape, np.nan)
+    if horizon < len(close):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[:-horizon] = close[horizon:] / close[:-horizon] - 1
+    return out
+
+
+def bucket_stats(scores: dict[str, np.ndarray], close: np.ndarray, eligible: np.ndarray,
+                 horizons=DEFAULT_HORIZONS) -> list[dict]:
+    """Count, mean, median and hit rate of forward returns per (signal, strength) bucket."""
+    mask = eligible.ravel()
+    table = pd.DataFrame({
+        "signal": SIGNALS[scores["signal"].ravel()[mask]],
+        "strength": scores["strength"].ravel()[mask],
+    })
+    for h in horizons:
+        table[f"ret_{h}"] = forward_returns(close, h).ravel()[mask]
+
+    grouped = table.groupby(["signal", "strength"], sort=True)
+    buckets = []
+    for (signal, strength), g in grouped:
+        entry = {"signal": signal, "strength": int(strength), "bars": len(g)}
+        for h in horizons:
+            r = g[f"ret_{h}"].dropna()
+            entry[f"fwd_{h}"] = {
+                "n": len(r),
+                "mean_pct": round(float(r.mean()) * 100, 3) if len(r) else None,
+                "median_pct": round(float(r.median()) * 100, 3) if len(r) else None,
+                "hit_rate": round(float((r > 0).mean()), 3) if len(r) else None,
+            }
+        buckets.append(entry)
+    return buckets
+
+
+def run_backtest(tickers: list[str], period: str = "5y", horizons=DEFAULT_HORIZONS,
+                 warmup: int = 50) -> dict:
+    """
+    Score every bar of every ticker and summarize forward returns per signal
+    bucket. The first `warmup` bars of each ticker (before SMA50 exists, when
+    the trend is always "unknown") are excluded from the statistics.
+    """
+    frames = fan_out(lambda t: get_stock_data(t, period=period), tickers)
+    loaded = {}
+    for ticker, df in zip(tickers, frames):
+        if isinstance(df, Exception):
+            logger.warning("Bar load error for %s: %s", ticker, df)
+        elif not df.empty:
+            loaded[ticker] = df
+    if not loaded:
+        return {"error": "No data for any ticker"}
+
+    names, p, lengths = align(loaded)
+    scores = composite_scores(p)
+    rows = len(p["Close"])
+    bar_no = np.arange(rows)[:, None] - (rows - lengths)[None, :]  # per-ticker bar index
+    eligible = bar_no >= warmup
+
+    return {
+        "tickers": names,
+        "period": period,
+        "bars_scored": int(eligible.sum()),
+        "horizons": list(horizons),
+        "buckets": bucket_stats(scores, p["Close"], eligible, horizons),
+    }
+
+
+if __name__ == "__main__":
+    import time
+    from rich.console import Console
+    from rich.table import Table
+    from config import WATCHLIST
+
+    console = Console()
+    tickers = [t.upper() for t in sys.argv[1:]] or WATCHLIST
+    start = time.perf_counter()
+    result = run_backtest(tickers)
+    elapsed = time.perf_counter() - start
+
+    if "error" in result:
+        console.print(f"[red]{result['error']}[/red]")
+    else:
+        table = Table(title=f"Composite signal backtest ({result['bars_scored']:,} bars, {elapsed:.1f}s)")
+        table.add_column("Signal", style="bold")
+        table.add_column("Strength")
+        table.add_column("Bars")
+        for h in result["horizons"]:
+            table.add_column(f"{h}d mean%")
+            table.add_column(f"{h}d hit")
+        for b in result["buckets"]:
+            row = [b["signal"], str(b["strength"]), f"{b['bars']:,}"]
+            for h in result["horizons"]:
+                f = b[f"fwd_{h}"]
+                row += [f"{f['mean_pct']:+.2f}" if f["mean_pct"] is not None else "N/A",
+                        f"{f['hit_rate']:.0%}" if f["hit_rate"] is not None else "N/A"]
+            table.add_row(*row)
+        console.print(table)
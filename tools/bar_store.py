@@ -0,0 +1,331 @@
+"""
+Local daily OHLCV bar store (SQLite under DATA_DIR).
+
+Bars are recorded per ticker; each read only asks Polygon for the days after
+the last stored bar (re-fetching that bar, which may have been partial), and
+at most once per BAR_SYNC_INTERVAL seconds. Reads return DataFrames in the
+Open/High/Low/Close/Volume layout used by tools/technical.py.
+
+The widest frame loaded per ticker is kept in memory and shared: shorter
+windows are slices of it, and every caller gets a shallow copy whose
+buffers are read-only, so one download serves technical analysis, HV and
+the price-history endpoint alike.
+
+Minute bars live in their own table (last MINUTE_BAR_RETENTION_DAYS days),
+synced the same incremental way, and are streamed through tools/resample.py
+to build 5m/15m/1h frames without fetching those timeframes separately.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from tools import db, polygon_client as _client
+from tools.resample import TIMEFRAMES, resample
+from config import BARS_DB_PATH, BAR_SYNC_INTERVAL, MINUTE_BAR_RETENTION_DAYS
+from log import get_logger
+
+logger = get_logger(__name__)
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# ticker -> monotonic time of the last successful top-up
+_last_sync: dict[str, float] = {}
+# ticker -> earliest date ever requested from Polygon
+_coverage: dict[str, str] = {}
+# ticker -> write counter, bumped whenever new bars are stored
+_versions: dict[str, int] = {}
+# (ticker, dtype) -> (version, from_date, frame covering [from_date, last bar])
+_frames: dict[tuple[str, str], tuple[int, str, pd.DataFrame]] = {}
+_locks: dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+# ticker -> monotonic time of the last minute-bar top-up
+_minute_sync: dict[str, float] = {}
+
+# Rows pulled from SQLite per fetchmany() when streaming minute bars
+_MINUTE_CHUNK = 5000
+
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS daily_bars (
+        ticker TEXT NOT NULL,
+        date TEXT NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        PRIMARY KEY (ticker, date)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS minute_bars (
+        ticker TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        PRIMARY KEY (ticker, ts)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS bar_coverage (
+        ticker TEXT PRIMARY KEY,
+        covered_from TEXT NOT NULL
+    );
+"""
+
+
+def _get_db():
+    """This thread's pooled SQLite connection (tables ensured once per process)."""
+    return db.connect(BARS_DB_PATH, _SCHEMA)
+
+
+def _ticker_lock(ticker: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(ticker, threading.Lock())
+
+
+def aggs_to_arrays(aggs, dtype=np.float64) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Decode Polygon Agg objects into (timestamps datetime64[ms], values[n, 5]).
+    Values are preallocated and filled column-wise; missing prices are NaN,
+    missing volume is 0. Bars without a timestamp are dropped.
+    """
+    aggs = [a for a in aggs or [] if a.timestamp]
+    n = len(aggs)
+    values = np.empty((n, 5), dtype=dtype)
+    nan = np.nan
+    values[:, 0] = np.fromiter((nan if a.open is None else a.open for a in aggs), np.float64, n)
+    values[:, 1] = np.fromiter((nan if a.high is None else a.high for a in aggs), np.float64, n)
+    values[:, 2] = np.fromiter((nan if a.low is None else a.low for a in aggs), np.float64, n)
+    values[:, 3] = np.fromiter((nan if a.close is None else a.close for a in aggs), np.float64, n)
+    values[:, 4] = np.fromiter((a.volume or 0 for a in aggs), np.float64, n)
+    stamps = np.fromiter((a.timestamp for a in aggs), np.int64, n).astype("datetime64[ms]")
+    return stamps, values
+
+
+def aggs_to_frame(aggs, float32: bool = False) -> pd.DataFrame:
+    """Build an OHLCV DataFrame straight from Polygon aggs (vectorized DatetimeIndex)."""
+    stamps, values = aggs_to_arrays(aggs, np.float32 if float32 else np.float64)
+    if not len(stamps):
+        return pd.DataFrame()
+    index = pd.DatetimeIndex(stamps.astype("datetime64[ns]"), name="Date")
+    return pd.DataFrame(values, index=index, columns=COLUMNS, copy=False)
+
+
+def get_daily_bars(ticker: str, days: int, float32: bool = False) -> pd.DataFrame:
+    """
+    Get the last `days` calendar days of daily bars, topping up the store first.
+    If Polygon is unreachable, whatever is already stored is returned.
+
+    The returned frame shares read-only buffers with other callers; assigning
+    columns on it is fine, writing into its arrays in place is not.
+    """
+    ticker = ticker.upper()
+    from_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    dtype = np.float32 if float32 else np.float64
+    key = (ticker, np.dtype(dtype).name)
+
+    with _ticker_lock(ticker):
+        synced = _last_sync.get(ticker)
+        fresh = synced is not None and time.monotonic() - synced < BAR_SYNC_INTERVAL
+        covered = ticker in _coverage and _coverage[ticker] <= from_date
+
+        if not (fresh and covered):
+            _sync(_get_db(), ticker, from_date)
+
+        cached = _frames.get(key)
+        if cached and cached[0] == _versions.get(ticker, 0) and cached[1] <= from_date:
+            df = cached[2]
+        else:
+            df = _read_frame(ticker, from_date, dtype)
+            _frames[key] = (_versions.get(ticker, 0), from_date, df)
+
+    if df.empty:
+        return pd.DataFrame()
+    if df.index[0] < pd.Timestamp(from_date):
+        df = df.loc[from_date:]
+    return df.copy(deep=False)
+
+
+def last_bar_date(ticker: str, before: str = None) -> str | None:
+    """Date of the newest stored bar for a ticker (before `before`, if given), without contacting Polygon."""
+    row = _get_db().execute(
+        "SELECT MAX(date) FROM daily_bars WHERE ticker = ? AND date < ?", (ticker.upper(), before or "9999-12-31")
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _read_frame(ticker: str, from_date: str, dtype) -> pd.DataFrame:
+    """Load stored bars into one preallocated array with a vectorized date index."""
+    rows = _get_db().execute(
+        "SELECT date, open, high, low, close, volume FROM daily_bars "
+        "WHERE ticker = ? AND date >= ? ORDER BY date",
+        (ticker, from_date)
+    ).fetchall()
+
+    if not rows:
+        return pd.DataFrame()
+
+    data = np.array(rows, dtype=object)
+    values = data[:, 1:].astype(dtype)
+    values.flags.writeable = False
+    index = pd.DatetimeIndex(data[:, 0].astype("datetime64[D]").astype("datetime64[ns]"), name="Date")
+    return pd.DataFrame(values, index=index, columns=COLUMNS, copy=False)
+
+
+def _sync(conn, ticker: str, from_date: str) -> None:
+    """Fetch whatever part of [from_date, today] is missing or possibly stale."""
+    today = datetime.now().strftime("%Y-%m-%d")
+    row = conn.execute(
+        "SELECT covered_from FROM bar_coverage WHERE ticker = ?", (ticker,)
+    ).fetchone()
+    covered_from = row[0] if row else None
+    if covered_from:
+        _coverage[ticker] = covered_from
+    last_date = conn.execute(
+        "SELECT MAX(date) FROM daily_bars WHERE ticker = ?", (ticker,)
+    ).fetchone()[0]
+
+    try:
+        # Older history than we have ever fetched
+        if covered_from is None or from_date < covered_from:
+            end = covered_from if (covered_from and last_date) else today
+            _fetch_into(conn, ticker, from_date, end)
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO bar_coverage (ticker, covered_from) VALUES (?, ?)",
+                    (ticker, from_date)
+                )
+            _coverage[ticker] = from_date
+            if end == today:
+                _last_sync[ticker] = time.monotonic()
+                return
+
+        # New bars since the last stored one
+        synced = _last_sync.get(ticker)
+        if synced is None or time.monotonic() - synced >= BAR_SYNC_INTERVAL:
+            _fetch_into(conn, ticker, last_date or from_date, today)
+            _last_sync[ticker] = time.monotonic()
+    except Exception as e:
+        logger.warning("Polygon aggs error for %s: %s", ticker, e)
+
+
+def _fetch_into(conn, ticker: str, from_date: str, to_date: str) -> int:
+    """Download daily aggs for [from_date, to_date] and upsert them."""
+    aggs = _client.get_aggs(
+        ticker, 1, "day", from_date, to_date,
+        adjusted=True, sort="asc", limit=50000,
+    )
+    stamps, values = aggs_to_arrays(aggs)
+    if not len(stamps):
+        return 0
+
+    # Daily bars are stamped at midnight ET, which is the same UTC calendar date
+    dates = stamps.astype("datetime64[D]").astype(str).tolist()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO daily_bars (ticker, date, open, high, low, close, volume) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(ticker, d, *v) for d, v in zip(dates, values.tolist())]
+        )
+    _versions[ticker] = _versions.get(ticker, 0) + 1
+    return len(dates)
+
+
+# --- Minute bars ---
+
+def get_intraday_frame(ticker: str, timeframe: str = "5m", days: int = 5, float32: bool = False) -> pd.DataFrame:
+    """
+    OHLCV frame of `timeframe` bars (see resample.TIMEFRAMES) for the last
+    `days` calendar days, resampled from locally stored minute bars. The
+    index is UTC; the last bar may still be forming.
+    """
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"Unsupported timeframe {timeframe!r}; choose from {', '.join(TIMEFRAMES)}")
+    ticker = ticker.upper()
+    days = min(days, MINUTE_BAR_RETENTION_DAYS)
+    since = datetime.now() - timedelta(days=days)
+
+    sync_minute_bars(ticker)
+    bars = list(resample(iter_minute_bars(ticker, int(since.timestamp() * 1000)), TIMEFRAMES[timeframe]))
+    if not bars:
+        return pd.DataFrame()
+
+    data = np.array(bars, dtype=np.float64)
+    index = pd.DatetimeIndex(data[:, 0].astype("int64").astype("datetime64[ms]"), name="Date").tz_localize("UTC")
+    values = data[:, 1:].astype(np.float32 if float32 else np.float64)
+    return pd.DataFrame(values, index=index, columns=COLUMNS, copy=False)
+
+
+def iter_minute_bars(ticker: str, since_ms: int = 0):
+    """Stream stored minute bars (ts, o, h, l, c, v) in time order, a chunk at a time."""
+    cursor = _get_db().execute(
+        "SELECT ts, open, high, low, close, volume FROM minute_bars "
+        "WHERE ticker = ? AND ts >= ? ORDER BY ts",
+        (ticker.upper(), since_ms)
+    )
+    try:
+        while True:
+            rows = cursor.fetchmany(_MINUTE_CHUNK)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def sync_minute_bars(ticker: str) -> int:
+    """
+    Fetch minute bars from the day of the last stored one (or the start of
+    the retention window) through today, at most once per BAR_SYNC_INTERVAL,
+    and prune bars older than the retention window. Returns rows written.
+    """
+    ticker = ticker.upper()
+    with _ticker_lock(ticker):
+        synced = _minute_sync.get(ticker)
+        if synced is not None and time.monotonic() - synced < BAR_SYNC_INTERVAL:
+            return 0
+
+        cutoff = datetime.now() - timedelta(days=MINUTE_BAR_RETENTION_DAYS)
+        conn = _get_db()
+        last_ts = conn.execute(
+            "SELECT MAX(ts) FROM minute_bars WHERE ticker = ?", (ticker,)
+        ).fetchone()[0]
+        start = datetime.fromtimestamp(last_ts / 1000) if last_ts else cutoff
+        written = 0
+        try:
+            written = _fetch_minutes_into(
+                conn, ticker, start.strftime("%Y-%m-%d"), datetime.now().strftime("%Y-%m-%d")
+            )
+            _minute_sync[ticker] = time.monotonic()
+        except Exception as e:
+            logger.warning("Polygon minute aggs error for %s: %s", ticker, e)
+        with conn:
+            conn.execute(
+                "DELETE FROM minute_bars WHERE ticker = ? AND ts < ?",
+                (ticker, int(cutoff.timestamp() * 1000))
+            )
+        return written
+
+
+def _fetch_minutes_into(conn, ticker: str, from_date: str, to_date: str) -> int:
+    """Page through minute aggs for [from_date, to_date], upserting each page as it arrives."""
+    sql = ("INSERT OR REPLACE INTO minute_bars (ticker, ts, open, high, low, close, volume) "
+           "VALUES (?, ?, ?, ?, ?, ?, ?)")
+    batch, written = [], 0
+    for a in _client.list_aggs(ticker, 1, "minute", from_date, to_date,
+                               adjusted=True, sort="asc", limit=50000):
+        if not a.timestamp:
+            continue
+        batch.append((ticker, a.timestamp, a.open, a.high, a.low, a.close, a.volume or 0))
+        if len(batch) >= _MINUTE_CHUNK:
+            with conn:
+                conn.executemany(sql, batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        with conn:
+            conn.executemany(sql, batch)
+        written += len(batch)
+    return written
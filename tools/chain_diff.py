@@ -0,0 +1,145 @@
+"""
+Intraday chain snapshot diffing.
+
+Polygon's chain snapshot only carries cumulative day volume, so a scan on
+its own can't tell when the flow happened. This module keeps the previous
+scan's chain per ticker as a compact snapshot: symbols sorted once, plus
+int64 volume and open interest. The next scan's chain is joined against it
+by contract with np.searchsorted, so per-contract deltas for a whole chain
+are a handful of array operations, with no per-contract dict lookups.
+
+Snapshots are stored in the IV database (table chain_snapshots,
+zlib-compressed columns), so a restarted collector keeps diffing against
+its last scan. Day volume resets at the open. A snapshot from an earlier
+trading day (US/Eastern date) therefore counts as no snapshot: the first
+scan of a day sees all of the day's flow as new.
+"""
+
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+import numpy as np
+from tools import db
+from config import DB_PATH
+
+_EASTERN = ZoneInfo("America/New_York")
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS chain_snapshots (
+        ticker TEXT PRIMARY KEY,
+        date TEXT NOT NULL,
+        taken_at TEXT NOT NULL,
+        symbols BLOB NOT NULL,
+        volume BLOB NOT NULL,
+        open_interest BLOB NOT NULL
+    );
+"""
+
+
+@dataclass(frozen=True)
+class ChainSnapshot:
+    """Per-contract day volume and open interest at one scan, sorted by symbol."""
+    date: str                   # US/Eastern trading date, "YYYY-MM-DD"
+    taken_at: str               # ISO timestamp (UTC)
+    symbols: np.ndarray         # sorted, fixed-width unicode
+    volume: np.ndarray          # int64
+    open_interest: np.ndarray   # int64
+
+    @classmethod
+    def from_frame(cls, frame, now: datetime = None) -> tuple["ChainSnapshot", np.ndarray]:
+        """
+        Snapshot of a ChainFrame (missing volume / OI count as 0), and the
+        sort order used: snapshot row k is frame row order[k].
+        """
+        now = now or datetime.now(timezone.utc)
+        symbols = np.asarray(frame.symbol, dtype=str)
+        order = np.argsort(symbols, kind="stable")
+        snap = cls(
+            date=now.astimezone(_EASTERN).strftime("%Y-%m-%d"),
+            taken_at=now.isoformat(timespec="seconds"),
+            symbols=symbols[order],
+            volume=np.nan_to_num(frame.volume[order]).astype(np.int64),
+            open_interest=np.nan_to_num(frame.open_interest[order]).astype(np.int64),
+        )
+        return snap, order
+
+
+def diff(previous: ChainSnapshot | None, current: ChainSnapshot) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Volume and open interest change since `previous`, per row of `current`.
+    Contracts not in `previous` report their full current values, as does
+    everything when `previous` is missing or from an earlier day. Negative
+    volume deltas (feed corrections) are clipped to 0.
+    """
+    if previous is None or previous.date != current.date or not len(previous.symbols):
+        return current.volume.copy(), current.open_interest.copy()
+
+    prev = _lookup(previous.symbols, current.symbols)
+    seen = prev >= 0
+    volume = np.where(seen, np.maximum(current.volume - previous.volume[prev], 0), current.volume)
+    oi = np.where(seen, current.open_interest - previous.open_interest[prev], current.open_interest)
+    return volume, oi
+
+
+def interval_flow(ticker: str, frame, now: datetime = None) -> tuple[np.ndarray, np.ndarray, str | None]:
+    """
+    Per-row (volume delta, OI delta) for a freshly fetched chain against the
+    ticker's stored snapshot, and the time of that snapshot (None when the
+    deltas are the whole day's). The frame then becomes the stored snapshot.
+    """
+    ticker = ticker.upper()
+    current, order = ChainSnapshot.from_frame(frame, now)
+    previous = load(ticker)
+    sorted_volume, sorted_oi = diff(previous, current)
+    volume, oi = np.empty_like(sorted_volume), np.empty_like(sorted_oi)
+    volume[order], oi[order] = sorted_volume, sorted_oi
+    since = previous.taken_at if previous is not None and previous.date == current.date else None
+    save(ticker, current)
+    return volume, oi, since
+
+
+def _lookup(sorted_symbols: np.ndarray, symbols: np.ndarray) -> np.ndarray:
+    """Index of each symbol in `sorted_symbols`, -1 where absent (fastest when `symbols` is sorted too)."""
+    if not len(sorted_symbols):
+        return np.full(len(symbols), -1, dtype=np.int64)
+    pos = np.searchsorted(sorted_symbols, symbols)
+    clipped = np.minimum(pos, len(sorted_symbols) - 1)
+    return np.where(sorted_symbols[clipped] == symbols, clipped, -1)
+
+
+# --- Storage ---
+
+def _get_db():
+    """This thread's pooled connection to the IV database (snapshot table ensured once)."""
+    return db.connect(DB_PATH, _SCHEMA)
+
+
+def save(ticker: str, snap: ChainSnapshot) -> None:
+    """Replace the ticker's stored snapshot."""
+    with _get_db() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO chain_snapshots (ticker, date, taken_at, symbols, volume, open_interest) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (ticker, snap.date, snap.taken_at, zlib.compress("\n".join(snap.symbols.tolist()).encode()),
+             zlib.compress(snap.volume.tobytes()), zlib.compress(snap.open_interest.tobytes()))
+        )
+
+
+def load(ticker: str) -> ChainSnapshot | None:
+    """The ticker's stored snapshot, or None."""
+    row = _get_db().execute(
+        "SELECT date, taken_at, symbols, volume, open_interest FROM chain_snapshots WHERE ticker = ?",
+        (ticker.upper(),)
+    ).fetchone()
+    if row is None:
+        return None
+    date, taken_at, symbols, volume, oi = row
+    text = zlib.decompress(symbols).decode()
+    return ChainSnapshot(
+        date=date,
+        taken_at=taken_at,
+        symbols=np.array(text.split("\n") if text else [], dtype=str),
+        volume=np.frombuffer(zlib.decompress(volume), dtype=np.int64),
+        open_interest=np.frombuffer(zlib.decompress(oi), dtype=np.int64),
+    )
@@ -0,0 +1,203 @@
+"""
+Columnar options chain representation.
+
+ChainFrame stores one NumPy array per contract field instead of one dict per
+contract, so filtering, ATM lookup, put/call totals and per-expiry
+aggregation run as array operations over the whole chain.
+Missing numeric values are NaN.
+"""
+
+from dataclasses import dataclass, fields
+from datetime import datetime
+import numpy as np
+
+
+@dataclass
+class ChainFrame:
+    """Options chain snapshot stored as parallel NumPy arrays (one row per contract)."""
+    symbol: np.ndarray         # option ticker, e.g. "O:SPY250321C00500000"
+    contract_type: np.ndarray  # "call" / "put"
+    expiration: np.ndarray     # "YYYY-MM-DD"
+    strike: np.ndarray
+    bid: np.ndarray
+    ask: np.ndarray
+    midpoint: np.ndarray       # quote midpoint as reported by Polygon
+    volume: np.ndarray
+    open_interest: np.ndarray
+    iv: np.ndarray
+    delta: np.ndarray
+    gamma: np.ndarray
+    theta: np.ndarray
+    vega: np.ndarray
+    break_even: np.ndarray
+
+    @classmethod
+    def from_snapshots(cls, snapshots) -> "ChainFrame":
+        """Build a frame from Polygon OptionContractSnapshot objects (skips rows without details)."""
+        rows = [o for o in snapshots if o.details]
+        n = len(rows)
+        symbol = np.empty(n, dtype=object)
+        contract_type = np.empty(n, dtype=object)
+        expiration = np.empty(n, dtype="U10")
+        values = []
+        nan = np.nan
+
+        for i, o in enumerate(rows):
+            d = o.details
+            q = o.last_quote
+            g = o.greeks
+            symbol[i] = d.ticker or ""
+            contract_type[i] = d.contract_type or ""
+            expiration[i] = d.expiration_date or ""
+            values.append((
+                d.strike_price if d.strike_price is not None else nan,
+                q.bid if q and q.bid is not None else nan,
+                q.ask if q and q.ask is not None else nan,
+                q.midpoint if q and q.midpoint is not None else nan,
+                o.day.volume if o.day and o.day.volume is not None else nan,
+                o.open_interest if o.open_interest is not None else nan,
+                o.implied_volatility if o.implied_volatility is not None else nan,
+                g.delta if g and g.delta is not None else nan,
+                g.gamma if g and g.gamma is not None else nan,
+                g.theta if g and g.theta is not None else nan,
+                g.vega if g and g.vega is not None else nan,
+                o.break_even_price if o.break_even_price is not None else nan,
+            ))
+
+        num = np.array(values, dtype=np.float64).reshape(n, 12).T
+        return cls(symbol, contract_type, expiration, *num)
+
+    @classmethod
+    def empty(cls) -> "ChainFrame":
+        return cls.from_snapshots([])
+
+    def __len__(self) -> int:
+        return len(self.strike)
+
+    def take(self, index) -> "ChainFrame":
+        """Return a new frame with the rows selected by a boolean mask or index array."""
+        return ChainFrame(*(getattr(self, f.name)[index] for f in fields(self)))
+
+    # --- Derived columns ---
+
+    @property
+    def is_call(self) -> np.ndarray:
+        return self.contract_type == "call"
+
+    def mid(self) -> np.ndarray:
+        """(bid + ask) / 2 with missing quotes treated as 0."""
+        return (np.nan_to_num(self.bid) + np.nan_to_num(self.ask)) / 2
+
+    def dte(self, today=None) -> np.ndarray:
+        """Days to expiry per contract (0 where the expiration is missing)."""
+        today = np.datetime64(today or datetime.now().date(), "D")
+        exp = self.expiration.astype("datetime64[D]")
+        days = (exp - today).astype(np.int64)
+        days[np.isnat(exp)] = 0
+        return days
+
+    # --- Queries ---
+
+    def select(
+        self,
+        expiration_gte: str = None,
+        expiration_lte: str = None,
+        contract_type: str = None,
+        strike_gte: float = None,
+        strike_lte: float = None,
+    ) -> "ChainFrame":
+        """Filter by expiry window, contract type and strike band."""
+        mask = np.ones(len(self), dtype=bool)
+        if expiration_gte:
+            mask &= self.expiration >= expiration_gte
+        if expiration_lte:
+            mask &= self.expiration <= expiration_lte
+        if contract_type:
+            mask &= self.contract_type == contract_type
+        strike = np.nan_to_num(self.strike)
+        if strike_gte is not None:
+            mask &= strike >= strike_gte
+        if strike_lte is not None:
+            mask &= strike <= strike_lte
+        return self if mask.all() else self.take(mask)
+
+    def expirations(self) -> list[str]:
+        """Sorted unique expiration dates."""
+        return np.unique(self.expiration).tolist()
+
+    def atm_index(self, price: float, expiration: str = None, contract_type: str = "call",
+                  require_iv: bool = False) -> int | None:
+        """
+        Row index of the contract whose strike is closest to price.
+        Optionally restricted to one expiration and to rows with a positive IV.
+        Ties resolve to the first row, matching min() over the original order.
+        """
+        mask = self.contract_type == contract_type
+        if expiration is not None:
+            mask &= self.expiration == expiration
+        if require_iv:
+            mask &= self.iv > 0
+        if not mask.any():
+            return None
+        dist = np.where(mask, np.abs(np.nan_to_num(self.strike) - price), np.inf)
+        return int(np.argmin(dist))
+
+    def totals(self) -> dict:
+        """Total call/put volume and open interest."""
+        is_call = self.is_call
+        vol = np.nan_to_num(self.volume)
+        oi = np.nan_to_num(self.open_interest)
+        return {
+            "call_volume": int(vol[is_call].sum()),
+            "put_volume": int(vol[~is_call].sum()),
+            "call_oi": int(oi[is_call].sum()),
+            "put_oi": int(oi[~is_call].sum()),
+        }
+
+    def put_call_ratios(self) -> tuple[float | None, float | None]:
+        """(put/call volume ratio, put/call OI ratio); None when the call side is zero."""
+        t = self.totals()
+        vol_ratio = t["put_volume"] / t["call_volume"] if t["call_volume"] > 0 else None
+        oi_ratio = t["put_oi"] / t["call_oi"] if t["call_oi"] > 0 else None
+        return vol_ratio, oi_ratio
+
+    def by_expiry(self) -> list[dict]:
+        """Per-expiration contract counts, volume and OI split by side, sorted by date."""
+        if len(self) == 0:
+            return []
+        expiries, inverse = np.unique(self.expiration, return_inverse=True)
+        k = len(expiries)
+        is_call = self.is_call
+        vol = np.nan_to_num(self.volume)
+        oi = np.nan_to_num(self.open_interest)
+
+        def _sum(values, mask):
+            return np.bincount(inverse[mask], weights=values[mask], minlength=k)
+
+        counts = np.bincount(inverse, minlength=k)
+        call_vol, put_vol = _sum(vol, is_call), _sum(vol, ~is_call)
+        call_oi, put_oi = _sum(oi, is_call), _sum(oi, ~is_call)
+        return [
+            {
+                "expiration": str(expiries[j]),
+                "contracts": int(counts[j]),
+                "call_volume": int(call_vol[j]),
+                "put_volume": int(put_vol[j]),
+                "call_oi": int(call_oi[j]),
+                "put_oi": int(put_oi[j]),
+                "put_call_volume_ratio": float(put_vol[j] / call_vol[j]) if call_vol[j] > 0 else None,
+            }
+            for j in range(k)
+        ]
+
+    def record(self, i: int) -> dict:
+        """Row i as a plain dict of Python scalars (NaN -> None)."""
+        out = {}
+        for f in fields(self):
+            v = getattr(self, f.name)[i]
+            if isinstance(v, np.floating):
+                v = None if np.isnan(v) else float(v)
+            elif isinstance(v, np.str_):
+                v = str(v)
+            out[f.name] = v
+        return out
@@ -0,0 +1,253 @@
+"""
+Shared options chain snapshot store.
+
+Fetches the widest expiration window any tool needs (0 to CHAIN_CACHE_MAX_DTE)
+once per ticker via Polygon's chain snapshot, keeps it for CHAIN_CACHE_TTL
+seconds as a ChainFrame, and serves filtered views to every caller. A
+full_analysis run therefore downloads each chain once instead of once per tool.
+
+Lookups that only need the at-the-money contract use get_atm_contracts, which
+on a cold cache asks Polygon for a strike band around spot (sized from ATR),
+sorted by option ticker, and stops paging once the needed expiries are settled.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from tools import polygon_client as _client
+from tools.bar_store import get_daily_bars
+from tools.chain_frame import ChainFrame
+from config import CHAIN_CACHE_TTL, CHAIN_CACHE_MAX_DTE, NEAR_ATM_ATR_MULT, NEAR_ATM_MIN_BAND
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Max page size accepted by the chain snapshot endpoint
+_PAGE_LIMIT = 250
+
+# ticker -> (fetched_at, window_gte, window_lte, frame)
+_cache: dict[str, tuple[float, str, str, ChainFrame]] = {}
+_locks: dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def dte_window(min_dte: int, max_dte: int) -> tuple[str, str]:
+    """Convert a DTE range into (expiration_gte, expiration_lte) date strings."""
+    now = datetime.now()
+    return (
+        (now + timedelta(days=min_dte)).strftime("%Y-%m-%d"),
+        (now + timedelta(days=max_dte)).strftime("%Y-%m-%d"),
+    )
+
+
+def get_chain(
+    ticker: str,
+    expiration_gte: str = None,
+    expiration_lte: str = None,
+    contract_type: str = None,
+    strike_gte: float = None,
+    strike_lte: float = None,
+) -> ChainFrame:
+    """
+    Get the options chain for a ticker as a ChainFrame, filtered to the given window.
+
+    Windows inside the cached range are served from memory; anything wider
+    is fetched directly and not cached. Polygon errors propagate to the caller.
+
+    Args:
+        ticker: Underlying symbol
+        expiration_gte: Earliest expiry "YYYY-MM-DD" (default: today)
+        expiration_lte: Latest expiry (default: CHAIN_CACHE_MAX_DTE days out)
+        contract_type: "call" or "put", None for both
+        strike_gte: Minimum strike
+        strike_lte: Maximum strike
+    """
+    ticker = ticker.upper()
+    window_gte, window_lte = dte_window(0, CHAIN_CACHE_MAX_DTE)
+    expiration_gte = expiration_gte or window_gte
+    expiration_lte = expiration_lte or window_lte
+
+    if expiration_gte < window_gte or expiration_lte > window_lte:
+        params = {
+            "expiration_date.gte": expiration_gte,
+            "expiration_date.lte": expiration_lte,
+            "limit": _PAGE_LIMIT,
+        }
+        if contract_type:
+            params["contract_type"] = contract_type
+        if strike_gte is not None:
+            params["strike_price.gte"] = strike_gte
+        if strike_lte is not None:
+            params["strike_price.lte"] = strike_lte
+        return ChainFrame.from_snapshots(_client.list_snapshot_options_chain(ticker, params=params))
+
+    return _load(ticker).select(
+        expiration_gte, expiration_lte, contract_type, strike_gte, strike_lte,
+    )
+
+
+def get_atm_contracts(
+    ticker: str,
+    price: float,
+    expiration_gte: str,
+    expiration_lte: str,
+    contract_type: str = None,
+    expirations: int = 1,
+    require_iv: bool = False,
+) -> ChainFrame:
+    """
+    The contract closest to `price` for each (expiration, contract type), for
+    the first `expirations` expiries in the window (None for all of them).
+
+    A fresh cached chain is used when it covers the window. Otherwise only
+    strikes within the ATR band around spot are requested, and the page
+    stream is abandoned as soon as the requested expiries are settled.
+    Polygon errors propagate to the caller.
+    """
+    ticker = ticker.upper()
+    types = [contract_type] if contract_type else ["call", "put"]
+    low, high = strike_band(ticker, price)
+
+    entry = _cache.get(ticker)
+    if entry is not None:
+        fetched_at, cached_gte, cached_lte, frame = entry
+        # As in _load, a cache filled yesterday is not used
+        if (time.monotonic() - fetched_at < CHAIN_CACHE_TTL and cached_gte == dte_window(0, 0)[0]
+                and cached_gte <= expiration_gte and expiration_lte <= cached_lte):
+            frame = frame.select(expiration_gte, expiration_lte, contract_type, low, high)
+            picks, found = [], 0
+            for exp in frame.expirations():
+                if expirations is not None and found >= expirations:
+                    break
+                hits = [i for t in types if (i := frame.atm_index(price, exp, t, require_iv)) is not None]
+                picks += hits
+                found += bool(hits)
+            return frame.take(picks)
+
+    params = {
+        "expiration_date.gte": expiration_gte,
+        "expiration_date.lte": expiration_lte,
+        "strike_price.gte": low,
+        "strike_price.lte": high,
+        "sort": "ticker",
+        "order": "asc",
+        "limit": _PAGE_LIMIT,
+    }
+    if contract_type:
+        params["contract_type"] = contract_type
+    stream = _client.list_snapshot_options_chain(ticker, params=params)
+    return ChainFrame.from_snapshots(_settle_atm(stream, price, len(types), expirations, require_iv))
+
+
+def strike_band(ticker: str, price: float) -> tuple[float, float]:
+    """(strike_gte, strike_lte) around price: NEAR_ATM_ATR_MULT x ATR(14), with a floor."""
+    half = price * NEAR_ATM_MIN_BAND
+    try:
+        df = get_daily_bars(ticker, 30)
+        if len(df) >= 15:
+            high, low, close = (df[c].to_numpy() for c in ("High", "Low", "Close"))
+            prev = close[-15:-1]
+            tr = np.maximum(high[-14:] - low[-14:],
+                            np.maximum(np.abs(high[-14:] - prev), np.abs(low[-14:] - prev)))
+            atr = float(np.nanmean(tr))
+            if atr > 0:
+                half = max(half, NEAR_ATM_ATR_MULT * atr)
+    except Exception as e:
+        logger.warning("ATR unavailable for %s, using default strike band: %s", ticker, e)
+    return round(price - half, 2), round(price + half, 2)
+
+
+def _settle_atm(stream, price: float, types_per_expiry: int, expirations: int | None,
+                require_iv: bool) -> list:
+    """
+    Pick the closest-strike snapshot per (expiration, type) from a stream
+    sorted by option ticker (expiration, then type, then ascending strike).
+    A group is settled once a strike at or above price is seen, or the stream
+    moves to the next group. An expiry is done once all its types are settled
+    or the stream moves to a later expiry (some expiries only list one side
+    within the strike band); iteration stops after the needed expiries.
+    """
+    picks = []
+    settled: set = set()
+    done: set = set()
+    group, best = None, None
+
+    def _finish():
+        if best is not None:
+            picks.append(best)
+        settled.add(group)
+        if sum(1 for g in settled if g[0] == group[0]) == types_per_expiry:
+            done.add(group[0])
+
+    def _enough():
+        return expirations is not None and len(done) >= expirations
+
+    for snap in stream:
+        d = snap.details
+        if d is None or d.strike_price is None:
+            continue
+        if require_iv and not (snap.implied_volatility or 0) > 0:
+            continue
+        key = (d.expiration_date, d.contract_type)
+        if key in settled:
+            continue
+        if key != group:
+            if group is not None:
+                if group not in settled:
+                    _finish()
+                if key[0] != group[0]:
+                    done.add(group[0])
+                if _enough():
+                    return picks
+            group, best = key, None
+
+        # Strictly closer wins, so ties keep the lower strike
+        if best is None or abs(d.strike_price - price) < abs(best.details.strike_price - price):
+            best = snap
+        if d.strike_price >= price:
+            _finish()
+            if _enough():
+                return picks
+
+    if group is not None and group not in settled:
+        _finish()
+    return picks
+
+
+def invalidate(ticker: str = None) -> None:
+    """Drop the cached chain for one ticker, or for all tickers."""
+    if ticker is None:
+        _cache.clear()
+    else:
+        _cache.pop(ticker.upper(), None)
+
+
+def _ticker_lock(ticker: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(ticker, threading.Lock())
+
+
+def _load(ticker: str) -> ChainFrame:
+    """Return the cached wide-window chain, fetching it if missing or stale."""
+    with _ticker_lock(ticker):
+        window_gte, window_lte = dte_window(0, CHAIN_CACHE_MAX_DTE)
+        entry = _cache.get(ticker)
+        if entry is not None:
+            fetched_at, cached_gte, cached_lte, frame = entry
+            fresh = time.monotonic() - fetched_at < CHAIN_CACHE_TTL
+            # A cache filled yesterday no longer starts at today's date
+            if fresh and cached_gte == window_gte:
+                return frame
+
+        frame = ChainFrame.from_snapshots(_client.list_snapshot_options_chain(
+            ticker,
+            params={
+                "expiration_date.gte": window_gte,
+                "expiration_date.lte": window_lte,
+                "limit": _PAGE_LIMIT,
+            },
+        ))
+        _cache[ticker] = (time.monotonic(), window_gte, window_lte, frame)
+        logger.debug("Cached %d contracts for %s", len(frame), ticker)
+        return frame
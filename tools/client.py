@@ -0,0 +1,203 @@
+"""
+Polygon REST client used by every module under tools/.
+
+PolygonClient swaps the library's HTTP pool for a transport that:
+- keeps a keep-alive pool sized for concurrent fetches, with real timeouts
+- draws one token from the shared rate limiter per HTTP attempt
+- retries 429 / 5xx / timeouts with jittered exponential backoff
+- trips a per-endpoint circuit breaker after repeated failures
+- records per-endpoint latency histograms (see latency_stats())
+"""
+
+import random
+import re
+import threading
+import time
+import certifi
+import urllib3
+from polygon import RESTClient
+from tools.fetch import limiter
+from config import (
+    POLYGON_POOL_SIZE, POLYGON_TIMEOUT, POLYGON_MAX_RETRIES,
+    POLYGON_BACKOFF_BASE, POLYGON_BACKOFF_MAX,
+    BREAKER_FAILURE_THRESHOLD, BREAKER_COOLDOWN,
+)
+from log import get_logger
+
+logger = get_logger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+_ENDPOINT_SEGMENT = re.compile(r"^(v\d+|[a-z_]+)$")
+
+
+class CircuitOpenError(Exception):
+    """Raised without touching the network while an endpoint's breaker is open."""
+
+
+def endpoint_key(url: str) -> str:
+    """Collapse a request URL into an endpoint name, dropping tickers, dates and numbers."""
+    path = url.split("://", 1)[-1].split("?", 1)[0]
+    segments = path.split("/")[1:]
+    return "/" + "/".join(s for s in segments if _ENDPOINT_SEGMENT.match(s))
+
+
+class _Breaker:
+    """Consecutive-failure circuit breaker: closed -> open -> half-open (one probe) -> closed."""
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def allow(self, now: float) -> bool:
+        if self.opened_at is None:
+            return True
+        if now - self.opened_at >= BREAKER_COOLDOWN and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record(self, ok: bool, now: float) -> None:
+        self.probing = False
+        if ok:
+            self.failures = 0
+            self.opened_at = None
+            return
+        self.failures += 1
+        if self.failures >= BREAKER_FAILURE_THRESHOLD:
+            self.opened_at = now
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.errors = 0
+        self.retries = 0
+
+    def observe(self, ms: float) -> None:
+        self.count += 1
+        self.total_ms += ms
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                break
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bucket bound containing the q-th observation."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += n
+            if seen >= target:
+                return bound
+        return LATENCY_BUCKETS_MS[-1]
+
+
+class _ResilientTransport:
+    """Drop-in for the urllib3 PoolManager used by polygon's BaseClient."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._breakers: dict[str, _Breaker] = {}
+        self._stats: dict[str, _EndpointStats] = {}
+
+    def request(self, method, url, fields=None, headers=None, **kwargs):
+        endpoint = endpoint_key(url)
+        with self._lock:
+            breaker = self._breakers.setdefault(endpoint, _Breaker())
+            stats = self._stats.setdefault(endpoint, _EndpointStats())
+
+        for attempt in range(POLYGON_MAX_RETRIES + 1):
+            with self._lock:
+                if not breaker.allow(time.monotonic()):
+                    raise CircuitOpenError(f"Circuit open for {endpoint}")
+
+            limiter.acquire()
+            start = time.perf_counter()
+            resp, error = None, None
+            try:
+                resp = self.pool.request(method, url, fields=fields, headers=headers, **kwargs)
+            except (urllib3.exceptions.TimeoutError, urllib3.exceptions.ProtocolError,
+                    urllib3.exceptions.NewConnectionError) as e:
+                error = e
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            retryable = error is not None or resp.status in RETRY_STATUSES
+            with self._lock:
+                stats.observe(elapsed_ms)
+                breaker.record(not retryable, time.monotonic())
+                if retryable:
+                    stats.errors += 1
+                    if attempt < POLYGON_MAX_RETRIES:
+                        stats.retries += 1
+
+            if not retryable:
+                return resp
+            if attempt == POLYGON_MAX_RETRIES:
+                if error is not None:
+                    raise error
+                return resp
+
+            delay = random.uniform(0, min(POLYGON_BACKOFF_MAX, POLYGON_BACKOFF_BASE * 2 ** attempt))
+            retry_after = resp.headers.get("Retry-After") if resp is not None else None
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, min(float(retry_after), POLYGON_BACKOFF_MAX))
+            logger.debug("%s %s failed (%s), retry %d in %.2fs", method, endpoint,
+                         error or resp.status, attempt + 1, delay)
+            time.sleep(delay)
+
+    def latency_stats(self) -> dict:
+        with self._lock:
+            return {
+                endpoint: {
+                    "requests": s.count,
+                    "errors": s.errors,
+                    "retries": s.retries,
+                    "mean_ms": round(s.total_ms / s.count, 1) if s.count else None,
+                    "p50_ms": s.quantile(0.5),
+                    "p95_ms": s.quantile(0.95),
+                    "histogram": dict(zip(map(str, LATENCY_BUCKETS_MS), s.buckets)),
+                    "circuit_open": self._breakers[endpoint].opened_at is not None,
+                }
+                for endpoint, s in self._stats.items()
+            }
+
+
+class PolygonClient(RESTClient):
+    """RESTClient with a pooled, rate-limited, retrying and instrumented transport."""
+
+    def __init__(self, api_key: str, pool=None, **kwargs):
+        """
+        Args:
+            api_key: Polygon API key
+            pool: Object with a urllib3-style request() to send HTTP through
+                  (e.g. a replay pool); defaults to a tuned keep-alive PoolManager
+        """
+        # Retries are handled by the transport; the library's own would bypass the limiter
+        super().__init__(api_key=api_key, retries=0, **kwargs)
+        self.client = _ResilientTransport(pool or self.default_pool())
+
+    def default_pool(self) -> urllib3.PoolManager:
+        """Keep-alive pool to api.polygon.io with real connect/read timeouts."""
+        return urllib3.PoolManager(
+            num_pools=4,
+            maxsize=POLYGON_POOL_SIZE,
+            headers=self.headers,
+            ca_certs=certifi.where(),
+            cert_reqs="CERT_REQUIRED",
+            retries=False,
+            timeout=urllib3.Timeout(connect=POLYGON_TIMEOUT, read=POLYGON_TIMEOUT),
+        )
+
+    def latency_stats(self) -> dict:
+        """Per-endpoint request counts, errors, retries and latency histogram."""
+        return self.client.latency_stats()
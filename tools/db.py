@@ -0,0 +1,80 @@
+"""
+Shared SQLite access layer.
+
+Every store (IV history, bars, indicator state, TA result cache) gets its
+connections from here instead of opening one per call:
+
+- Connections are kept per thread and per database file, and reused.
+  Python's sqlite3 caches prepared statements per connection, so repeated
+  queries skip both connection setup and SQL parsing.
+- Each database is switched to WAL journaling the first time it is opened.
+  Readers (API requests) then never block on, or get blocked by, the
+  collector's writes.
+- Each schema is run once per file per process, not on every call.
+
+Callers must not close the connections they get. Writes should go through
+`with conn:`, which commits, or rolls back on error, so a pooled connection
+is never left holding a write transaction.
+"""
+
+import sqlite3
+import threading
+from config import SQLITE_BUSY_TIMEOUT
+
+_local = threading.local()
+_initialized: set[tuple[str, str]] = set()
+_init_lock = threading.Lock()
+
+# Prepared statements kept per connection
+_STATEMENT_CACHE = 256
+
+
+def connect(path: str, schema: str = "") -> sqlite3.Connection:
+    """
+    This thread's connection to the database at `path`, opened on first use.
+    `schema` (CREATE ... IF NOT EXISTS statements) is executed once per
+    path per process.
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, cached_statements=_STATEMENT_CACHE)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conns[path] = conn
+    if schema and (path, schema) not in _initialized:
+        with _init_lock:
+            if (path, schema) not in _initialized:
+                conn.executescript(schema)
+                _initialized.add((path, schema))
+    return conn
+
+
+def ensure_columns(path: str, table: str, columns: dict[str, str]) -> None:
+    """
+    Add any of `columns` ({name: type}) missing from `table`, once per
+    process. This migrates databases created before the columns existed,
+    since CREATE TABLE IF NOT EXISTS leaves them untouched.
+    """
+    key = (path, f"{table}:{sorted(columns.items())}")
+    if key in _initialized:
+        return
+    with _init_lock:
+        if key in _initialized:
+            return
+        conn = connect(path)
+        present = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        with conn:
+            for name, sql_type in columns.items():
+                if name not in present:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}")
+        _initialized.add(key)
+
+
+def close_all() -> None:
+    """Close this thread's connections (e.g. before a worker thread exits)."""
+    for conn in getattr(_local, "conns", {}).values():
+        conn.close()
+    _local.conns = {}
@@ -0,0 +1,97 @@
+"""
+Concurrent fetch engine for Polygon calls.
+
+A process-wide token bucket caps the request rate at the plan quota, and
+batch operations fan out across tickers with bounded concurrency instead of
+sleeping between them. The Polygon client is synchronous, so each task runs
+in a worker thread driven by asyncio; the limiter is acquired per HTTP
+request (including each pagination page), not per task.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, TypeVar
+from config import POLYGON_REQUESTS_PER_MINUTE, FETCH_CONCURRENCY
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens/second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: float) -> float:
+        """Take tokens (possibly going negative) and return how long to wait for them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block the calling thread until the tokens are available."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1.0) -> None:
+        """Await until the tokens are available without blocking the event loop."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+_per_second = POLYGON_REQUESTS_PER_MINUTE / 60
+limiter = TokenBucket(rate=_per_second, capacity=max(1.0, _per_second))
+
+
+async def gather_map(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    concurrency: int = FETCH_CONCURRENCY,
+) -> list[R | Exception]:
+    """
+    Run the blocking func(item) for every item in worker threads, at most
+    `concurrency` at a time. Results come back in input order; a task that
+    raised yields its exception instead of a result.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def _run(item):
+        async with sem:
+            return await asyncio.to_thread(func, item)
+
+    return await asyncio.gather(*(_run(i) for i in items), return_exceptions=True)
+
+
+def fan_out(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    concurrency: int = FETCH_CONCURRENCY,
+) -> list[R | Exception]:
+    """Synchronous entry point for gather_map, usable from scripts and sync endpoints."""
+    items = list(items)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(gather_map(func, items, concurrency))
+
+    # Already inside an event loop (e.g. called from an async handler): use plain threads
+    def _safe(item):
+        try:
+            return func(item)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        return list(pool.map(_safe, items))
@@ -0,0 +1,169 @@
+"""
+Vectorized Black-Scholes implied volatility and Greeks.
+
+Everything works on NumPy arrays for a whole chain at once:
+
+- implied_vol solves for IV with a safeguarded Newton iteration. Each
+  contract keeps a [lo, hi] bracket, and steps that would leave it fall
+  back to bisection. That is quadratic near the root and cannot diverge on
+  deep ITM/OTM or nearly expired contracts.
+- Greeks follow Polygon's conventions: theta per calendar day, vega per
+  1 vol point.
+
+Time to expiry is measured to 16:00 ET on the expiration date, so 0-2 DTE
+contracts get a real (fractional-day) tenor. There are no dividends, and
+American early exercise is ignored, as in Polygon's own Greeks.
+"""
+
+from dataclasses import replace
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+import numpy as np
+from config import RISK_FREE_RATE
+
+_EASTERN = ZoneInfo("America/New_York")
+_SECONDS_PER_YEAR = 365 * 86400
+_SQRT_2PI = np.sqrt(2 * np.pi)
+
+# Volatility bracket searched by the solver
+_VOL_LO, _VOL_HI = 1e-4, 5.0
+
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    """Standard normal CDF via a Chebyshev erfc fit (relative error < 1.2e-7)."""
+    z = np.abs(x) / np.sqrt(2)
+    t = 1 / (1 + 0.5 * z)
+    poly = -z * z - 1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (
+        -0.18628806 + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (
+            -0.82215223 + t * 0.17087277))))))))
+    erfc = t * np.exp(poly)
+    return np.where(x >= 0, 1 - 0.5 * erfc, 0.5 * erfc)
+
+
+def norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) / _SQRT_2PI
+
+
+def years_to_expiry(expiration: np.ndarray, now: datetime = None) -> np.ndarray:
+    """Years from `now` to 16:00 ET on each "YYYY-MM-DD" expiration (NaN if missing)."""
+    now = now or datetime.now(timezone.utc)
+    expiries, inverse = np.unique(expiration, return_inverse=True)
+    years = np.full(len(expiries), np.nan)
+    for i, exp in enumerate(expiries):
+        try:
+            close = datetime.strptime(str(exp), "%Y-%m-%d").replace(hour=16, tzinfo=_EASTERN)
+        except ValueError:
+            continue
+        years[i] = (close - now).total_seconds() / _SECONDS_PER_YEAR
+    return years[inverse]
+
+
+def bs_price(is_call, spot, strike, t, sigma, r=RISK_FREE_RATE) -> np.ndarray:
+    """Black-Scholes option value."""
+    sqrt_t = np.sqrt(t)
+    d1 = (np.log(spot / strike) + (r + 0.5 * sigma * sigma) * t) / (sigma * sqrt_t)
+    d2 = d1 - sigma * sqrt_t
+    disc = strike * np.exp(-r * t)
+    call = spot * norm_cdf(d1) - disc * norm_cdf(d2)
+    return np.where(is_call, call, call - spot + disc)
+
+
+def implied_vol(price, is_call, spot, strike, t, r=RISK_FREE_RATE,
+                tol: float = 1e-6, max_iter: int = 60) -> np.ndarray:
+    """
+    Implied volatility per contract; NaN where the price is outside the
+    no-arbitrage bounds or any input is missing. Converges to |price error| < tol.
+    """
+    price, spot, strike, t = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64)
+                                                   for a in (price, spot, strike, t)))
+    is_call = np.broadcast_to(np.asarray(is_call, dtype=bool), price.shape)
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        disc = strike * np.exp(-r * t)
+        lower = np.maximum(np.where(is_call, spot - disc, disc - spot), 0)
+        upper = np.where(is_call, spot, disc)
+        ok = (np.isfinite(price) & np.isfinite(spot) & np.isfinite(strike) & (t > 0)
+              & (spot > 0) & (strike > 0) & (price > lower) & (price < upper))
+
+    out = np.full(price.shape, np.nan)
+    idx = np.flatnonzero(ok)
+    p, c, s, k, tt = (a[idx] for a in (price, is_call, spot, strike, t))
+    lo = np.full(len(idx), _VOL_LO)
+    hi = np.full(len(idx), _VOL_HI)
+    # Brenner-Subrahmanyam seed, kept inside the bracket
+    x = np.clip(np.sqrt(2 * np.pi / tt) * p / s, 0.05, 2.0)
+
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        for _ in range(max_iter):
+            if not len(idx):
+                break
+            sqrt_t = np.sqrt(tt)
+            d1 = (np.log(s / k) + (r + 0.5 * x * x) * tt) / (x * sqrt_t)
+            disc = k * np.exp(-r * tt)
+            call = s * norm_cdf(d1) - disc * norm_cdf(d1 - x * sqrt_t)
+            diff = np.where(c, call, call - s + disc) - p
+            vega = s * norm_pdf(d1) * sqrt_t
+
+            done = (np.abs(diff) < tol) | (hi - lo < 1e-10)
+            out[idx[done]] = x[done]
+            keep = ~done
+            idx, p, c, s, k, tt = idx[keep], p[keep], c[keep], s[keep], k[keep], tt[keep]
+            x, diff, vega, lo, hi = x[keep], diff[keep], vega[keep], lo[keep], hi[keep]
+
+            hi = np.where(diff > 0, x, hi)
+            lo = np.where(diff < 0, x, lo)
+            newton = x - diff / vega
+            x = np.where((newton > lo) & (newton < hi), newton, 0.5 * (lo + hi))
+    return out
+
+
+def greeks(is_call, spot, strike, t, sigma, r=RISK_FREE_RATE) -> dict[str, np.ndarray]:
+    """Delta, gamma, theta (per calendar day) and vega (per vol point)."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sqrt_t = np.sqrt(t)
+        d1 = (np.log(spot / strike) + (r + 0.5 * sigma * sigma) * t) / (sigma * sqrt_t)
+        d2 = d1 - sigma * sqrt_t
+        pdf = norm_pdf(d1)
+        disc = strike * np.exp(-r * t)
+        decay = -spot * pdf * sigma / (2 * sqrt_t)
+        call_theta = decay - r * disc * norm_cdf(d2)
+        put_theta = decay + r * disc * norm_cdf(-d2)
+        return {
+            "delta": np.where(is_call, norm_cdf(d1), norm_cdf(d1) - 1),
+            "gamma": pdf / (spot * sigma * sqrt_t),
+            "theta": np.where(is_call, call_theta, put_theta) / 365,
+            "vega": spot * pdf * sqrt_t / 100,
+        }
+
+
+def fill_chain(frame, spot: float, now: datetime = None, r: float = RISK_FREE_RATE):
+    """
+    Copy of a ChainFrame with missing IV and Greeks computed locally.
+    IV is solved from the bid/ask midpoint (Polygon's midpoint when a side is
+    missing); values Polygon did provide are kept as they are.
+    """
+    if len(frame) == 0 or not spot or spot <= 0:
+        return frame
+    missing = np.isnan(frame.iv) | np.isnan(frame.delta) | np.isnan(frame.gamma) \
+        | np.isnan(frame.theta) | np.isnan(frame.vega)
+    if not missing.any():
+        return frame
+
+    rows = np.flatnonzero(missing)
+    is_call = frame.is_call[rows]
+    strike = frame.strike[rows]
+    t = years_to_expiry(frame.expiration[rows], now)
+    bid, ask = frame.bid[rows], frame.ask[rows]
+    quoted = (bid > 0) & (ask >= bid)
+    price = np.where(quoted, (bid + ask) / 2, frame.midpoint[rows])
+
+    iv = frame.iv[rows]
+    iv = np.where(np.isnan(iv) | (iv <= 0), implied_vol(price, is_call, spot, strike, t, r), iv)
+    computed = greeks(is_call, spot, strike, t, iv, r)
+
+    updates = {"iv": frame.iv.copy()}
+    updates["iv"][rows] = iv
+    for name, values in computed.items():
+        column = getattr(frame, name).copy()
+        column[rows] = np.where(np.isnan(column[rows]), values, column[rows])
+        updates[name] = column
+    return replace(frame, **updates)
@@ -0,0 +1,191 @@
+"""
+Lazy, memoized indicator dependency graph.
+
+Each node (SMA20, rolling std, EMA12/26, true range, ...) is a pandas Series
+computed from its dependencies the first time it is asked for and cached on
+the graph, so shared intermediates (SMA20 is also the Bollinger middle band,
+the MACD line feeds both the signal and the histogram) are computed once and
+unrequested indicators are never computed at all.
+
+Formulas follow the ta library's conventions (min_periods, adjust=False
+ewm, population std for Bollinger, Wilder-smoothed ATR seeded with a mean).
+"""
+
+import numpy as np
+import pandas as pd
+
+# name -> (dependency names, function of the dependency values)
+NODES: dict[str, tuple[tuple[str, ...], callable]] = {}
+
+_BASE = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+
+
+def _node(name: str, *deps: str):
+    def register(fn):
+        NODES[name] = (deps, fn)
+        return fn
+    return register
+
+
+class IndicatorGraph:
+    """Indicator series for one OHLCV frame, evaluated on demand."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._values: dict[str, pd.Series] = {}
+
+    def __getitem__(self, name: str) -> pd.Series:
+        value = self._values.get(name)
+        if value is None:
+            if name in _BASE:
+                value = self.df[_BASE[name]]
+            else:
+                deps, fn = NODES[name]
+                value = fn(*(self[d] for d in deps))
+            self._values[name] = value
+        return value
+
+    def last(self, name: str, offset: int = 1) -> float | None:
+        """Node value `offset` bars from the end as a float, None if missing."""
+        series = self[name]
+        if len(series) < offset:
+            return None
+        value = series.iloc[-offset]
+        return float(value) if pd.notna(value) else None
+
+    def computed(self) -> list[str]:
+        """Names of the nodes evaluated so far."""
+        return list(self._values)
+
+
+# --- Moving averages / Bollinger ---
+
+@_node("sma20", "close")
+def _sma20(close):
+    return close.rolling(20, min_periods=20).mean()
+
+
+@_node("sma50", "close")
+def _sma50(close):
+    return close.rolling(50, min_periods=50).mean()
+
+
+@_node("sma200", "close")
+def _sma200(close):
+    return close.rolling(200, min_periods=200).mean()
+
+
+@_node("std20", "close")
+def _std20(close):
+    return close.rolling(20, min_periods=20).std(ddof=0)
+
+
+@_node("bb_upper", "sma20", "std20")
+def _bb_upper(mid, std):
+    return mid + 2 * std
+
+
+@_node("bb_lower", "sma20", "std20")
+def _bb_lower(mid, std):
+    return mid - 2 * std
+
+
+# --- RSI ---
+
+@_node("diff", "close")
+def _diff(close):
+    return close.diff(1)
+
+
+@_node("rsi", "diff")
+def _rsi(diff):
+    up = diff.where(diff > 0, 0.0)
+    down = -diff.where(diff < 0, 0.0)
+    ema_up = up.ewm(alpha=1 / 14, min_periods=14, adjust=False).mean()
+    ema_down = down.ewm(alpha=1 / 14, min_periods=14, adjust=False).mean()
+    return pd.Series(np.where(ema_down == 0, 100, 100 - 100 / (1 + ema_up / ema_down)), index=diff.index)
+
+
+# --- MACD ---
+
+@_node("ema12", "close")
+def _ema12(close):
+    return close.ewm(span=12, min_periods=12, adjust=False).mean()
+
+
+@_node("ema26", "close")
+def _ema26(close):
+    return close.ewm(span=26, min_periods=26, adjust=False).mean()
+
+
+@_node("macd", "ema12", "ema26")
+def _macd(fast, slow):
+    return fast - slow
+
+
+@_node("macd_signal", "macd")
+def _macd_signal(macd):
+    return macd.ewm(span=9, min_periods=9, adjust=False).mean()
+
+
+@_node("macd_hist", "macd", "macd_signal")
+def _macd_hist(macd, signal):
+    return macd - signal
+
+
+# --- Stochastic ---
+
+@_node("low14", "low")
+def _low14(low):
+    return low.rolling(14, min_periods=14).min()
+
+
+@_node("high14", "high")
+def _high14(high):
+    return high.rolling(14, min_periods=14).max()
+
+
+@_node("stoch_k", "close", "low14", "high14")
+def _stoch_k(close, lowest, highest):
+    return 100 * (close - lowest) / (highest - lowest)
+
+
+@_node("stoch_d", "stoch_k")
+def _stoch_d(k):
+    return k.rolling(3, min_periods=3).mean()
+
+
+# --- ATR ---
+
+@_node("true_range", "high", "low", "close")
+def _true_range(high, low, close):
+    prev = close.shift(1)
+    return pd.concat([high - low, (high - prev).abs(), (low - prev).abs()], axis=1).max(axis=1)
+
+
+@_node("atr", "true_range")
+def _atr(tr):
+    values = tr.to_numpy(dtype=np.float64)
+    atr = np.full(len(values), np.nan)
+    if len(values) >= 14:
+        atr[13] = values[:14].mean()
+        for i in range(14, len(values)):
+            atr[i] = (atr[i - 1] * 13 + values[i]) / 14
+    return pd.Series(atr, index=tr.index)
+
+
+# --- Volume / levels ---
+
+@_node("volume_sma20", "volume")
+def _volume_sma20(volume):
+    return volume.rolling(20).mean()
+
+
+@_node("support20", "low")
+def _support20(low):
+    return low.rolling(20, min_periods=1).min()
+
+
+@_node("resistance20", "high")
+def _resistance20(high):
+    return high.rolling(20, min_periods=1).max()
@@ -0,0 +1,180 @@
+"""
+Vectorized multi-ticker indicator panel.
+
+Loads the bars for a whole watchlist into (bars x tickers) arrays and computes
+SMA, RSI, MACD, Bollinger, Stochastic and ATR for every ticker in one pass,
+then builds the same result dicts as full_technical_analysis.
+
+Columns are right-aligned by bar rather than joined on calendar dates: each
+ticker's history ends on the last row and shorter histories are NaN-padded at
+the top. Every indicator therefore sees exactly the series the single-ticker
+path would, and the formulas below mirror the ta library's (including its
+min_periods, ewm and Wilder-smoothing conventions), so results match.
+"""
+
+import numpy as np
+import pandas as pd
+from tools.fetch import fan_out
+from tools.market_data import get_stock_data
+from tools import ta_cache
+from tools.technical import INDICATOR_GROUPS, build_result
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+def technical_panel(tickers: list[str], period: str = "6mo") -> list[dict]:
+    """
+    Technical analysis for many tickers at once.
+    Returns one dict per ticker, in input order (an {"error": ...} dict for
+    tickers without data). Results are also stored in the TA result cache, so
+    a following full_technical_analysis on the same bars is a cache hit.
+    """
+    frames = fan_out(lambda t: get_stock_data(t, period=period), tickers)
+    loaded = {}
+    for ticker, df in zip(tickers, frames):
+        if isinstance(df, Exception):
+            logger.warning("Bar load error for %s: %s", ticker, df)
+        elif not df.empty:
+            loaded[ticker] = df
+
+    results = panel_analysis(loaded)
+    groups = tuple(INDICATOR_GROUPS)
+    for ticker, result in results.items():
+        ta_cache.put((ticker, period, "1d", groups), ta_cache.fingerprint(loaded[ticker]), result)
+    return [results.get(t, {"error": f"No data for {t}"}) for t in tickers]
+
+
+def align(frames: dict[str, pd.DataFrame]) -> tuple[list[str], dict[str, np.ndarray], np.ndarray]:
+    """
+    Stack OHLCV frames into right-aligned (rows x tickers) float64 arrays.
+    Returns (tickers, {"Open": ..., ..., "Volume": ...}, bar counts per ticker).
+    """
+    tickers = list(frames)
+    lengths = np.array([len(frames[t]) for t in tickers], dtype=np.int64)
+    rows = int(lengths.max()) if len(tickers) else 0
+    panel = {}
+    for col in ("Open", "High", "Low", "Close", "Volume"):
+        arr = np.full((rows, len(tickers)), np.nan)
+        for j, t in enumerate(tickers):
+            arr[rows - lengths[j]:, j] = frames[t][col].to_numpy(dtype=np.float64)
+        panel[col] = arr
+    return tickers, panel, lengths
+
+
+def panel_series(p: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """
+    Full-history (rows x tickers) indicator arrays for an aligned panel:
+    sma20/50/200, bb_upper/bb_lower, rsi, macd, macd_signal, stoch_k,
+    stoch_d and vol_sma20 (mean of up to the last 20 volumes).
+    """
+    close = pd.DataFrame(p["Close"])
+    high = pd.DataFrame(p["High"])
+    low = pd.DataFrame(p["Low"])
+    out = {}
+
+    # --- Moving Averages ---
+    sma20 = close.rolling(20, min_periods=20).mean()
+    out["sma20"] = sma20.to_numpy()
+    out["sma50"] = close.rolling(50, min_periods=50).mean().to_numpy()
+    out["sma200"] = close.rolling(200, min_periods=200).mean().to_numpy()
+
+    # --- RSI (Wilder ewm; the first bar's missing diff counts as 0 like ta) ---
+    diff = close.diff(1)
+    valid = close.notna()
+    up = diff.where(diff > 0, 0.0).where(valid)
+    down = (-diff.where(diff < 0, 0.0)).where(valid)
+    ema_up = up.ewm(alpha=1 / 14, min_periods=14, adjust=False).mean().to_numpy()
+    ema_down = down.ewm(alpha=1 / 14, min_periods=14, adjust=False).mean().to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["rsi"] = np.where(ema_down == 0, 100, 100 - 100 / (1 + ema_up / ema_down))
+
+    # --- MACD (12/26/9) ---
+    macd = (close.ewm(span=12, min_periods=12, adjust=False).mean()
+            - close.ewm(span=26, min_periods=26, adjust=False).mean())
+    out["macd_signal"] = macd.ewm(span=9, min_periods=9, adjust=False).mean().to_numpy()
+    out["macd"] = macd.to_numpy()
+
+    # --- Bollinger Bands (20, 2, population std) ---
+    std = close.rolling(20, min_periods=20).std(ddof=0).to_numpy()
+    out["bb_upper"] = out["sma20"] + 2 * std
+    out["bb_lower"] = out["sma20"] - 2 * std
+
+    # --- Stochastic (14, 3) ---
+    lowest = low.rolling(14, min_periods=14).min()
+    highest = high.rolling(14, min_periods=14).max()
+    stoch_k = 100 * (close - lowest) / (highest - lowest)
+    out["stoch_d"] = stoch_k.rolling(3, min_periods=3).mean().to_numpy()
+    out["stoch_k"] = stoch_k.to_numpy()
+
+    # --- Volume: 20-bar average, or the mean of all bars for shorter histories ---
+    out["vol_sma20"] = pd.DataFrame(p["Volume"]).rolling(20, min_periods=1).mean().to_numpy()
+    return out
+
+
+def panel_analysis(frames: dict[str, pd.DataFrame]) -> dict[str, dict]:
+    """Compute every indicator for all tickers in one pass and build their result dicts."""
+    if not frames:
+        return {}
+    tickers, p, lengths = align(frames)
+    series = panel_series(p)
+    last = {name: values[-1] for name, values in series.items()}
+    macd, macd_signal = series["macd"], series["macd_signal"]
+    macd_hist = last["macd"] - last["macd_signal"]
+
+    # --- ATR (14) ---
+    atr = _wilder_atr(p["High"], p["Low"], p["Close"], lengths, 14)
+
+    # --- Support / Resistance ---
+    support = np.nanmin(p["Low"][-20:], axis=0)
+    resistance = np.nanmax(p["High"][-20:], axis=0)
+
+    c = p["Close"]
+    volume = p["Volume"]
+    prev_close = np.where(lengths > 1, c[-2] if len(c) > 1 else np.nan, c[-1])
+
+    results = {}
+    for j, ticker in enumerate(tickers):
+        results[ticker] = build_result(
+            ticker, float(c[-1, j]), float(prev_close[j]),
+            sma20=_val(last["sma20"][j]), sma50=_val(last["sma50"][j]), sma200=_val(last["sma200"][j]),
+            rsi=_val(last["rsi"][j]),
+            macd=_val(macd[-1, j]), macd_signal=_val(macd_signal[-1, j]), macd_hist=_val(macd_hist[j]),
+            prev_macd=_val(macd[-2, j]) if len(macd) > 1 else None,
+            prev_signal=_val(macd_signal[-2, j]) if len(macd) > 1 else None,
+            bb_upper=_val(last["bb_upper"][j]), bb_middle=_val(last["sma20"][j]),
+            bb_lower=_val(last["bb_lower"][j]),
+            stoch_k=_val(last["stoch_k"][j]), stoch_d=_val(last["stoch_d"][j]),
+            atr=_val(atr[j]),
+            volume=int(volume[-1, j]), vol_sma20=float(last["vol_sma20"][j]),
+            support=float(support[j]), resistance=float(resistance[j]),
+        )
+    return results
+
+
+def _wilder_atr(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                lengths: np.ndarray, window: int) -> np.ndarray:
+    """
+    Latest ATR per column: the first `window` true ranges are averaged, then
+    Wilder-smoothed row by row (vectorized across tickers). Columns with fewer
+    than `window` bars get NaN.
+    """
+    rows = len(close)
+    prev = np.vstack([np.full((1, close.shape[1]), np.nan), close[:-1]])
+    with np.errstate(invalid="ignore"):
+        tr = np.fmax(high - low, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+
+    start = rows - lengths  # first valid row per column
+    seed_row = start + window - 1
+    atr = np.full(close.shape[1], np.nan)
+    for r in range(rows):
+        seeding = seed_row == r
+        if seeding.any():
+            atr[seeding] = np.nanmean(tr[r - window + 1:r + 1, seeding], axis=0)
+        smoothing = seed_row < r
+        atr[smoothing] = (atr[smoothing] * (window - 1) + tr[r, smoothing]) / window
+    return atr
+
+
+def _val(x) -> float | None:
+    return None if np.isnan(x) else float(x)
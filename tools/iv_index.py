@@ -0,0 +1,176 @@
+"""
+Rolling IV percentile / rank index.
+
+IVIndex keeps a ticker's last max(IV_INDEX_LOOKBACKS) non-null ATM IVs. For
+each lookback L it also keeps a sorted list of the L-1 IVs before the
+newest. Recording a new day moves the previous newest into each list and
+drops the one that fell out of the window, both by bisection. Percentile is
+then a bisect against the newest IV, and rank reads the ends of the list.
+So every lookback is answered in O(log n), with no rescan of the history.
+
+Indexes are persisted per ticker in the iv_index table next to iv_history
+whenever record() or rebuild() writes. Reads stay read-only.
+
+Before use, an index is checked against a cheap signature of iv_history:
+the count, oldest and newest date of the newest max(IV_INDEX_LOOKBACKS)
+IVs, read from the covering index. Rows written by something other than
+record() change it, including older rows backfilled by another process.
+On a mismatch the persisted state is re-read (another process may have
+rebuilt it), and only if that is stale too is the index rebuilt from
+iv_history. Backfills should still call rebuild() to persist the result.
+"""
+
+import json
+import threading
+from bisect import bisect_left, insort
+from collections import deque
+from config import IV_INDEX_LOOKBACKS
+
+_indexes: dict[str, "IVIndex"] = {}
+_lock = threading.Lock()
+
+
+class IVIndex:
+    """Order statistics over one ticker's recent IV history, for several lookbacks."""
+
+    def __init__(self, lookbacks=IV_INDEX_LOOKBACKS):
+        self.lookbacks = tuple(sorted(lookbacks))
+        self.window: deque[tuple[str, float]] = deque(maxlen=self.lookbacks[-1])
+        self.history: dict[int, list[float]] = {n: [] for n in self.lookbacks}
+
+    @property
+    def last_date(self) -> str | None:
+        return self.window[-1][0] if self.window else None
+
+    @property
+    def signature(self) -> tuple:
+        """(count, oldest date, newest date) of the window, comparable with _signature()."""
+        return len(self.window), self.window[0][0] if self.window else None, self.last_date
+
+    def push(self, date: str, iv: float) -> None:
+        """Add the IV for `date` (re-recording the newest date replaces it)."""
+        window = self.window
+        if window and date == window[-1][0]:
+            window[-1] = (date, iv)
+            return
+        if window and date < window[-1][0]:
+            raise ValueError(f"IV for {date} is older than the newest indexed day {window[-1][0]}")
+        if window:
+            newest = window[-1][1]
+            for n, values in self.history.items():
+                if len(window) >= n:
+                    del values[bisect_left(values, window[-n][1])]
+                insort(values, newest)
+        window.append((date, iv))
+
+    def query(self, lookback: int) -> dict:
+        """Percentile and rank of the newest IV within the last `lookback` IVs (one of self.lookbacks)."""
+        points = min(len(self.window), lookback)
+        if points < 2:
+            return {"current_iv": self.window[-1][1] if self.window else None, "data_points": points}
+        current = self.window[-1][1]
+        values = self.history[lookback]
+        lo, hi = values[0], values[-1]
+        return {
+            "current_iv": current,
+            "iv_percentile": bisect_left(values, current) / len(values) * 100,
+            "iv_rank": (current - lo) / (hi - lo) * 100 if hi != lo else 50,
+            "iv_min": lo,
+            "iv_max": hi,
+            "data_points": points,
+        }
+
+    def to_state(self) -> dict:
+        return {"lookbacks": list(self.lookbacks), "window": [list(x) for x in self.window]}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "IVIndex":
+        index = cls(state["lookbacks"])
+        for date, iv in state["window"]:
+            index.push(date, iv)
+        return index
+
+
+def record(conn, ticker: str, date: str, iv: float) -> None:
+    """Advance a ticker's index by one recorded IV and persist it (call right after storing the row)."""
+    stored = _signature(conn, ticker)
+    with _lock:
+        index = _load(conn, ticker, stored)
+        if index.last_date is None or date >= index.last_date:
+            index.push(date, iv)
+        if index.signature == stored:
+            _save(conn, ticker, index)
+        else:
+            _rebuild(conn, ticker)
+
+
+def get(conn, ticker: str) -> IVIndex:
+    """A ticker's index, rebuilt from iv_history if it doesn't match the stored IVs."""
+    stored = _signature(conn, ticker)
+    with _lock:
+        index = _load(conn, ticker, stored)
+        if index.signature != stored:
+            index = _rebuild(conn, ticker, persist=False)
+        return index
+
+
+def rebuild(conn, tickers: list[str] = None) -> int:
+    """Rebuild indexes from iv_history (all tickers by default). Returns how many were rebuilt."""
+    if tickers is None:
+        tickers = [r[0] for r in conn.execute("SELECT DISTINCT ticker FROM iv_history")]
+    with _lock:
+        for ticker in tickers:
+            _rebuild(conn, ticker)
+    return len(tickers)
+
+
+def _signature(conn, ticker: str) -> tuple:
+    """(count, oldest date, newest date) of the newest IVs an index window holds."""
+    count, oldest, newest = conn.execute(
+        "SELECT COUNT(*), MIN(date), MAX(date) FROM (SELECT date FROM iv_history "
+        "WHERE ticker = ? AND atm_iv IS NOT NULL ORDER BY date DESC LIMIT ?)",
+        (ticker, max(IV_INDEX_LOOKBACKS))
+    ).fetchone()
+    return count, oldest, newest
+
+
+def _load(conn, ticker: str, signature: tuple) -> IVIndex:
+    """
+    The cached index if it matches `signature`, else the persisted one
+    (written by this or another process), else whatever is at hand.
+    """
+    lookbacks = tuple(sorted(IV_INDEX_LOOKBACKS))
+    index = _indexes.get(ticker)
+    if index is not None and index.lookbacks == lookbacks and index.signature == signature:
+        return index
+    row = conn.execute("SELECT state FROM iv_index WHERE ticker = ?", (ticker,)).fetchone()
+    state = json.loads(row[0]) if row else None
+    if state is not None and tuple(state["lookbacks"]) == lookbacks:
+        index = IVIndex.from_state(state)
+    elif index is None or index.lookbacks != lookbacks:
+        index = IVIndex()
+    _indexes[ticker] = index
+    return index
+
+
+def _rebuild(conn, ticker: str, persist: bool = True) -> IVIndex:
+    index = IVIndex()
+    rows = conn.execute(
+        "SELECT date, atm_iv FROM iv_history WHERE ticker = ? AND atm_iv IS NOT NULL "
+        "ORDER BY date DESC LIMIT ?",
+        (ticker, index.lookbacks[-1])
+    ).fetchall()
+    for date, iv in reversed(rows):
+        index.push(date, iv)
+    _indexes[ticker] = index
+    if persist:
+        _save(conn, ticker, index)
+    return index
+
+
+def _save(conn, ticker: str, index: IVIndex) -> None:
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO iv_index (ticker, last_date, state) VALUES (?, ?, ?)",
+            (ticker, index.last_date, json.dumps(index.to_state()))
+        )
@@ -0,0 +1,231 @@
+"""
+Implied volatility surface capture and compact storage.
+
+Each capture puts the day's options chain onto a fixed grid:
+
+- TENORS: calendar days to expiry.
+- DELTAS: call-delta buckets. Put wings are written as 1 + put delta, so
+  0.75 is the 25-delta put and 0.25 the 25-delta call.
+
+Within an expiry, IV is interpolated linearly in delta across the
+out-of-the-money contracts. Across expiries it is interpolated in total
+variance (iv^2 * t), the usual no-arbitrage-friendly way. Cells outside the
+quoted range stay empty; they are never extrapolated.
+
+Storage is one iv_surface row per ticker and calendar year, in the IV
+database. A row holds the capture dates and a (cells x days) int16 matrix of
+IV in basis points, where 0 means no value. Each cell's history is one
+contiguous column, delta-encoded along time and zlib-compressed. Day-over-day
+IV changes are small, so a year of 49-cell surfaces takes a few KB per
+ticker.
+"""
+
+import json
+import zlib
+from datetime import datetime, timedelta
+import numpy as np
+from tools import db
+from tools.chain_store import get_chain, dte_window
+from tools.greeks import fill_chain
+from tools.market_data import get_current_price
+from config import DB_PATH
+from log import get_logger
+
+logger = get_logger(__name__)
+
+TENORS = (7, 14, 30, 45, 60, 90, 120)
+DELTAS = (0.10, 0.25, 0.40, 0.50, 0.60, 0.75, 0.90)
+
+# IV is stored in basis points; int16 caps it at 327.67%
+_SCALE = 10_000
+_MAX_BP = np.iinfo(np.int16).max
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS iv_surface (
+        ticker TEXT NOT NULL,
+        year INTEGER NOT NULL,
+        dates TEXT NOT NULL,
+        data BLOB NOT NULL,
+        PRIMARY KEY (ticker, year)
+    );
+"""
+
+
+def _get_db():
+    """This thread's pooled connection to the IV database (surface table ensured once)."""
+    return db.connect(DB_PATH, _SCHEMA)
+
+
+# --- Grid construction ---
+
+def surface_from_chain(frame, spot: float, today=None) -> np.ndarray:
+    """
+    Interpolate a ChainFrame onto the TENORS x DELTAS grid.
+    Returns a float array of IVs (decimal), NaN where the chain doesn't reach.
+    """
+    dte = frame.dte(today)
+    call_delta = np.where(frame.is_call, frame.delta, 1 + frame.delta)
+    otm = np.where(frame.is_call, frame.strike >= spot, frame.strike < spot)
+    usable = otm & (dte > 0) & ~np.isnan(frame.iv) & (frame.iv > 0) & ~np.isnan(call_delta)
+
+    # Per expiry: IV across the delta grid
+    expiries, by_delta = [], []
+    for days in np.unique(dte[usable]):
+        rows = usable & (dte == days)
+        x, y = call_delta[rows], frame.iv[rows]
+        order = np.argsort(x)
+        x, y = x[order], y[order]
+        x, first = np.unique(x, return_index=True)
+        y = y[first]
+        if len(x) < 2:
+            continue
+        grid = np.interp(DELTAS, x, y)
+        grid[(np.array(DELTAS) < x[0]) | (np.array(DELTAS) > x[-1])] = np.nan
+        expiries.append(days)
+        by_delta.append(grid)
+
+    surface = np.full((len(TENORS), len(DELTAS)), np.nan)
+    if not expiries:
+        return surface
+
+    # Across expiries: linear in total variance, per delta bucket
+    t = np.array(expiries, dtype=np.float64)
+    iv = np.array(by_delta)
+    for j in range(len(DELTAS)):
+        have = ~np.isnan(iv[:, j])
+        if have.sum() < 2:
+            continue
+        tj, wj = t[have], iv[have, j] ** 2 * t[have]
+        for i, tenor in enumerate(TENORS):
+            if tj[0] <= tenor <= tj[-1]:
+                surface[i, j] = np.sqrt(np.interp(tenor, tj, wj) / tenor)
+    return surface
+
+
+def capture_surface(ticker: str, spot: float = None, date: str = None) -> dict:
+    """Fetch the chain, build today's surface and store it. Returns a small summary."""
+    ticker = ticker.upper()
+    spot = spot or get_current_price(ticker)
+    if not spot:
+        return {"ticker": ticker, "error": "No price"}
+    exp_gte, exp_lte = dte_window(1, max(TENORS) + 30)
+    frame = fill_chain(get_chain(ticker, exp_gte, exp_lte), spot)
+    surface = surface_from_chain(frame, spot)
+    date = date or datetime.now().strftime("%Y-%m-%d")
+    store_surface(ticker, date, surface)
+    return {"ticker": ticker, "date": date,
+            "cells_filled": int((~np.isnan(surface)).sum()), "cells_total": surface.size}
+
+
+# --- Storage ---
+
+def store_surface(ticker: str, date: str, surface: np.ndarray) -> None:
+    """Insert or replace one day's surface in the ticker's yearly block."""
+    ticker = ticker.upper()
+    year = int(date[:4])
+    conn = _get_db()
+    with conn:
+        dates, matrix = _read_block(conn, ticker, year)
+        column = _to_bp(surface.ravel())
+        if date in dates:
+            matrix[:, dates.index(date)] = column
+        else:
+            pos = int(np.searchsorted(np.array(dates, dtype="U10"), date))
+            dates.insert(pos, date)
+            matrix = np.insert(matrix, pos, column, axis=1)
+        conn.execute(
+            "INSERT OR REPLACE INTO iv_surface (ticker, year, dates, data) VALUES (?, ?, ?, ?)",
+            (ticker, year, json.dumps(dates), _encode(matrix))
+        )
+
+
+def load_surfaces(ticker: str, start: str = None, end: str = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Stored surfaces for [start, end] (inclusive, "YYYY-MM-DD"; default all).
+    Returns (dates, iv) with iv shaped (days, len(TENORS), len(DELTAS)), NaN where empty.
+    """
+    ticker = ticker.upper()
+    sql = "SELECT year, dates, data FROM iv_surface WHERE ticker = ?"
+    params = [ticker]
+    if start:
+        sql += " AND year >= ?"
+        params.append(int(start[:4]))
+    if end:
+        sql += " AND year <= ?"
+        params.append(int(end[:4]))
+    dates, blocks = [], []
+    for _, block_dates, blob in _get_db().execute(sql + " ORDER BY year", params):
+        block_dates = json.loads(block_dates)
+        dates.extend(block_dates)
+        blocks.append(_decode(blob, len(block_dates)))
+
+    dates = np.array(dates, dtype="U10")
+    if not blocks:
+        return dates, np.empty((0, len(TENORS), len(DELTAS)))
+    bp = np.concatenate(blocks, axis=1).T
+    keep = np.ones(len(dates), dtype=bool)
+    if start:
+        keep &= dates >= start
+    if end:
+        keep &= dates <= end
+    iv = np.where(bp[keep] > 0, bp[keep] / _SCALE, np.nan)
+    return dates[keep], iv.reshape(-1, len(TENORS), len(DELTAS))
+
+
+def surface_slice(ticker: str, tenor: int, delta: float, days: int = 365) -> list[dict]:
+    """IV history of one grid cell, e.g. (30, 0.50) for 30-day ATM, over the last `days` days."""
+    i, j = TENORS.index(tenor), DELTAS.index(delta)
+    dates, iv = load_surfaces(ticker, start=_since(days))
+    return [{"date": d, "iv": _pct(v)} for d, v in zip(dates.tolist(), iv[:, i, j])]
+
+
+def skew_history(ticker: str, tenor: int = 30, delta: float = 0.25, days: int = 365) -> list[dict]:
+    """
+    Risk-reversal skew over the last `days` days: `delta` put IV minus
+    `delta` call IV at `tenor`, alongside the ATM IV (percent points).
+    """
+    i = TENORS.index(tenor)
+    put_j, call_j, atm_j = DELTAS.index(round(1 - delta, 2)), DELTAS.index(delta), DELTAS.index(0.50)
+    dates, iv = load_surfaces(ticker, start=_since(days))
+    cells = iv[:, i, :]
+    skew = cells[:, put_j] - cells[:, call_j]
+    return [
+        {"date": d, "put_iv": _pct(p), "call_iv": _pct(c), "atm_iv": _pct(a), "skew": _pct(s)}
+        for d, p, c, a, s in zip(dates.tolist(), cells[:, put_j], cells[:, call_j], cells[:, atm_j], skew)
+    ]
+
+
+def _since(days: int) -> str:
+    return (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def _pct(value: float) -> float | None:
+    return None if np.isnan(value) else round(float(value) * 100, 2)
+
+
+# --- Encoding ---
+
+def _to_bp(values: np.ndarray) -> np.ndarray:
+    bp = np.rint(np.nan_to_num(values, nan=0.0) * _SCALE)
+    return np.clip(bp, 0, _MAX_BP).astype(np.int16)
+
+
+def _encode(matrix: np.ndarray) -> bytes:
+    """(cells x days) int16 -> zlib(first day, then day-over-day differences per cell)."""
+    deltas = np.diff(matrix.astype(np.int32), axis=1, prepend=0).astype(np.int16)
+    return zlib.compress(np.ascontiguousarray(deltas).tobytes(), 6)
+
+
+def _decode(blob: bytes, days: int) -> np.ndarray:
+    deltas = np.frombuffer(zlib.decompress(blob), dtype=np.int16).reshape(-1, days)
+    return np.cumsum(deltas, axis=1, dtype=np.int32).astype(np.int16)
+
+
+def _read_block(conn, ticker: str, year: int) -> tuple[list[str], np.ndarray]:
+    row = conn.execute(
+        "SELECT dates, data FROM iv_surface WHERE ticker = ? AND year = ?", (ticker, year)
+    ).fetchone()
+    if row is None:
+        return [], np.zeros((len(TENORS) * len(DELTAS), 0), dtype=np.int16)
+    dates = json.loads(row[0])
+    return dates, _decode(row[1], len(dates))
@@ -2,131 +2,135 @@
 Uses Polygon.io API for price history and ATM IV."""
 
 import sqlite3
-import time
-from datetime import datetime, timedelta
+from datetime import datetime
 import numpy as np
-from tools import polygon_client as _client
-from config import DB_PATH, REQUEST_DELAY
+from tools.chain_store import get_atm_contracts, dte_window
+from tools.fetch import fan_out
+from tools.greeks import fill_chain
+from tools import db, iv_index, iv_surface, realized_vol
+from config import DB_PATH, IV_INDEX_LOOKBACKS, IV_SURFACE_CAPTURE
 from log import get_logger
 
 logger = get_logger(__name__)
 
 
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS iv_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticker TEXT NOT NULL,
+        date TEXT NOT NULL,
+        atm_iv REAL,
+        hv20 REAL,
+        hv60 REAL,
+        close_price REAL,
+        pk20 REAL,
+        pk60 REAL,
+        gk20 REAL,
+        gk60 REAL,
+        yz20 REAL,
+        yz60 REAL,
+        UNIQUE(ticker, date)
+    );
+    -- Covers the newest-first IV scans of the percentile and dashboard queries
+    CREATE INDEX IF NOT EXISTS idx_iv_history_ticker_date_iv ON iv_history (ticker, date, atm_iv);
+    CREATE TABLE IF NOT EXISTS iv_index (
+        ticker TEXT PRIMARY KEY,
+        last_date TEXT,
+        state TEXT NOT NULL
+    );
+"""
+
+
+# Realized vol columns (see tools/realized_vol.py), added to databases that predate them
+_VOL_COLUMNS = {name: "REAL" for name in realized_vol.COLUMNS}
+
+# Value columns of a store_history row, after the date
+HISTORY_COLUMNS = ("atm_iv", "close_price", *realized_vol.COLUMNS)
+
+
 def _get_db():
-    """Get SQLite connection and ensure tables exist."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS iv_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ticker TEXT NOT NULL,
-            date TEXT NOT NULL,
-            atm_iv REAL,
-            hv20 REAL,
-            hv60 REAL,
-            close_price REAL,
-            UNIQUE(ticker, date)
-        )
-    """)
-    conn.commit()
+    """This thread's pooled SQLite connection (schema ensured once per process)."""
+    conn = db.connect(DB_PATH, _SCHEMA)
+    db.ensure_columns(DB_PATH, "iv_history", _VOL_COLUMNS)
     return conn
 
 
-def record_daily_iv(ticker: str) -> dict:
+def record_daily_iv(ticker: str, surface: bool = None, latest=None) -> dict:
     """
-    Record today's IV and HV data for a ticker.
+    Record today's IV and realized vol data for a ticker.
     - ATM IV from ~30 DTE options via Polygon snapshot
-    - HV20 and HV60 from historical close prices via Polygon aggs
+    - Close and every realized vol estimator (tools/realized_vol.py) as of
+      the latest stored bar, written into the same row as the ATM IV.
+      `latest` is that bar's row of a realized_vol_panel (batch_record runs
+      one panel for the whole watchlist); without it the panel is run for
+      this ticker alone.
+    - With surface=True (default: IV_SURFACE_CAPTURE) also the full IV
+      surface, see tools/iv_surface.py
     """
     today = datetime.now().strftime("%Y-%m-%d")
 
-    # Get 3 months of daily close prices from Polygon
-    to_date = today
-    from_date = (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d")
-
-    try:
-        aggs = _client.get_aggs(
-            ticker, 1, "day", from_date, to_date,
-            adjusted=True, sort="asc", limit=50000,
-        )
-    except Exception as e:
-        return {"error": f"Polygon aggs error for {ticker}: {e}"}
-
-    if not aggs or len(aggs) < 5:
-        return {"error": f"Insufficient price data for {ticker}"}
-
-    closes = np.array([float(a.close) for a in aggs if a.close is not None])
-    if len(closes) < 5:
+    if latest is None:
+        panel = realized_vol.realized_vol_panel([ticker])
+        if ticker not in panel:
+            return {"error": f"Insufficient price data for {ticker}"}
+        latest = panel[ticker].iloc[-1]
+    if np.isnan(latest["Close"]):
         return {"error": f"Insufficient close data for {ticker}"}
 
-    close_price = float(closes[-1])
-
-    # Calculate Historical Volatility (annualized)
-    log_returns = np.diff(np.log(closes))
-    hv20 = float(np.std(log_returns[-20:]) * np.sqrt(252)) if len(log_returns) >= 20 else None
-    hv60 = float(np.std(log_returns[-60:]) * np.sqrt(252)) if len(log_returns) >= 60 else None
+    close_price = float(latest["Close"])
+    vols = {name: None if np.isnan(latest[name]) else float(latest[name]) for name in realized_vol.COLUMNS}
 
     # Get ATM IV from ~30 DTE options via Polygon
     atm_iv = _get_atm_iv(ticker, close_price)
-    time.sleep(REQUEST_DELAY)
 
     # Store in database
-    conn = _get_db()
-    try:
+    with _get_db() as conn:
         conn.execute(
-            "INSERT OR REPLACE INTO iv_history (ticker, date, atm_iv, hv20, hv60, close_price) VALUES (?, ?, ?, ?, ?, ?)",
-            (ticker, today, atm_iv, hv20, hv60, close_price)
+            f"INSERT INTO iv_history (ticker, date, {', '.join(HISTORY_COLUMNS)}) "
+            f"VALUES (?, ?, {', '.join('?' for _ in HISTORY_COLUMNS)}) "
+            f"ON CONFLICT (ticker, date) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in HISTORY_COLUMNS)}",
+            (ticker, today, atm_iv, close_price, *vols.values())
         )
-        conn.commit()
-    finally:
-        conn.close()
+    if atm_iv is not None:
+        iv_index.record(conn, ticker, today, atm_iv)
 
-    return {
+    result = {
         "ticker": ticker,
         "date": today,
         "atm_iv": atm_iv,
-        "hv20": hv20,
-        "hv60": hv60,
+        **vols,
         "close_price": close_price,
     }
+    if surface is None:
+        surface = IV_SURFACE_CAPTURE
+    if surface:
+        try:
+            captured = iv_surface.capture_surface(ticker, close_price, today)
+            result["surface_cells"] = captured.get("cells_filled", 0)
+        except Exception as e:
+            logger.warning("IV surface capture failed for %s: %s", ticker, e)
+    return result
 
 
 def _get_atm_iv(ticker: str, current_price: float) -> float | None:
-    """Get ATM IV from the nearest ~30 DTE expiration via Polygon snapshot."""
-    # Target ~30 DTE window
-    exp_gte = (datetime.now() + timedelta(days=20)).strftime("%Y-%m-%d")
-    exp_lte = (datetime.now() + timedelta(days=45)).strftime("%Y-%m-%d")
-
-    best_iv = None
-    best_dist = float("inf")
+    """
+    Get ATM call IV from the nearest expiration in the 20-45 DTE window via Polygon snapshot.
+    A missing IV on the ATM contract is solved from its quote; only if that
+    fails too is the nearest strike that has a Polygon IV used.
+    """
+    # Target ~30 DTE window; only the strike band around spot is fetched
+    exp_gte, exp_lte = dte_window(20, 45)
 
     try:
-        for o in _client.list_snapshot_options_chain(
-            ticker,
-            params={
-                "expiration_date.gte": exp_gte,
-                "expiration_date.lte": exp_lte,
-                "contract_type": "call",
-            },
-        ):
-            details = o.details
-            if not details:
-                continue
-
-            strike = float(details.strike_price or 0)
-            iv = o.implied_volatility
-
-            if iv is None or iv <= 0:
-                continue
-
-            dist = abs(strike - current_price)
-            if dist < best_dist:
-                best_dist = dist
-                best_iv = float(iv)
-
+        atm = fill_chain(get_atm_contracts(ticker, current_price, exp_gte, exp_lte,
+                                           contract_type="call"), current_price)
+        if not (len(atm) and atm.iv[0] > 0):
+            atm = get_atm_contracts(ticker, current_price, exp_gte, exp_lte,
+                                    contract_type="call", require_iv=True)
     except Exception:
         return None
 
-    return best_iv
+    return float(atm.iv[0]) if len(atm) else None
 
 
 def get_iv_percentile(ticker: str, lookback: int = 252) -> dict:
@@ -135,108 +139,253 @@ def get_iv_percentile(ticker: str, lookback: int = 252) -> dict:
 
     IV Percentile: % of days in lookback where IV was LOWER than current
     IV Rank: (current - min) / (max - min) over lookback period
+
+    Lookbacks in IV_INDEX_LOOKBACKS are answered from the rolling index
+    (tools/iv_index.py); others scan iv_history.
     """
     conn = _get_db()
-    try:
+    if lookback in IV_INDEX_LOOKBACKS:
+        stats = iv_index.get(conn, ticker).query(lookback)
+    else:
         rows = conn.execute(
             "SELECT atm_iv FROM iv_history WHERE ticker = ? AND atm_iv IS NOT NULL ORDER BY date DESC LIMIT ?",
             (ticker, lookback)
         ).fetchall()
-    finally:
-        conn.close()
+        stats = _percentile_stats([r[0] for r in rows])
+    return _percentile_result(ticker, stats)
 
-    if len(rows) < 2:
-        return {
-            "ticker": ticker,
-            "iv_percentile": None,
-            "iv_rank": None,
-            "current_iv": None,
-            "data_points": len(rows),
-            "message": f"Need more data ({len(rows)} days collected, recommend 30+ for meaningful percentile)",
-        }
 
-    ivs = [r[0] for r in rows]
+def get_iv_percentiles(ticker: str) -> dict[int, dict]:
+    """IV percentile and rank for every lookback in IV_INDEX_LOOKBACKS from one index lookup."""
+    index = iv_index.get(_get_db(), ticker)
+    return {n: _percentile_result(ticker, index.query(n)) for n in index.lookbacks}
+
+
+def store_history(ticker: str, rows: list[tuple]) -> int:
+    """
+    Bulk-insert reconstructed rows of (date, *HISTORY_COLUMNS) values.
+    Values already stored (e.g. live daily records) win; only missing ones
+    are filled. Call rebuild_iv_index() once the backfill is done.
+    """
+    columns = ", ".join(HISTORY_COLUMNS)
+    fill = ", ".join(f"{c} = COALESCE({c}, excluded.{c})" for c in HISTORY_COLUMNS)
+    with _get_db() as conn:
+        conn.executemany(
+            f"INSERT INTO iv_history (ticker, date, {columns}) VALUES (?, ?, {', '.join('?' for _ in HISTORY_COLUMNS)}) "
+            f"ON CONFLICT (ticker, date) DO UPDATE SET {fill}",
+            [(ticker, *row) for row in rows]
+        )
+    return len(rows)
+
+
+def rebuild_iv_index(tickers: list[str] = None) -> int:
+    """Rebuild the rolling percentile index from iv_history (e.g. after a backfill)."""
+    return iv_index.rebuild(_get_db(), tickers)
+
+
+def _percentile_stats(ivs: list[float]) -> dict:
+    """Percentile/rank stats of ivs[0] (newest) against ivs[1:], in IVIndex.query's format."""
+    if len(ivs) < 2:
+        return {"current_iv": ivs[0] if ivs else None, "data_points": len(ivs)}
     current_iv = ivs[0]
     historical = ivs[1:]
 
     # IV Percentile: % of days where IV was lower
     below_count = sum(1 for iv in historical if iv < current_iv)
-    iv_percentile = (below_count / len(historical)) * 100
 
     # IV Rank: (current - min) / (max - min)
     iv_min = min(historical)
     iv_max = max(historical)
-    iv_rank = ((current_iv - iv_min) / (iv_max - iv_min) * 100) if iv_max != iv_min else 50
+    return {
+        "current_iv": current_iv,
+        "iv_percentile": (below_count / len(historical)) * 100,
+        "iv_rank": ((current_iv - iv_min) / (iv_max - iv_min) * 100) if iv_max != iv_min else 50,
+        "iv_min": iv_min,
+        "iv_max": iv_max,
+        "data_points": len(ivs),
+    }
 
+
+def _percentile_result(ticker: str, stats: dict) -> dict:
+    points = stats["data_points"]
+    if points < 2:
+        return {
+            "ticker": ticker,
+            "iv_percentile": None,
+            "iv_rank": None,
+            "current_iv": None,
+            "data_points": points,
+            "message": f"Need more data ({points} days collected, recommend 30+ for meaningful percentile)",
+        }
     return {
         "ticker": ticker,
-        "current_iv": round(current_iv * 100, 1),
-        "iv_percentile": round(iv_percentile, 1),
-        "iv_rank": round(iv_rank, 1),
-        "iv_min": round(iv_min * 100, 1),
-        "iv_max": round(iv_max * 100, 1),
-        "data_points": len(rows),
+        "current_iv": round(stats["current_iv"] * 100, 1),
+        "iv_percentile": round(stats["iv_percentile"], 1),
+        "iv_rank": round(stats["iv_rank"], 1),
+        "iv_min": round(stats["iv_min"] * 100, 1),
+        "iv_max": round(stats["iv_max"] * 100, 1),
+        "data_points": points,
     }
 
 
 def batch_record(tickers: list[str]) -> list[dict]:
-    """Record IV data for all tickers in watchlist."""
+    """
+    Record IV data for all tickers in watchlist, fetching tickers concurrently.
+    Realized vol for every ticker comes from one panel pass over their bars.
+    """
+    panel = realized_vol.realized_vol_panel(tickers)
+
+    def record(ticker):
+        if ticker not in panel:
+            return {"error": f"Insufficient price data for {ticker}"}
+        return record_daily_iv(ticker, latest=panel[ticker].iloc[-1])
+
     results = []
-    for ticker in tickers:
-        try:
-            result = record_daily_iv(ticker)
-            results.append(result)
-            status = "OK" if "error" not in result else result["error"]
-            logger.info("%s: %s", ticker, status)
-        except Exception as e:
-            results.append({"ticker": ticker, "error": str(e)})
-            logger.warning("%s: ERROR - %s", ticker, e)
-        time.sleep(REQUEST_DELAY)
+    for ticker, result in zip(tickers, fan_out(record, tickers)):
+        if isinstance(result, Exception):
+            results.append({"ticker": ticker, "error": str(result)})
+            logger.warning("%s: ERROR - %s", ticker, result)
+            continue
+        results.append(result)
+        status = "OK" if "error" not in result else result["error"]
+        logger.info("%s: %s", ticker, status)
     return results
 
 
-def iv_dashboard(tickers: list[str]) -> list[dict]:
+def iv_dashboard(tickers: list[str], lookback: int = 252) -> list[dict]:
     """
-    Generate IV dashboard data for all tickers.
-    Columns: ticker, current_iv, iv_percentile, iv_rank, hv20, iv_hv_diff
+    Generate IV dashboard data for all tickers in one round trip.
+    Columns: ticker, close, current_iv, iv_percentile, iv_rank, every
+    realized vol estimator (hv20, hv60, pk20, ..., yz60), iv_hv_diff
+    (IV - HV20) and iv_yz_diff (IV - Yang-Zhang 20-day)
+
+    Percentile and rank match get_iv_percentile. They are computed in one
+    set-based SQL query. SQLite builds older than 3.35 reject its
+    MATERIALIZED CTE; for those, the stats come from one bulk fetch
+    reduced with NumPy.
     """
+    unique = list(dict.fromkeys(tickers))
+    if not unique:
+        return []
     conn = _get_db()
-    dashboard = []
+    try:
+        stats = _dashboard_stats_sql(conn, unique, lookback)
+    except sqlite3.OperationalError as e:
+        logger.debug("IV dashboard falling back to NumPy: %s", e)
+        stats = _dashboard_stats_numpy(conn, unique, lookback)
 
+    dashboard = []
     for ticker in tickers:
-        try:
-            # Get latest record
-            row = conn.execute(
-                "SELECT atm_iv, hv20, hv60, close_price FROM iv_history WHERE ticker = ? ORDER BY date DESC LIMIT 1",
-                (ticker,)
-            ).fetchone()
-
-            if row is None:
-                dashboard.append({"ticker": ticker, "status": "no data"})
-                continue
-
-            atm_iv, hv20, hv60, close_price = row
-            iv_data = get_iv_percentile(ticker)
-
-            entry = {
-                "ticker": ticker,
-                "close": close_price,
-                "current_iv": round(atm_iv * 100, 1) if atm_iv else None,
-                "iv_percentile": iv_data.get("iv_percentile"),
-                "iv_rank": iv_data.get("iv_rank"),
-                "hv20": round(hv20 * 100, 1) if hv20 else None,
-                "hv60": round(hv60 * 100, 1) if hv60 else None,
-                "iv_hv_diff": round((atm_iv - hv20) * 100, 1) if atm_iv and hv20 else None,
-                "data_points": iv_data.get("data_points", 0),
-            }
-            dashboard.append(entry)
-        except Exception as e:
-            dashboard.append({"ticker": ticker, "status": f"error: {e}"})
-
-    conn.close()
+        row = stats.get(ticker)
+        if row is None:
+            dashboard.append({"ticker": ticker, "status": "no data"})
+            continue
+        atm_iv, close_price, *vols, points, below, iv_min, iv_max, iv_now = row
+        vols = dict(zip(realized_vol.COLUMNS, vols))
+        hv20, yz20 = vols["hv20"], vols["yz20"]
+        iv_percentile = iv_rank = None
+        if points >= 2:
+            iv_percentile = round(below / (points - 1) * 100, 1)
+            iv_rank = round((iv_now - iv_min) / (iv_max - iv_min) * 100, 1) if iv_max != iv_min else 50
+        dashboard.append({
+            "ticker": ticker,
+            "close": close_price,
+            "current_iv": round(atm_iv * 100, 1) if atm_iv else None,
+            "iv_percentile": iv_percentile,
+            "iv_rank": iv_rank,
+            **{name: round(v * 100, 1) if v else None for name, v in vols.items()},
+            "iv_hv_diff": round((atm_iv - hv20) * 100, 1) if atm_iv and hv20 else None,
+            "iv_yz_diff": round((atm_iv - yz20) * 100, 1) if atm_iv and yz20 else None,
+            "data_points": points,
+        })
     return dashboard
 
 
+def _dashboard_stats_sql(conn, tickers: list[str], lookback: int) -> dict[str, tuple]:
+    """
+    Per ticker: the latest row's (atm_iv, close_price, *realized vol columns). Then,
+    over the last `lookback` non-null IVs: count, number of days below the
+    newest, min and max of the older ones, and the newest IV.
+
+    Each ticker's window is found with index seeks (newest IV, and the date
+    `lookback` IVs back), then aggregated in a single pass. The work scales
+    with lookback, not with table size.
+    """
+    requested = ", ".join("(?)" for _ in tickers)
+    vols = ", ".join(f"h.{c}" for c in realized_vol.COLUMNS)
+    newest = ("FROM iv_history h WHERE h.ticker = req.ticker AND h.atm_iv IS NOT NULL "
+              "ORDER BY h.date DESC LIMIT 1")
+    rows = conn.execute(f"""
+        WITH req(ticker) AS (VALUES {requested}),
+        bounds AS MATERIALIZED (
+            SELECT ticker,
+                   (SELECT h.date {newest}) AS now_date,
+                   (SELECT h.atm_iv {newest}) AS iv_now,
+                   COALESCE((SELECT h.date {newest} OFFSET ?), '') AS cutoff
+            FROM req
+        ),
+        hist AS (
+            SELECT b.ticker, COUNT(*) AS points,
+                   SUM(h.date < b.now_date AND h.atm_iv < b.iv_now) AS below,
+                   MIN(CASE WHEN h.date < b.now_date THEN h.atm_iv END) AS iv_min,
+                   MAX(CASE WHEN h.date < b.now_date THEN h.atm_iv END) AS iv_max,
+                   b.iv_now
+            FROM bounds b
+            JOIN iv_history h ON h.ticker = b.ticker AND h.date >= b.cutoff AND h.atm_iv IS NOT NULL
+            GROUP BY b.ticker
+        )
+        SELECT h.ticker, h.atm_iv, h.close_price, {vols},
+               COALESCE(hist.points, 0), COALESCE(hist.below, 0), hist.iv_min, hist.iv_max, hist.iv_now
+        FROM req
+        JOIN iv_history h ON h.ticker = req.ticker
+         AND h.date = (SELECT MAX(date) FROM iv_history WHERE ticker = req.ticker)
+        LEFT JOIN hist ON hist.ticker = req.ticker
+    """, (*tickers, max(lookback - 1, 0))).fetchall()
+    return {r[0]: r[1:] for r in rows}
+
+
+def _dashboard_stats_numpy(conn, tickers: list[str], lookback: int) -> dict[str, tuple]:
+    """Same as _dashboard_stats_sql from one plain query, using a (tickers x lookback) IV matrix."""
+    placeholders = ", ".join("?" for _ in tickers)
+    rows = conn.execute(
+        f"SELECT ticker, atm_iv, close_price, {', '.join(realized_vol.COLUMNS)} FROM iv_history "
+        f"WHERE ticker IN ({placeholders}) ORDER BY ticker, date DESC",
+        tickers
+    ).fetchall()
+    if not rows:
+        return {}
+
+    names = np.array([r[0] for r in rows])
+    iv = np.array([np.nan if r[1] is None else r[1] for r in rows], dtype=np.float64)
+    found, first = np.unique(names, return_index=True)
+
+    # Newest-first position of each non-null IV within its ticker
+    has_iv = ~np.isnan(iv)
+    group = np.searchsorted(found, names[has_iv])
+    counts = np.bincount(group, minlength=len(found))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    pos = np.arange(len(group)) - starts[group]
+    keep = pos < lookback
+    matrix = np.full((len(found), max(lookback, 2)), np.nan)
+    matrix[group[keep], pos[keep]] = iv[has_iv][keep]
+
+    now = matrix[:, 0]
+    older = matrix[:, 1:]
+    points = np.minimum(counts, lookback)
+    below = np.sum(older < now[:, None], axis=1)
+    iv_min = np.where(points >= 2, np.where(np.isnan(older), np.inf, older).min(axis=1), np.nan)
+    iv_max = np.where(points >= 2, np.where(np.isnan(older), -np.inf, older).max(axis=1), np.nan)
+
+    def opt(x):
+        return None if np.isnan(x) else float(x)
+
+    return {
+        str(t): (*rows[first[i]][1:], int(points[i]), int(below[i]),
+                 opt(iv_min[i]), opt(iv_max[i]), opt(now[i]))
+        for i, t in enumerate(found)
+    }
+
+
 if __name__ == "__main__":
     from rich.console import Console
     from rich.table import Table
@@ -259,12 +408,13 @@ if __name__ == "__main__":
     table.add_column("IV %ile")
     table.add_column("IV Rank")
     table.add_column("HV20%")
+    table.add_column("YZ20%")
     table.add_column("IV-HV")
     table.add_column("Data Pts")
 
     for d in data:
         if "status" in d:
-            table.add_row(d["ticker"], "", "", "", "", "", "", d["status"])
+            table.add_row(d["ticker"], "", "", "", "", "", "", "", d["status"])
         else:
             iv_hv = d.get("iv_hv_diff")
             iv_hv_str = f"{iv_hv:+.1f}" if iv_hv is not None else "N/A"
@@ -275,6 +425,7 @@ if __name__ == "__main__":
                 f"{d['iv_percentile']:.0f}" if d.get("iv_percentile") is not None else "N/A",
                 f"{d['iv_rank']:.0f}" if d.get("iv_rank") is not None else "N/A",
                 f"{d['hv20']:.1f}" if d.get("hv20") else "N/A",
+                f"{d['yz20']:.1f}" if d.get("yz20") else "N/A",
                 iv_hv_str,
                 str(d.get("data_points", 0)),
             )
@@ -1,46 +1,122 @@
 """Market data tools using Polygon.io API."""
 
+import threading
 import time
-from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
 from tools import polygon_client as _client
-from config import REQUEST_DELAY
+from tools.chain_store import get_atm_contracts, get_chain, dte_window
+from tools.bar_store import get_daily_bars, get_intraday_frame
+from tools.greeks import fill_chain
+from config import QUOTE_CACHE_TTL
 from log import get_logger
 
 logger = get_logger(__name__)
 
 
+# ticker -> (monotonic fetch time, price); shared by the single and batch price APIs
+_quotes: dict[str, tuple[float, float]] = {}
+_quotes_lock = threading.Lock()
+
+# Tickers per multi-ticker snapshot request (keeps the query string reasonable)
+_SNAPSHOT_BATCH = 100
+
+
 def get_current_price(ticker: str) -> float:
-    """Get current/latest stock price via Polygon snapshot."""
-    try:
-        snapshot = _client.get_snapshot_ticker("stocks", ticker)
-        # Try last trade price first, then day close, then prev day close
-        if snapshot.last_trade and snapshot.last_trade.price:
-            return float(snapshot.last_trade.price)
-        if snapshot.day and snapshot.day.close:
-            return float(snapshot.day.close)
-        if snapshot.prev_day and snapshot.prev_day.close:
-            return float(snapshot.prev_day.close)
-    except Exception as e:
-        logger.warning("Snapshot price error for %s: %s", ticker, e)
+    """Get current/latest stock price via Polygon snapshot (served from the quote cache when fresh)."""
+    return get_current_prices([ticker])[ticker.upper()]
 
-    # Fallback: previous close agg
-    try:
-        aggs = _client.get_previous_close_agg(ticker)
-        if aggs and len(aggs) > 0:
-            return float(aggs[0].close)
-    except Exception as e:
-        logger.warning("Previous close error for %s: %s", ticker, e)
 
+def get_current_prices(tickers: list[str]) -> dict[str, float]:
+    """
+    Get current/latest prices for many tickers with one multi-ticker snapshot call.
+    Prices younger than QUOTE_CACHE_TTL are reused; 0.0 means no price was found.
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    now = time.monotonic()
+    with _quotes_lock:
+        prices = {
+            t: _quotes[t][1] for t in tickers
+            if t in _quotes and now - _quotes[t][0] < QUOTE_CACHE_TTL
+        }
+    missing = [t for t in tickers if t not in prices]
+
+    for i in range(0, len(missing), _SNAPSHOT_BATCH):
+        batch = missing[i:i + _SNAPSHOT_BATCH]
+        try:
+            for snapshot in _client.get_snapshot_all("stocks", tickers=batch):
+                price = _snapshot_price(snapshot)
+                if snapshot.ticker and price > 0:
+                    prices[snapshot.ticker] = price
+        except Exception as e:
+            logger.warning("Snapshot price error for %s: %s", ",".join(batch), e)
+
+    # Fallback: previous close agg for anything the snapshot didn't cover
+    for t in missing:
+        if t in prices:
+            continue
+        try:
+            aggs = _client.get_previous_close_agg(t)
+            if aggs and len(aggs) > 0:
+                prices[t] = float(aggs[0].close)
+        except Exception as e:
+            logger.warning("Previous close error for %s: %s", t, e)
+
+    fetched_at = time.monotonic()
+    with _quotes_lock:
+        for t in missing:
+            if t in prices:
+                _quotes[t] = (fetched_at, prices[t])
+
+    return {t: prices.get(t, 0.0) for t in tickers}
+
+
+def _snapshot_price(snapshot) -> float:
+    """Last trade price, then day close, then previous day close."""
+    if snapshot.last_trade and snapshot.last_trade.price:
+        return float(snapshot.last_trade.price)
+    if snapshot.day and snapshot.day.close:
+        return float(snapshot.day.close)
+    if snapshot.prev_day and snapshot.prev_day.close:
+        return float(snapshot.prev_day.close)
     return 0.0
 
 
+def get_intraday_bars(tickers: list[str]) -> dict[str, tuple[float, float, float, float, float]]:
+    """
+    Today's running (open, high, low, last, volume) per ticker from the bulk
+    snapshot, one request per _SNAPSHOT_BATCH tickers. Tickers that have not
+    traded today are left out. Also refreshes the quote cache.
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    bars = {}
+    for i in range(0, len(tickers), _SNAPSHOT_BATCH):
+        batch = tickers[i:i + _SNAPSHOT_BATCH]
+        try:
+            snapshots = _client.get_snapshot_all("stocks", tickers=batch)
+        except Exception as e:
+            logger.warning("Snapshot bar error for %s: %s", ",".join(batch), e)
+            continue
+        fetched_at = time.monotonic()
+        for snapshot in snapshots:
+            day = snapshot.day
+            price = _snapshot_price(snapshot)
+            if not snapshot.ticker or price <= 0:
+                continue
+            with _quotes_lock:
+                _quotes[snapshot.ticker] = (fetched_at, price)
+            if day and day.open and day.volume:
+                bars[snapshot.ticker] = (
+                    float(day.open), float(max(day.high or price, price)),
+                    float(min(day.low or price, price)), price, float(day.volume),
+                )
+    return bars
+
+
 def get_stock_info(ticker: str) -> dict:
-    """Get basic stock info: name, market cap, sector, etc."""
-    try:
-        details = _client.get_ticker_details(ticker)
-    except Exception as e:
+    """Get basic stock info: name, market cap, sector, etc. (from the daily reference cache)."""
+    ref = _reference(ticker)
+    if ref is None:
         return {
             "ticker": ticker, "name": ticker, "sector": "N/A",
             "industry": "N/A", "market_cap": 0, "pe_ratio": None,
@@ -48,25 +124,59 @@ def get_stock_info(ticker: str) -> dict:
             "52w_low": None, "avg_volume": None, "earnings_date": None,
         }
 
-    # 52-week high/low from daily aggs
+    return {
+        "ticker": ticker,
+        "name": ref["name"],
+        "sector": ref["sector"],
+        "industry": ref["sector"],
+        "market_cap": ref["market_cap"],
+        "pe_ratio": None,  # Polygon basic tier doesn't include P/E
+        "forward_pe": None,
+        "beta": None,
+        "52w_high": ref["52w_high"],
+        "52w_low": ref["52w_low"],
+        "avg_volume": ref["avg_volume"],
+        "earnings_date": None,  # Would need separate financials API
+    }
+
+
+def _reference(ticker: str) -> dict | None:
+    """Cached reference data, or a direct lookup when the DB layer (SQLAlchemy) isn't installed."""
+    try:
+        from tools.reference import get_reference
+    except ImportError:
+        try:
+            data = collect_reference(ticker)
+        except Exception as e:
+            logger.warning("Ticker details error for %s: %s", ticker, e)
+            return None
+        return {
+            "name": data["name"], "sector": data["sector"], "market_cap": data["market_cap"],
+            "52w_high": data["w52_high"], "52w_low": data["w52_low"], "avg_volume": data["avg_volume_20d"],
+        }
+    return get_reference(ticker)
+
+
+def collect_reference(ticker: str) -> dict:
+    """
+    Ticker details from Polygon plus the 52-week range and 20-day average
+    volume from the local bar store, uncached (ticker_reference columns).
+    """
+    details = _client.get_ticker_details(ticker)
+
     w52_high, w52_low, avg_volume = None, None, None
     try:
-        to_date = datetime.now().strftime("%Y-%m-%d")
-        from_date = (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d")
-        aggs = _client.get_aggs(
-            ticker, 1, "day", from_date, to_date,
-            adjusted=True, sort="asc", limit=50000,
-        )
-        if aggs:
-            highs = [a.high for a in aggs if a.high is not None]
-            lows = [a.low for a in aggs if a.low is not None]
-            vols = [a.volume for a in aggs if a.volume is not None]
-            if highs:
-                w52_high = max(highs)
-            if lows:
-                w52_low = min(lows)
-            if vols and len(vols) >= 20:
-                avg_volume = int(sum(vols[-20:]) / 20)
+        df = get_daily_bars(ticker, 365)
+        if not df.empty:
+            highs = df["High"].dropna()
+            lows = df["Low"].dropna()
+            vols = df["Volume"].dropna()
+            if len(highs):
+                w52_high = float(highs.max())
+            if len(lows):
+                w52_low = float(lows.min())
+            if len(vols) >= 20:
+                avg_volume = int(vols.iloc[-20:].sum() / 20)
     except Exception as e:
         logger.warning("52-week data error for %s: %s", ticker, e)
 
@@ -74,175 +184,147 @@ def get_stock_info(ticker: str) -> dict:
         "ticker": ticker,
         "name": getattr(details, "name", ticker) or ticker,
         "sector": getattr(details, "sic_description", "N/A") or "N/A",
-        "industry": getattr(details, "sic_description", "N/A") or "N/A",
         "market_cap": getattr(details, "market_cap", 0) or 0,
-        "pe_ratio": None,  # Polygon basic tier doesn't include P/E
-        "forward_pe": None,
-        "beta": None,
-        "52w_high": w52_high,
-        "52w_low": w52_low,
-        "avg_volume": avg_volume,
-        "earnings_date": None,  # Would need separate financials API
+        "w52_high": w52_high,
+        "w52_low": w52_low,
+        "avg_volume_20d": avg_volume,
     }
 
 
-def get_stock_data(ticker: str, period: str = "6mo") -> pd.DataFrame:
+def get_stock_data(ticker: str, period: str = "6mo", float32: bool = False, timeframe: str = "1d") -> pd.DataFrame:
     """
     Get OHLCV data as pandas DataFrame for technical analysis.
     Compatible with ta library (columns: Open, High, Low, Close, Volume).
+    The frame's buffers are shared and read-only; float32 halves their size.
+
+    timeframe "1d" reads daily bars; "1m"/"5m"/"15m"/"30m"/"1h" are resampled
+    from stored minute bars, whose history is capped at MINUTE_BAR_RETENTION_DAYS.
+    Periods shorter than a month ("1d", "5d") are accepted for intraday views.
     """
     # Convert period string to days
     period_days = {
+        "1d": 1, "5d": 5,
         "1mo": 30, "3mo": 90, "6mo": 180,
         "1y": 365, "2y": 730, "5y": 1825,
     }
     days = period_days.get(period, 180)
 
-    to_date = datetime.now().strftime("%Y-%m-%d")
-    from_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    if timeframe != "1d":
+        return get_intraday_frame(ticker, timeframe, days, float32=float32)
 
-    try:
-        aggs = _client.get_aggs(
-            ticker, 1, "day", from_date, to_date,
-            adjusted=True, sort="asc", limit=50000,
-        )
-    except Exception as e:
-        logger.warning("Polygon aggs error for %s: %s", ticker, e)
-        return pd.DataFrame()
-
-    if not aggs:
-        return pd.DataFrame()
-
-    # Build DataFrame matching yfinance format (capitalized columns)
-    data = []
-    for a in aggs:
-        ts = datetime.fromtimestamp(a.timestamp / 1000) if a.timestamp else None
-        data.append({
-            "Date": ts,
-            "Open": a.open,
-            "High": a.high,
-            "Low": a.low,
-            "Close": a.close,
-            "Volume": a.volume or 0,
-        })
-
-    df = pd.DataFrame(data)
-    if not df.empty and "Date" in df.columns:
-        df.set_index("Date", inplace=True)
-        df.index = pd.DatetimeIndex(df.index)
-
-    return df
-
-
-def get_options_chain(ticker: str) -> dict:
+    # Served from the local bar store; only bars after the last stored one are fetched
+    return get_daily_bars(ticker, days, float32=float32)
+
+
+def get_options_chain(ticker: str, atm_only: bool = False) -> dict:
     """
     Get full options chain for a ticker using Polygon snapshot.
     Returns structured data with calls/puts, OI, volume, IV,
     ATM options, and put/call ratios.
+
+    With atm_only=True only the nearest expiry's ATM call and put are
+    looked up (a strike-bounded fetch when the chain isn't cached).
     """
     current_price = get_current_price(ticker)
 
-    # Scan 3-60 DTE range (skip 0-2 DTE where Greeks are often None)
-    exp_gte = (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d")
-    exp_lte = (datetime.now() + timedelta(days=60)).strftime("%Y-%m-%d")
+    # Scan 0-60 DTE; IV/Greeks Polygon leaves out (common at 0-2 DTE) are solved locally
+    exp_gte, exp_lte = dte_window(0, 60)
 
-    all_calls = []
-    all_puts = []
-    total_call_vol = 0
-    total_put_vol = 0
-    total_call_oi = 0
-    total_put_oi = 0
-    expirations_set = set()
+    if atm_only:
+        try:
+            atm = fill_chain(get_atm_contracts(ticker, current_price, exp_gte, exp_lte), current_price)
+        except Exception as e:
+            return {"error": f"Polygon options error: {e}", "ticker": ticker}
+        records = _contract_records(atm, current_price)
+        return {
+            "ticker": ticker,
+            "current_price": current_price,
+            "expirations": atm.expirations(),
+            "atm_call": next((r for r in records if r["type"] == "call"), None),
+            "atm_put": next((r for r in records if r["type"] == "put"), None),
+        }
 
     try:
-        for o in _client.list_snapshot_options_chain(
-            ticker,
-            params={
-                "expiration_date.gte": exp_gte,
-                "expiration_date.lte": exp_lte,
-            },
-        ):
-            details = o.details
-            if not details:
-                continue
-
-            ctype = details.contract_type  # "call" or "put"
-            strike = details.strike_price or 0
-            expiry = details.expiration_date or ""
-            expirations_set.add(expiry)
-
-            iv = o.implied_volatility or 0
-            vol = o.day.volume if o.day else 0
-            vol = vol or 0
-            oi = o.open_interest or 0
-            bid = o.last_quote.bid if o.last_quote else 0
-            ask = o.last_quote.ask if o.last_quote else 0
-            bid = bid or 0
-            ask = ask or 0
-
-            contract = {
-                "expiration": expiry,
-                "type": ctype,
-                "strike": float(strike),
-                "lastPrice": float((bid + ask) / 2) if bid and ask else 0,
-                "bid": float(bid),
-                "ask": float(ask),
-                "volume": int(vol),
-                "openInterest": int(oi),
-                "impliedVolatility": float(iv),
-                "contractSymbol": details.ticker if details else "",
-                "inTheMoney": (ctype == "call" and strike < current_price) or
-                              (ctype == "put" and strike > current_price),
-            }
-
-            if ctype == "call":
-                all_calls.append(contract)
-                total_call_vol += contract["volume"]
-                total_call_oi += contract["openInterest"]
-            else:
-                all_puts.append(contract)
-                total_put_vol += contract["volume"]
-                total_put_oi += contract["openInterest"]
-
+        frame = get_chain(ticker, exp_gte, exp_lte)
     except Exception as e:
         return {"error": f"Polygon options error: {e}", "ticker": ticker}
+    frame = fill_chain(frame, current_price)
 
-    expirations = sorted(expirations_set)
+    expirations = frame.expirations()
+    totals = frame.totals()
+    pc_vol_ratio, pc_oi_ratio = frame.put_call_ratios()
 
     # Find ATM options for nearest expiration
     atm_call = None
     atm_put = None
     if expirations:
         nearest_exp = expirations[0]
-        nearest_calls = [c for c in all_calls if c["expiration"] == nearest_exp]
-        nearest_puts = [p for p in all_puts if p["expiration"] == nearest_exp]
-        if nearest_calls:
-            atm_call = min(nearest_calls, key=lambda c: abs(c["strike"] - current_price))
-        if nearest_puts:
-            atm_put = min(nearest_puts, key=lambda p: abs(p["strike"] - current_price))
+        i = frame.atm_index(current_price, nearest_exp, "call")
+        if i is not None:
+            atm_call = _contract_records(frame.take([i]), current_price)[0]
+        i = frame.atm_index(current_price, nearest_exp, "put")
+        if i is not None:
+            atm_put = _contract_records(frame.take([i]), current_price)[0]
 
-    # Ratios
-    pc_vol_ratio = total_put_vol / total_call_vol if total_call_vol > 0 else None
-    pc_oi_ratio = total_put_oi / total_call_oi if total_call_oi > 0 else None
+    is_call = frame.is_call
 
     return {
         "ticker": ticker,
         "current_price": current_price,
         "expirations": expirations,
-        "total_contracts": len(all_calls) + len(all_puts),
-        "calls": all_calls,
-        "puts": all_puts,
+        "total_contracts": len(frame),
+        "calls": _contract_records(frame.take(is_call), current_price),
+        "puts": _contract_records(frame.take(~is_call), current_price),
         "atm_call": atm_call,
         "atm_put": atm_put,
-        "total_call_volume": total_call_vol,
-        "total_put_volume": total_put_vol,
-        "total_call_oi": total_call_oi,
-        "total_put_oi": total_put_oi,
+        "total_call_volume": totals["call_volume"],
+        "total_put_volume": totals["put_volume"],
+        "total_call_oi": totals["call_oi"],
+        "total_put_oi": totals["put_oi"],
         "put_call_volume_ratio": pc_vol_ratio,
         "put_call_oi_ratio": pc_oi_ratio,
     }
 
 
+def _contract_records(frame, current_price: float) -> list[dict]:
+    """Convert ChainFrame rows into the contract dicts returned by get_options_chain."""
+    strike = np.nan_to_num(frame.strike)
+    bid = np.nan_to_num(frame.bid)
+    ask = np.nan_to_num(frame.ask)
+    last = np.where((bid != 0) & (ask != 0), (bid + ask) / 2, 0.0)
+    is_call = frame.is_call
+    itm = np.where(is_call, strike < current_price, strike > current_price)
+    cols = zip(
+        frame.expiration.tolist(),
+        frame.contract_type.tolist(),
+        strike.tolist(),
+        last.tolist(),
+        bid.tolist(),
+        ask.tolist(),
+        np.nan_to_num(frame.volume).astype(np.int64).tolist(),
+        np.nan_to_num(frame.open_interest).astype(np.int64).tolist(),
+        np.nan_to_num(frame.iv).tolist(),
+        frame.symbol.tolist(),
+        itm.tolist(),
+    )
+    return [
+        {
+            "expiration": expiry,
+            "type": ctype,
+            "strike": k,
+            "lastPrice": lp,
+            "bid": b,
+            "ask": a,
+            "volume": v,
+            "openInterest": oi,
+            "impliedVolatility": iv,
+            "contractSymbol": sym,
+            "inTheMoney": in_money,
+        }
+        for expiry, ctype, k, lp, b, a, v, oi, iv, sym, in_money in cols
+    ]
+
+
 if __name__ == "__main__":
     from rich.console import Console
     from rich.table import Table
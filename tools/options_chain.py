@@ -4,8 +4,11 @@ API docs: https://polygon.io/docs/options/get_v3_snapshot_options__underlyingass
 """
 
 from datetime import datetime, timedelta
+import numpy as np
 from langchain.tools import tool
-from tools import polygon_client as _client
+from tools.chain_store import get_chain
+from tools.greeks import fill_chain
+from tools.market_data import get_current_price
 
 
 @tool
@@ -21,6 +24,7 @@ def scan_options_chain(
     Scan options chain snapshot for a given ticker.
     Returns contracts with price, Greeks (delta/gamma/theta/vega),
     implied volatility, open interest, and bid-ask spread.
+    IV and Greeks missing from the snapshot (common at 0-2 DTE) are solved locally.
 
     Args:
         ticker: Stock symbol e.g. "AAPL", "TSLA", "SPY"
@@ -30,68 +34,73 @@ def scan_options_chain(
         strike_price_lte: Maximum strike price
         contract_type: "call" or "put", None for all
     """
-    # Skip 0-2 DTE by default (Greeks often None for near-expiry)
     if not expiration_gte:
-        expiration_gte = (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d")
+        expiration_gte = datetime.now().strftime("%Y-%m-%d")
     if not expiration_lte:
         expiration_lte = (datetime.now() + timedelta(days=60)).strftime("%Y-%m-%d")
 
-    params = {
-        "expiration_date.gte": expiration_gte,
-        "expiration_date.lte": expiration_lte,
-    }
-    if strike_price_gte:
-        params["strike_price.gte"] = strike_price_gte
-    if strike_price_lte:
-        params["strike_price.lte"] = strike_price_lte
-    if contract_type:
-        params["contract_type"] = contract_type
-
-    options = []
     try:
-        for o in _client.list_snapshot_options_chain(ticker, params=params):
-            iv = o.implied_volatility
-            g = o.greeks
-            options.append({
-                "ticker": o.details.ticker if o.details else None,
-                "type": o.details.contract_type if o.details else None,
-                "strike": o.details.strike_price if o.details else None,
-                "expiry": o.details.expiration_date if o.details else None,
-                "bid": o.last_quote.bid if o.last_quote else None,
-                "ask": o.last_quote.ask if o.last_quote else None,
-                "mid": o.last_quote.midpoint if o.last_quote else None,
-                "volume": o.day.volume if o.day else 0,
-                "open_interest": o.open_interest,
-                "iv": round(iv, 4) if iv is not None else None,
-                "delta": round(g.delta, 4) if g and g.delta is not None else None,
-                "gamma": round(g.gamma, 6) if g and g.gamma is not None else None,
-                "theta": round(g.theta, 4) if g and g.theta is not None else None,
-                "vega": round(g.vega, 4) if g and g.vega is not None else None,
-                "break_even": o.break_even_price,
-            })
+        frame = get_chain(
+            ticker,
+            expiration_gte,
+            expiration_lte,
+            contract_type=contract_type,
+            strike_gte=strike_price_gte or None,
+            strike_lte=strike_price_lte or None,
+        )
     except Exception as e:
         return {"error": f"Polygon API error: {e}", "underlying": ticker}
+    frame = fill_chain(frame, get_current_price(ticker))
 
     # Summary
-    calls = [o for o in options if o["type"] == "call"]
-    puts = [o for o in options if o["type"] == "put"]
-    ivs = [o["iv"] for o in options if o["iv"]]
+    is_call = frame.is_call
+    oi = np.nan_to_num(frame.open_interest)
+    ivs = np.round(frame.iv, 4)
+    ivs = ivs[np.nan_to_num(ivs) != 0]
+    calls = np.flatnonzero(is_call)
+    puts = np.flatnonzero(frame.contract_type == "put")
 
     return {
         "underlying": ticker,
         "source": "polygon",
-        "count": len(options),
+        "count": len(frame),
         "scan_time": datetime.now().isoformat(),
-        "contracts": options[:50],
+        "contracts": [_contract(frame, i) for i in range(min(len(frame), 50))],
         "summary": {
-            "total_contracts": len(options),
-            "avg_iv": round(sum(ivs) / len(ivs), 4) if ivs else None,
-            "highest_oi_call": max(calls, key=lambda x: x["open_interest"] or 0, default=None),
-            "highest_oi_put": max(puts, key=lambda x: x["open_interest"] or 0, default=None),
+            "total_contracts": len(frame),
+            "avg_iv": round(float(ivs.mean()), 4) if len(ivs) else None,
+            "highest_oi_call": _contract(frame, calls[np.argmax(oi[calls])]) if len(calls) else None,
+            "highest_oi_put": _contract(frame, puts[np.argmax(oi[puts])]) if len(puts) else None,
         },
     }
 
 
+def _contract(frame, i: int) -> dict:
+    """Format one ChainFrame row for the tool output."""
+    r = frame.record(i)
+
+    def _round(v, digits):
+        return round(v, digits) if v is not None else None
+
+    return {
+        "ticker": r["symbol"],
+        "type": r["contract_type"],
+        "strike": r["strike"],
+        "expiry": r["expiration"],
+        "bid": r["bid"],
+        "ask": r["ask"],
+        "mid": r["midpoint"],
+        "volume": int(r["volume"] or 0),
+        "open_interest": int(r["open_interest"]) if r["open_interest"] is not None else None,
+        "iv": _round(r["iv"], 4),
+        "delta": _round(r["delta"], 4),
+        "gamma": _round(r["gamma"], 6),
+        "theta": _round(r["theta"], 4),
+        "vega": _round(r["vega"], 4),
+        "break_even": r["break_even"],
+    }
+
+
 if __name__ == "__main__":
     result = scan_options_chain.invoke({
         "ticker": "SPY",
@@ -0,0 +1,103 @@
+"""
+Realized volatility estimators over the bar panel.
+
+Every estimator is computed for each window in WINDOWS and annualized with
+252 trading days:
+
+- hv: close-to-close, the population std of log returns (HV20/HV60)
+- pk: Parkinson, from the high-low range
+- gk: Garman-Klass, the range plus the open-to-close move
+- yz: Yang-Zhang, overnight + open-to-close variance + Rogers-Satchell.
+  It is the only one of the four robust to both opening gaps and drift.
+
+Bars for a whole watchlist are right-aligned into (bars x tickers) arrays as
+in tools/indicator_panel.py, so all estimators for all tickers come out of
+one set of rolling operations. A window with a missing bar yields NaN.
+"""
+
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from tools.bar_store import get_daily_bars
+from tools.fetch import fan_out
+from tools.indicator_panel import align
+from log import get_logger
+
+logger = get_logger(__name__)
+
+WINDOWS = (20, 60)
+ESTIMATORS = ("hv", "pk", "gk", "yz")
+COLUMNS = tuple(f"{e}{n}" for e in ESTIMATORS for n in WINDOWS)
+
+_ANNUALIZATION = 252
+# Calendar days of bars loaded ahead of the first output date (covers the longest window)
+WARMUP_DAYS = 100
+
+
+def estimate(p: dict[str, np.ndarray], windows=WINDOWS) -> dict[str, np.ndarray]:
+    """
+    Annualized realized vol for an aligned panel (see indicator_panel.align).
+    Returns {"hv20": (rows x tickers), ..., "yz60": ...}.
+    """
+    o, h, l, c = (pd.DataFrame(p[k]) for k in ("Open", "High", "Low", "Close"))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_hl = np.log(h / l)
+        log_co = np.log(c / o)
+        returns = np.log(c).diff()
+        overnight = np.log(o / c.shift(1))
+        rogers_satchell = np.log(h / c) * np.log(h / o) + np.log(l / c) * np.log(l / o)
+    parkinson = log_hl ** 2 / (4 * np.log(2))
+    garman_klass = 0.5 * log_hl ** 2 - (2 * np.log(2) - 1) * log_co ** 2
+
+    out = {}
+    for n in windows:
+        def roll(x):
+            return x.rolling(n, min_periods=n)
+
+        k = 0.34 / (1.34 + (n + 1) / (n - 1))
+        variances = {
+            "hv": roll(returns).var(ddof=0),
+            "pk": roll(parkinson).mean(),
+            "gk": roll(garman_klass).mean(),
+            "yz": roll(overnight).var(ddof=1) + k * roll(log_co).var(ddof=1) + (1 - k) * roll(rogers_satchell).mean(),
+        }
+        for name, var in variances.items():
+            out[f"{name}{n}"] = np.sqrt(var.clip(lower=0).to_numpy() * _ANNUALIZATION)
+    return out
+
+
+def estimate_frames(frames: dict[str, pd.DataFrame], since: str = None) -> dict[str, pd.DataFrame]:
+    """
+    Realized vol for several OHLCV frames in one panel pass. Returns one
+    frame per ticker, indexed by bar date, with Close and COLUMNS: the rows
+    from `since` ("YYYY-MM-DD") on, or only the latest bar.
+    """
+    if not frames:
+        return {}
+    tickers, p, lengths = align(frames)
+    series = estimate(p)
+    rows = len(p["Close"])
+    out = {}
+    for j, ticker in enumerate(tickers):
+        first = rows - lengths[j]
+        df = pd.DataFrame(
+            {"Close": p["Close"][first:, j], **{name: series[name][first:, j] for name in COLUMNS}},
+            index=frames[ticker].index,
+        )
+        out[ticker] = df.loc[since:] if since else df.iloc[-1:]
+    return out
+
+
+def realized_vol_panel(tickers: list[str], since: str = None) -> dict[str, pd.DataFrame]:
+    """Load bars for `tickers` from the bar store and run estimate_frames over them."""
+    days = WARMUP_DAYS
+    if since:
+        days += (datetime.now() - datetime.strptime(since, "%Y-%m-%d")).days
+    bars = fan_out(lambda t: get_daily_bars(t, days), tickers)
+    loaded = {}
+    for ticker, df in zip(tickers, bars):
+        if isinstance(df, Exception):
+            logger.warning("Bar load error for %s: %s", ticker, df)
+        elif not df.empty:
+            loaded[ticker] = df
+    return estimate_frames(loaded, since)
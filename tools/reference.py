@@ -0,0 +1,94 @@
+"""
+Ticker reference-data cache.
+
+Name, sector and market cap barely move within a day, and the 52-week range
+and 20-day average volume only change once per session. They are stored in
+the ticker_reference table, refreshed in bulk once a day for the watchlist
+(see jobs/daily_collector.py) and read locally otherwise; a ticker that is
+missing or was last refreshed on an earlier day is refreshed on first use.
+"""
+
+import threading
+from datetime import date
+from data.models import Base, TickerReference, get_engine, get_session
+from tools.fetch import fan_out
+from tools.market_data import collect_reference
+from log import get_logger
+
+logger = get_logger(__name__)
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _ensure_table() -> None:
+    global _schema_ready
+    with _schema_lock:
+        if not _schema_ready:
+            Base.metadata.create_all(get_engine(), tables=[TickerReference.__table__])
+            _schema_ready = True
+
+
+def _as_dict(row: TickerReference) -> dict:
+    return {
+        "ticker": row.ticker,
+        "name": row.name,
+        "sector": row.sector,
+        "market_cap": row.market_cap,
+        "52w_high": row.w52_high,
+        "52w_low": row.w52_low,
+        "avg_volume": row.avg_volume_20d,
+        "refreshed_on": row.refreshed_on.isoformat(),
+    }
+
+
+def refresh_reference(tickers: list[str]) -> dict[str, dict]:
+    """
+    Refresh reference rows for many tickers: fetches fan out concurrently,
+    then every row is written in a single transaction.
+    Returns {ticker: reference dict} for the tickers that succeeded.
+    """
+    _ensure_table()
+    tickers = [t.upper() for t in tickers]
+    today = date.today()
+    fetched = fan_out(collect_reference, tickers)
+
+    refreshed = {}
+    session = get_session()
+    try:
+        for ticker, data in zip(tickers, fetched):
+            if isinstance(data, Exception):
+                logger.warning("Reference refresh failed for %s: %s", ticker, data)
+                continue
+            row = session.merge(TickerReference(**data, refreshed_on=today))
+            refreshed[ticker] = _as_dict(row)
+        session.commit()
+        return refreshed
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_reference(ticker: str) -> dict | None:
+    """
+    Reference data for a ticker from the local table, refreshing it first if
+    it is missing or stale. Returns None if it cannot be fetched.
+    """
+    _ensure_table()
+    ticker = ticker.upper()
+    session = get_session()
+    try:
+        row = session.get(TickerReference, ticker)
+        if row is not None and row.refreshed_on >= date.today():
+            return _as_dict(row)
+        stale = _as_dict(row) if row is not None else None
+    finally:
+        session.close()
+
+    try:
+        return refresh_reference([ticker]).get(ticker) or stale
+    except Exception as e:
+        logger.warning("Reference refresh error for %s: %s", ticker, e)
+        return stale
@@ -0,0 +1,114 @@
+"""
+Offline record / replay of Polygon HTTP traffic.
+
+Both classes stand in for the urllib3 pool underneath PolygonClient, so every
+endpoint (aggs, snapshots, options chain pages, news, ...) is covered without
+per-method code. Requests are keyed by path and query with each calendar
+date replaced by its offset in days from the day the request is made
+("<today-180>"). Windows computed relative to today (bar top-ups, DTE
+ranges) therefore keep matching on later days, while different ranges for
+the same ticker (initial fetch, older-history backfill, incremental top-up)
+stay separate recordings.
+
+Usage:
+    POLYGON_MODE=record python scanner.py      # capture a live run
+    POLYGON_MODE=replay python scanner.py      # rerun it offline, deterministically
+    POLYGON_MODE=replay POLYGON_REPLAY_LATENCY_MS=80 uvicorn api.main:app
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import date
+from urllib.parse import parse_qsl
+from urllib3.response import HTTPResponse
+from log import get_logger
+
+logger = get_logger(__name__)
+
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def request_key(url: str, fields: dict | None, today: date = None) -> str:
+    """
+    Normalized request: path plus sorted query params, with each date
+    replaced by its offset from `today` (default: the current date).
+    """
+    today = today or date.today()
+    path = url.split("://", 1)[-1]
+    path = path[path.find("/"):] if "/" in path else "/"
+    path, _, query = path.partition("?")
+    params = parse_qsl(query) + [(k, str(v)) for k, v in (fields or {}).items()]
+    normalized = path + "?" + "&".join(f"{k}={v}" for k, v in sorted(params))
+    return _DATE.sub(lambda m: _relative(m.group(), today), normalized)
+
+
+def _relative(text: str, today: date) -> str:
+    try:
+        return f"<today{(date.fromisoformat(text) - today).days:+d}>"
+    except ValueError:
+        return text
+
+
+def _fixture_path(fixtures_dir: str, key: str) -> str:
+    return os.path.join(fixtures_dir, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+
+class RecordingPool:
+    """
+    Forwards requests to a real pool and saves every 200 response to disk.
+    `today` pins the day dates are keyed against (default: the current date).
+    """
+
+    def __init__(self, pool, fixtures_dir: str, today: date = None):
+        self.pool = pool
+        self.fixtures_dir = fixtures_dir
+        self.today = today
+        os.makedirs(fixtures_dir, exist_ok=True)
+
+    def request(self, method, url, fields=None, headers=None, **kwargs):
+        resp = self.pool.request(method, url, fields=fields, headers=headers, **kwargs)
+        if resp.status == 200:
+            key = request_key(url, fields, self.today)
+            with open(_fixture_path(self.fixtures_dir, key), "w", encoding="utf-8") as f:
+                json.dump({"request": key, "status": resp.status,
+                           "body": resp.data.decode("utf-8")}, f)
+        return resp
+
+
+class ReplayPool:
+    """
+    Serves recorded responses with a fixed simulated latency; unknown requests
+    get a 404. `today` is as in RecordingPool.
+    """
+
+    def __init__(self, fixtures_dir: str, latency_ms: float = 0.0, today: date = None):
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency_ms / 1000
+        self.today = today
+        self._cache: dict[str, tuple[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, fields=None, headers=None, **kwargs):
+        key = request_key(url, fields, self.today)
+        with self._lock:
+            hit = self._cache.get(key)
+        if hit is None:
+            try:
+                with open(_fixture_path(self.fixtures_dir, key), encoding="utf-8") as f:
+                    saved = json.load(f)
+                hit = (saved["status"], saved["body"].encode("utf-8"))
+            except FileNotFoundError:
+                logger.warning("No recording for %s", key)
+                hit = (404, json.dumps({"status": "NOT_FOUND", "message": f"No recording for {key}"}).encode())
+            with self._lock:
+                self._cache[key] = hit
+
+        if self.latency:
+            time.sleep(self.latency)
+        status, body = hit
+        return HTTPResponse(body=body, status=status, preload_content=True,
+                            headers={"Content-Type": "application/json"})
@@ -0,0 +1,87 @@
+"""
+Streaming OHLCV resampler.
+
+Folds time-ordered minute bars into wider bars (5m, 15m, 1h, ...) in a single
+pass, holding only the currently open bucket per timeframe. Any number of
+timeframes can be derived from one read of the minute store, so memory stays
+bounded by the output size no matter how many minute bars flow through.
+
+Buckets are aligned to multiples of the width since the Unix epoch plus
+half an hour. US Eastern is a whole number of hours from UTC and the regular
+session opens at 9:30 ET, so every bucket lines up with the exchange clock:
+5m/15m/30m buckets as they would without the offset, and 1h buckets run
+9:30-10:30, ..., 15:30-16:00 (the last one half an hour long) instead of
+starting with a 9:00-10:00 bar that holds only 30 minutes of trading.
+"""
+
+from typing import Iterable, Iterator
+
+# Supported timeframes and their width in minutes
+TIMEFRAMES = {"1m": 1, "5m": 5, "15m": 15, "30m": 30, "1h": 60}
+
+# (timestamp ms, open, high, low, close, volume)
+Bar = tuple[int, float, float, float, float, float]
+
+# Bucket alignment offset, matching the :30 session open
+_OFFSET_MS = 30 * 60_000
+
+
+class Resampler:
+    """Aggregates a time-ordered bar stream into `minutes`-wide bars."""
+
+    def __init__(self, minutes: int):
+        self.width = minutes * 60_000
+        self._bar: list | None = None
+
+    def push(self, ts: int, o: float, h: float, l: float, c: float, v: float) -> Bar | None:
+        """Add one bar; returns the previous bucket's bar when this one starts a new bucket."""
+        start = ts - (ts - _OFFSET_MS) % self.width
+        bar = self._bar
+        if bar is not None and bar[0] == start:
+            if h > bar[2]:
+                bar[2] = h
+            if l < bar[3]:
+                bar[3] = l
+            bar[4] = c
+            bar[5] += v
+            return None
+        done = tuple(bar) if bar is not None else None
+        self._bar = [start, o, h, l, c, v]
+        return done
+
+    def flush(self) -> Bar | None:
+        """Emit the open (possibly partial) bucket and reset."""
+        done = tuple(self._bar) if self._bar is not None else None
+        self._bar = None
+        return done
+
+
+def resample(rows: Iterable[Bar], minutes: int) -> Iterator[Bar]:
+    """Lazily resample a time-ordered bar stream; the last bucket may be partial."""
+    if minutes == 1:
+        yield from rows
+        return
+    r = Resampler(minutes)
+    for row in rows:
+        done = r.push(*row)
+        if done is not None:
+            yield done
+    last = r.flush()
+    if last is not None:
+        yield last
+
+
+def resample_many(rows: Iterable[Bar], timeframes: Iterable[str]) -> dict[str, list[Bar]]:
+    """Derive several timeframes from one pass over the stream."""
+    samplers = {tf: Resampler(TIMEFRAMES[tf]) for tf in timeframes}
+    out: dict[str, list[Bar]] = {tf: [] for tf in samplers}
+    for row in rows:
+        for tf, r in samplers.items():
+            done = r.push(*row)
+            if done is not None:
+                out[tf].append(done)
+    for tf, r in samplers.items():
+        last = r.flush()
+        if last is not None:
+            out[tf].append(last)
+    return out
@@ -0,0 +1,368 @@
+"""
+Streaming (O(1) per bar) technical indicators.
+
+IndicatorState carries everything needed to advance SMA 20/50/200,
+Bollinger(20, 2), Wilder RSI(14), MACD(12, 26, 9), Stochastic(14, 3),
+ATR(14), 20-day volume average and 20-day support/resistance by one bar, using
+the same conventions as the ta library. Completed daily bars are committed
+into the state; today's still-forming bar is only previewed on a copy, so a
+refresh every minute costs one bulk snapshot plus a constant amount of
+arithmetic per ticker.
+
+States are persisted per ticker (indicator_state table in the bar store
+database) and caught up from stored bars on the next load.
+"""
+
+import copy
+import json
+import math
+import threading
+from collections import deque
+from datetime import datetime
+from tools import db
+from tools.bar_store import get_daily_bars, last_bar_date
+from tools.fetch import fan_out
+from tools.market_data import get_intraday_bars
+from tools.technical import build_result
+from config import BARS_DB_PATH
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Calendar days of history used to seed a new state (same as the "6mo" analysis)
+WARMUP_DAYS = 180
+
+# Running sums are recomputed from their windows this often to cancel float drift
+_RESYNC_EVERY = 1000
+
+_SMA_WINDOWS = (20, 50, 200)
+
+_states: dict[str, "IndicatorState"] = {}
+_states_lock = threading.Lock()
+_locks: dict[str, threading.Lock] = {}
+# Ticker -> date of its last catch-up from get_daily_bars
+_caught_up: dict[str, str] = {}
+
+
+class _Extreme:
+    """Rolling min or max over the last `window` values (monotonic deque, amortized O(1))."""
+
+    def __init__(self, window: int, is_max: bool):
+        self.window = window
+        self.is_max = is_max
+        self.items: deque = deque()  # (position, value), values monotonic
+
+    def push(self, pos: int, value: float) -> None:
+        items = self.items
+        if self.is_max:
+            while items and items[-1][1] <= value:
+                items.pop()
+        else:
+            while items and items[-1][1] >= value:
+                items.pop()
+        items.append((pos, value))
+        while items[0][0] <= pos - self.window:
+            items.popleft()
+
+    def value(self) -> float:
+        return self.items[0][1]
+
+
+class IndicatorState:
+    """Incremental indicator state for one ticker's daily bars."""
+
+    def __init__(self):
+        self.n = 0
+        self.last_date = None
+        self.close = None
+        self.prev_close = None
+        self.volume = 0.0
+        # SMA / Bollinger
+        self.closes: deque = deque(maxlen=max(_SMA_WINDOWS))
+        self.sums = {w: 0.0 for w in _SMA_WINDOWS}
+        self.sumsq20 = 0.0
+        # RSI (Wilder ewm of gains / losses)
+        self.avg_up = None
+        self.avg_down = None
+        # MACD
+        self.ema12 = None
+        self.ema26 = None
+        self.signal = None
+        self.signal_n = 0
+        self.macd = None
+        self.prev_macd = None
+        self.prev_signal = None
+        # Stochastic / support-resistance
+        self.low14 = _Extreme(14, is_max=False)
+        self.high14 = _Extreme(14, is_max=True)
+        self.low20 = _Extreme(20, is_max=False)
+        self.high20 = _Extreme(20, is_max=True)
+        self.stoch_ks: deque = deque(maxlen=3)
+        self.stoch_k = None
+        # ATR
+        self.atr = None
+        self.tr_seed = 0.0
+        # Volume
+        self.volumes: deque = deque(maxlen=20)
+        self.volume_sum = 0.0
+
+    def update(self, high: float, low: float, close: float, volume: float, date: str = None) -> None:
+        """Advance every indicator by one completed bar."""
+        n = self.n
+        prev = self.close
+
+        # --- SMA / Bollinger ---
+        closes = self.closes
+        for w in _SMA_WINDOWS:
+            self.sums[w] += close
+            if len(closes) >= w:
+                self.sums[w] -= closes[-w]
+        self.sumsq20 += close * close
+        if len(closes) >= 20:
+            self.sumsq20 -= closes[-20] ** 2
+        closes.append(close)
+
+        # --- RSI: the first bar has no change and counts as zero ---
+        diff = close - prev if prev is not None else 0.0
+        self.avg_up = _ewm(self.avg_up, max(diff, 0.0), 1 / 14)
+        self.avg_down = _ewm(self.avg_down, max(-diff, 0.0), 1 / 14)
+
+        # --- MACD ---
+        self.ema12 = _ewm(self.ema12, close, 2 / 13)
+        self.ema26 = _ewm(self.ema26, close, 2 / 27)
+        self.prev_macd, self.prev_signal = self.macd, self._signal_value()
+        if n + 1 >= 26:
+            self.macd = self.ema12 - self.ema26
+            self.signal = _ewm(self.signal, self.macd, 2 / 10)
+            self.signal_n += 1
+
+        # --- Stochastic / support-resistance ---
+        for ext, value in ((self.low14, low), (self.high14, high), (self.low20, low), (self.high20, high)):
+            ext.push(n, value)
+        if n + 1 >= 14:
+            lo, hi = self.low14.value(), self.high14.value()
+            self.stoch_k = 100 * (close - lo) / (hi - lo) if hi != lo else math.nan
+            self.stoch_ks.append(self.stoch_k)
+
+        # --- ATR: mean of the first 14 true ranges, then Wilder smoothing ---
+        tr = high - low if prev is None else max(high - low, abs(high - prev), abs(low - prev))
+        if n < 14:
+            self.tr_seed += tr
+            if n == 13:
+                self.atr = self.tr_seed / 14
+        else:
+            self.atr = (self.atr * 13 + tr) / 14
+
+        # --- Volume ---
+        if len(self.volumes) == self.volumes.maxlen:
+            self.volume_sum -= self.volumes[0]
+        self.volumes.append(volume)
+        self.volume_sum += volume
+
+        self.n = n + 1
+        self.prev_close, self.close, self.volume = prev, close, volume
+        self.last_date = date or self.last_date
+        if self.n % _RESYNC_EVERY == 0:
+            self._resync()
+
+    def preview(self, high: float, low: float, close: float, volume: float) -> "IndicatorState":
+        """State as if the given (still-forming) bar were committed; self is unchanged."""
+        state = copy.deepcopy(self)
+        state.update(high, low, close, volume)
+        return state
+
+    def result(self, ticker: str) -> dict:
+        """Analysis dict in the full_technical_analysis format."""
+        if not self.n:
+            return {"error": f"No data for {ticker}"}
+        closes = self.closes
+        sma = {w: self.sums[w] / w if len(closes) >= w else None for w in _SMA_WINDOWS}
+        bb_upper = bb_lower = None
+        if sma[20] is not None:
+            std = math.sqrt(max(self.sumsq20 / 20 - sma[20] ** 2, 0.0))
+            bb_upper, bb_lower = sma[20] + 2 * std, sma[20] - 2 * std
+
+        rsi = None
+        if self.n >= 14:
+            rsi = 100.0 if self.avg_down == 0 else 100 - 100 / (1 + self.avg_up / self.avg_down)
+        signal = self._signal_value()
+        stoch_d = sum(self.stoch_ks) / 3 if len(self.stoch_ks) == 3 else None
+        prev_close = self.prev_close if self.prev_close is not None else self.close
+
+        return build_result(
+            ticker, self.close, prev_close,
+            sma20=sma[20], sma50=sma[50], sma200=sma[200],
+            rsi=rsi,
+            macd=self.macd, macd_signal=signal,
+            macd_hist=self.macd - signal if signal is not None else None,
+            prev_macd=self.prev_macd, prev_signal=self.prev_signal,
+            bb_upper=bb_upper, bb_middle=sma[20], bb_lower=bb_lower,
+            stoch_k=_finite(self.stoch_k), stoch_d=_finite(stoch_d),
+            atr=self.atr,
+            volume=int(self.volume), vol_sma20=self.volume_sum / len(self.volumes),
+            support=self.low20.value(), resistance=self.high20.value(),
+        )
+
+    def to_state(self) -> dict:
+        """JSON-serializable snapshot."""
+        out = {}
+        for key, value in vars(self).items():
+            if isinstance(value, _Extreme):
+                value = [list(item) for item in value.items]
+            elif isinstance(value, deque):
+                value = list(value)
+            elif key == "sums":
+                value = {str(w): s for w, s in value.items()}
+            out[key] = value
+        return out
+
+    @classmethod
+    def from_state(cls, data: dict) -> "IndicatorState":
+        state = cls()
+        for key, value in data.items():
+            current = getattr(state, key)
+            if isinstance(current, _Extreme):
+                current.items = deque(tuple(item) for item in value)
+            elif isinstance(current, deque):
+                current.extend(value)
+            elif key == "sums":
+                state.sums = {int(w): s for w, s in value.items()}
+            else:
+                setattr(state, key, value)
+        return state
+
+    def _signal_value(self) -> float | None:
+        return self.signal if self.signal_n >= 9 else None
+
+    def _resync(self) -> None:
+        closes = list(self.closes)
+        self.sums = {w: sum(closes[-w:]) for w in _SMA_WINDOWS}
+        self.sumsq20 = sum(c * c for c in closes[-20:])
+        self.volume_sum = sum(self.volumes)
+
+
+def _ewm(previous: float | None, value: float, alpha: float) -> float:
+    """One step of an adjust=False exponential average seeded with the first value."""
+    return value if previous is None else (1 - alpha) * previous + alpha * value
+
+
+def _finite(x: float | None) -> float | None:
+    return None if x is None or math.isnan(x) else x
+
+
+# --- Persistence ---
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS indicator_state (
+        ticker TEXT PRIMARY KEY,
+        last_date TEXT,
+        state TEXT NOT NULL
+    );
+"""
+
+
+def _get_db():
+    """This thread's pooled connection to the bar store database (state table ensured once)."""
+    return db.connect(BARS_DB_PATH, _SCHEMA)
+
+
+def save_states(tickers: list[str] = None) -> int:
+    """Persist in-memory states (all, or the given tickers). Returns rows written."""
+    with _states_lock:
+        items = [(t, s) for t, s in _states.items() if tickers is None or t in tickers]
+        rows = [(t, s.last_date, json.dumps(s.to_state())) for t, s in items]
+    with _get_db() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO indicator_state (ticker, last_date, state) VALUES (?, ?, ?)", rows
+        )
+    return len(rows)
+
+
+def _load_state(ticker: str) -> IndicatorState | None:
+    row = _get_db().execute(
+        "SELECT state FROM indicator_state WHERE ticker = ?", (ticker,)
+    ).fetchone()
+    return IndicatorState.from_state(json.loads(row[0])) if row else None
+
+
+def _ticker_lock(ticker: str) -> threading.Lock:
+    with _states_lock:
+        return _locks.setdefault(ticker, threading.Lock())
+
+
+def get_state(ticker: str, today: str = None) -> tuple[IndicatorState, bool]:
+    """
+    Committed state for a ticker, advanced through the last bar before today.
+    Returns (state, changed) where changed means new bars were committed.
+
+    After a market holiday the state can't reach the previous weekday; once
+    it has been caught up today, it is current if no newer bar before today
+    has been stored since (a local query, no Polygon sync).
+    """
+    ticker = ticker.upper()
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    with _ticker_lock(ticker):
+        state = _states.get(ticker)
+        if state is not None and state.last_date is not None and (
+            state.last_date >= _previous_day(today)
+            or (_caught_up.get(ticker) == today and state.last_date >= (last_bar_date(ticker, today) or ""))
+        ):
+            return state, False
+
+        if state is None:
+            state = _load_state(ticker) or IndicatorState()
+
+        df = get_daily_bars(ticker, WARMUP_DAYS)
+        changed = False
+        if not df.empty:
+            dates = df.index.strftime("%Y-%m-%d")
+            keep = (dates < today) & (dates > (state.last_date or ""))
+            for date, (high, low, close, volume) in zip(
+                dates[keep], df.loc[keep, ["High", "Low", "Close", "Volume"]].to_numpy().tolist()
+            ):
+                state.update(high, low, close, volume, date)
+                changed = True
+
+        with _states_lock:
+            _states[ticker] = state
+            _caught_up[ticker] = today
+        return state, changed
+
+
+def refresh_signals(tickers: list[str]) -> list[dict]:
+    """
+    Current signals for many tickers: committed states plus a preview of
+    today's bar from one bulk snapshot. States that advanced are persisted.
+    """
+    tickers = [t.upper() for t in tickers]
+    today = datetime.now().strftime("%Y-%m-%d")
+    live = get_intraday_bars(tickers)
+
+    loaded = fan_out(lambda t: get_state(t, today), tickers)
+
+    results, changed = [], []
+    for ticker, entry in zip(tickers, loaded):
+        if isinstance(entry, Exception):
+            logger.warning("Indicator state error for %s: %s", ticker, entry)
+            results.append({"ticker": ticker, "error": str(entry)})
+            continue
+        state, advanced = entry
+        if advanced:
+            changed.append(ticker)
+        bar = live.get(ticker)
+        if bar is not None and state.n:
+            _, high, low, close, volume = bar
+            state = state.preview(high, low, close, volume)
+        results.append(state.result(ticker))
+
+    if changed:
+        save_states(changed)
+    return results
+
+
+def _previous_day(date: str) -> str:
+    """Latest weekday strictly before date (market holidays are handled in get_state)."""
+    day = datetime.strptime(date, "%Y-%m-%d").toordinal() - 1
+    while datetime.fromordinal(day).weekday() >= 5:
+        day -= 1
+    return datetime.fromordinal(day).strftime("%Y-%m-%d")
@@ -0,0 +1,108 @@
+"""
+Technical analysis result cache.
+
+Results are stored per slot, where a slot is (ticker, period, timeframe,
+indicator groups), together with the fingerprint of the bars they were
+computed from: bar count, timestamp of the last bar, and that bar's close
+and volume. A lookup hits only if the fingerprint still matches. So a new
+bar invalidates the entry automatically, and so does a revised close on
+today's still-forming bar. The stale result is simply replaced on the next
+store.
+
+The in-memory layer is an LRU of TA_CACHE_SIZE slots. When TA_CACHE_DB is
+set, results are also written through to a SQLite file there, so a
+restarted process (or another worker) starts warm.
+"""
+
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+import pandas as pd
+from tools import db
+from config import TA_CACHE_SIZE, TA_CACHE_DB
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# slot -> (fingerprint, result)
+_lru: OrderedDict[tuple, tuple[tuple, dict]] = OrderedDict()
+_lock = threading.Lock()
+
+
+def fingerprint(df: pd.DataFrame) -> tuple:
+    """Identity of a bar frame's latest state: (bars, last timestamp, last close, last volume)."""
+    last = df.iloc[-1]
+    return len(df), str(df.index[-1]), float(last["Close"]), float(last["Volume"])
+
+
+def get(slot: tuple, fp: tuple) -> dict | None:
+    """Cached result for `slot` if it was computed from bars matching `fp`, else None."""
+    with _lock:
+        entry = _lru.get(slot)
+        if entry is not None:
+            _lru.move_to_end(slot)
+    if entry is None and TA_CACHE_DB:
+        entry = _disk_get(slot)
+        if entry is not None:
+            _remember(slot, entry)
+    if entry is None or entry[0] != fp:
+        return None
+    return dict(entry[1])
+
+
+def put(slot: tuple, fp: tuple, result: dict) -> None:
+    """Store a result, replacing whatever the slot held for older bars."""
+    entry = (fp, dict(result))
+    _remember(slot, entry)
+    if TA_CACHE_DB:
+        _disk_put(slot, entry)
+
+
+def clear() -> None:
+    """Drop every in-memory entry (the disk layer is left alone)."""
+    with _lock:
+        _lru.clear()
+
+
+def _remember(slot: tuple, entry: tuple[tuple, dict]) -> None:
+    with _lock:
+        _lru[slot] = entry
+        _lru.move_to_end(slot)
+        while len(_lru) > TA_CACHE_SIZE:
+            _lru.popitem(last=False)
+
+
+# --- Disk layer ---
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS ta_results (
+        slot TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL,
+        result TEXT NOT NULL
+    );
+"""
+
+
+def _disk_get(slot: tuple) -> tuple[tuple, dict] | None:
+    try:
+        row = db.connect(TA_CACHE_DB, _SCHEMA).execute(
+            "SELECT fingerprint, result FROM ta_results WHERE slot = ?", (json.dumps(slot),)
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning("TA cache read error: %s", e)
+        return None
+    if row is None:
+        return None
+    return tuple(json.loads(row[0])), json.loads(row[1])
+
+
+def _disk_put(slot: tuple, entry: tuple[tuple, dict]) -> None:
+    try:
+        with db.connect(TA_CACHE_DB, _SCHEMA) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ta_results (slot, fingerprint, result) VALUES (?, ?, ?)",
+                (json.dumps(slot), json.dumps(entry[0]), json.dumps(entry[1])),
+            )
+    except sqlite3.Error as e:
+        logger.warning("TA cache write error: %s", e)
@@ -1,45 +1,121 @@
-"""Technical analysis engine using ta library."""
-
-import pandas as pd
-import numpy as np
-import ta
-from tools.market_data import get_stock_data, get_current_price
-
-
-def full_technical_analysis(ticker: str, period: str = "6mo") -> dict:
+"""Technical analysis engine (indicator formulas follow the ta library)."""
+
+from tools import ta_cache
+from tools.indicator_graph import IndicatorGraph
+from tools.market_data import get_stock_data
+
+# Indicator groups that can be requested on their own, and the result keys each adds.
+# "signal" (the composite score) needs every other group.
+INDICATOR_GROUPS = {
+    "trend": ("sma20", "sma50", "sma200", "trend"),
+    "rsi": ("rsi", "rsi_signal"),
+    "macd": ("macd", "macd_signal", "macd_histogram", "macd_cross"),
+    "bollinger": ("bb_upper", "bb_middle", "bb_lower", "bb_position"),
+    "stochastic": ("stoch_k", "stoch_d"),
+    "atr": ("atr", "atr_pct"),
+    "volume": ("volume", "volume_sma20", "volume_ratio"),
+    "levels": ("support_20d", "resistance_20d"),
+    "signal": ("signal", "strength"),
+}
+
+_BASE_KEYS = ("ticker", "current_price", "change", "change_pct")
+
+
+def full_technical_analysis(ticker: str, period: str = "6mo", indicators: list[str] = None,
+                            timeframe: str = "1d") -> dict:
     """
     Run full technical analysis on a ticker.
     Returns dict with all indicators and a composite signal summary.
+
+    Args:
+        ticker: Stock symbol
+        period: Data period "1mo", "3mo", "6mo", "1y"
+        indicators: Subset of INDICATOR_GROUPS to compute (default: all);
+                    price and change are always included
+        timeframe: Bar size "1d" (default) or an intraday one: "1m", "5m", "15m", "30m", "1h".
+                   Window-based outputs (e.g. support_20d) then count bars of that size.
+
+    Results are cached (tools/ta_cache.py) until the bars they came from change.
     """
-    df = get_stock_data(ticker, period=period)
+    groups = list(INDICATOR_GROUPS) if not indicators else [i.strip().lower() for i in indicators]
+    unknown = [g for g in groups if g not in INDICATOR_GROUPS]
+    if unknown:
+        return {"error": f"Unknown indicators: {', '.join(unknown)}. "
+                         f"Choose from: {', '.join(INDICATOR_GROUPS)}"}
+    if "signal" in groups:
+        groups = list(INDICATOR_GROUPS)
+
+    try:
+        df = get_stock_data(ticker, period=period, timeframe=timeframe)
+    except ValueError as e:
+        return {"error": str(e)}
     if df.empty:
         return {"error": f"No data for {ticker}"}
 
-    close = df["Close"]
-    high = df["High"]
-    low = df["Low"]
-    volume = df["Volume"]
-    current = float(close.iloc[-1])
-    prev_close = float(close.iloc[-2]) if len(close) > 1 else current
-
+    slot = (ticker, period, timeframe, tuple(groups))
+    fp = ta_cache.fingerprint(df)
+    cached = ta_cache.get(slot, fp)
+    if cached is not None:
+        return cached
+
+    g = IndicatorGraph(df)
+    current = g.last("close")
+    prev_close = g.last("close", 2) if len(df) > 1 else current
+
+    inputs = {
+        "sma20": None, "sma50": None, "sma200": None, "rsi": None,
+        "macd": None, "macd_signal": None, "macd_hist": None, "prev_macd": None, "prev_signal": None,
+        "bb_upper": None, "bb_middle": None, "bb_lower": None, "stoch_k": None, "stoch_d": None,
+        "atr": None, "volume": 0, "vol_sma20": 0.0, "support": None, "resistance": None,
+    }
+    if "trend" in groups:
+        inputs.update(sma20=g.last("sma20"), sma50=g.last("sma50"), sma200=g.last("sma200"))
+    if "rsi" in groups:
+        inputs.update(rsi=g.last("rsi"))
+    if "macd" in groups:
+        inputs.update(
+            macd=g.last("macd"), macd_signal=g.last("macd_signal"), macd_hist=g.last("macd_hist"),
+            prev_macd=g.last("macd", 2), prev_signal=g.last("macd_signal", 2),
+        )
+    if "bollinger" in groups:
+        inputs.update(bb_upper=g.last("bb_upper"), bb_middle=g.last("sma20"), bb_lower=g.last("bb_lower"))
+    if "stochastic" in groups:
+        inputs.update(stoch_k=g.last("stoch_k"), stoch_d=g.last("stoch_d"))
+    if "atr" in groups:
+        inputs.update(atr=g.last("atr"))
+    if "volume" in groups:
+        volume = g["volume"]
+        inputs.update(
+            volume=int(volume.iloc[-1]),
+            vol_sma20=g.last("volume_sma20") if len(volume) >= 20 else float(volume.mean()),
+        )
+    if "levels" in groups:
+        inputs.update(support=g.last("support20"), resistance=g.last("resistance20"))
+
+    result = build_result(ticker, current, prev_close, **inputs)
+    if len(groups) < len(INDICATOR_GROUPS):
+        keys = _BASE_KEYS + tuple(k for group in groups for k in INDICATOR_GROUPS[group])
+        result = {k: result[k] for k in keys}
+    ta_cache.put(slot, fp, result)
+    return result
+
+
+def build_result(
+    ticker, current, prev_close, *, sma20, sma50, sma200, rsi, macd, macd_signal,
+    macd_hist, prev_macd, prev_signal, bb_upper, bb_middle, bb_lower, stoch_k, stoch_d,
+    atr, volume, vol_sma20, support, resistance,
+) -> dict:
+    """
+    Turn the latest indicator values into the analysis dict (signals, trend,
+    composite score). Shared by full_technical_analysis and the indicator panel.
+    """
     # Price change
     change = current - prev_close
     change_pct = (change / prev_close) * 100 if prev_close else 0
 
-    # --- Moving Averages ---
-    sma20 = ta.trend.sma_indicator(close, window=20)
-    sma50 = ta.trend.sma_indicator(close, window=50)
-    sma200 = ta.trend.sma_indicator(close, window=200)
-    sma20_val = float(sma20.iloc[-1]) if pd.notna(sma20.iloc[-1]) else None
-    sma50_val = float(sma50.iloc[-1]) if pd.notna(sma50.iloc[-1]) else None
-    sma200_val = float(sma200.iloc[-1]) if pd.notna(sma200.iloc[-1]) else None
-
     # Trend determination
-    trend = _determine_trend(current, sma20_val, sma50_val, sma200_val)
+    trend = _determine_trend(current, sma20, sma50, sma200)
 
-    # --- RSI ---
-    rsi_series = ta.momentum.rsi(close, window=14)
-    rsi = float(rsi_series.iloc[-1]) if pd.notna(rsi_series.iloc[-1]) else None
     rsi_signal = "neutral"
     if rsi is not None:
         if rsi > 70:
@@ -47,48 +123,18 @@ def full_technical_analysis(ticker: str, period: str = "6mo") -> dict:
         elif rsi < 30:
             rsi_signal = "oversold"
 
-    # --- MACD ---
-    macd_ind = ta.trend.MACD(close)
-    macd_val = float(macd_ind.macd().iloc[-1]) if pd.notna(macd_ind.macd().iloc[-1]) else None
-    macd_signal_val = float(macd_ind.macd_signal().iloc[-1]) if pd.notna(macd_ind.macd_signal().iloc[-1]) else None
-    macd_hist = float(macd_ind.macd_diff().iloc[-1]) if pd.notna(macd_ind.macd_diff().iloc[-1]) else None
-
     macd_cross = "neutral"
-    if macd_val is not None and macd_signal_val is not None:
-        prev_macd = float(macd_ind.macd().iloc[-2]) if pd.notna(macd_ind.macd().iloc[-2]) else None
-        prev_signal = float(macd_ind.macd_signal().iloc[-2]) if pd.notna(macd_ind.macd_signal().iloc[-2]) else None
+    if macd is not None and macd_signal is not None:
         if prev_macd is not None and prev_signal is not None:
-            if prev_macd <= prev_signal and macd_val > macd_signal_val:
+            if prev_macd <= prev_signal and macd > macd_signal:
                 macd_cross = "bullish_crossover"
-            elif prev_macd >= prev_signal and macd_val < macd_signal_val:
+            elif prev_macd >= prev_signal and macd < macd_signal:
                 macd_cross = "bearish_crossover"
 
-    # --- Bollinger Bands ---
-    bb = ta.volatility.BollingerBands(close, window=20, window_dev=2)
-    bb_upper = float(bb.bollinger_hband().iloc[-1]) if pd.notna(bb.bollinger_hband().iloc[-1]) else None
-    bb_middle = float(bb.bollinger_mavg().iloc[-1]) if pd.notna(bb.bollinger_mavg().iloc[-1]) else None
-    bb_lower = float(bb.bollinger_lband().iloc[-1]) if pd.notna(bb.bollinger_lband().iloc[-1]) else None
     bb_position = _bb_position(current, bb_upper, bb_middle, bb_lower)
 
-    # --- Stochastic ---
-    stoch = ta.momentum.StochasticOscillator(high, low, close, window=14, smooth_window=3)
-    stoch_k = float(stoch.stoch().iloc[-1]) if pd.notna(stoch.stoch().iloc[-1]) else None
-    stoch_d = float(stoch.stoch_signal().iloc[-1]) if pd.notna(stoch.stoch_signal().iloc[-1]) else None
-
-    # --- ATR ---
-    atr_series = ta.volatility.average_true_range(high, low, close, window=14)
-    atr = float(atr_series.iloc[-1]) if pd.notna(atr_series.iloc[-1]) else None
     atr_pct = (atr / current * 100) if atr and current else None
-
-    # --- Volume analysis ---
-    vol_current = int(volume.iloc[-1])
-    vol_sma20 = float(volume.rolling(20).mean().iloc[-1]) if len(volume) >= 20 else float(volume.mean())
-    vol_ratio = vol_current / vol_sma20 if vol_sma20 > 0 else 1.0
-
-    # --- Support / Resistance (20-day) ---
-    recent = df.tail(20)
-    support = float(recent["Low"].min())
-    resistance = float(recent["High"].max())
+    vol_ratio = volume / vol_sma20 if vol_sma20 > 0 else 1.0
 
     # --- Composite signal ---
     signal, strength = _composite_signal(
@@ -102,16 +148,16 @@ def full_technical_analysis(ticker: str, period: str = "6mo") -> dict:
         "change": change,
         "change_pct": change_pct,
         # Trend
-        "sma20": sma20_val,
-        "sma50": sma50_val,
-        "sma200": sma200_val,
+        "sma20": sma20,
+        "sma50": sma50,
+        "sma200": sma200,
         "trend": trend,
         # RSI
         "rsi": rsi,
         "rsi_signal": rsi_signal,
         # MACD
-        "macd": macd_val,
-        "macd_signal": macd_signal_val,
+        "macd": macd,
+        "macd_signal": macd_signal,
         "macd_histogram": macd_hist,
         "macd_cross": macd_cross,
         # Bollinger Bands
@@ -126,7 +172,7 @@ def full_technical_analysis(ticker: str, period: str = "6mo") -> dict:
         "atr": atr,
         "atr_pct": atr_pct,
         # Volume
-        "volume": vol_current,
+        "volume": volume,
         "volume_sma20": vol_sma20,
         "volume_ratio": vol_ratio,
         # Support / Resistance
@@ -1,17 +1,66 @@
-"""Unusual options activity detection using Polygon.io API."""
-
-import time
-import math
-from datetime import datetime, timedelta
-from tools import polygon_client as _client
-from tools.market_data import get_current_price
-from config import REQUEST_DELAY
+"""
+Unusual options activity detection using Polygon.io API.
+
+Contract-level detectors are declarative rules: a boolean mask over the
+whole chain's columns (see _columns), registered with @rule in priority
+order. All rules are evaluated as NumPy masks at once. A contract hit by
+several rules is reported once, under the first of them, and alert dicts
+are only built for those surviving rows. New detectors only need a @rule
+function; the scan itself doesn't change.
+
+In incremental mode (the collector's intraday scans) the rules see each
+contract's volume and premium flow since the ticker's previous scan,
+diffed by tools/chain_diff.py, instead of the cumulative day totals. A
+contract then alerts when the flow happens, not on every later scan.
+"""
+
+import numpy as np
+from tools.chain_store import get_chain, dte_window
+from tools.market_data import get_current_price, get_current_prices
+from tools.fetch import fan_out
+from tools import chain_diff
 from log import get_logger
 
 logger = get_logger(__name__)
 
+# name -> (mask function of the chain columns, interpretation template, extra alert fields)
+RULES: dict[str, tuple[callable, str, dict[str, tuple[str, int]]]] = {}
 
-def scan_unusual(tickers: list[str]) -> list[dict]:
+
+def rule(name: str, interpretation: str, **fields: tuple[str, int]):
+    """
+    Register a contract-level detector; the decorated function maps the chain
+    columns to a boolean mask. `interpretation` is formatted with the alert's
+    fields plus `bias` ("Bullish" for calls, "Bearish" for puts). `fields`
+    adds alert fields taken from columns, e.g. vol_oi_ratio=("vol_oi", 1) for
+    the column rounded to 1 decimal.
+    """
+    def register(fn):
+        RULES[name] = (fn, interpretation, fields)
+        return fn
+    return register
+
+
+@rule("VOL/OI_SURGE",
+      "New positions surging: {vol_oi_ratio:.1f}x OI traded today. {bias} signal.",
+      vol_oi_ratio=("vol_oi", 1))
+def _vol_oi_surge(c):
+    return (c["oi"] > 0) & (c["vol_oi"] > 3) & (c["vol"] > 100)
+
+
+@rule("HIGH_VOLUME",
+      "Heavy {side} activity: {volume:,} contracts traded, ${premium_flow:,.0f} premium flow.")
+def _high_volume(c):
+    return (c["vol"] > 5000) & (c["mid"] > 0.10)
+
+
+@rule("INSTITUTIONAL_FAR_MONTH",
+      "Possible institutional positioning: {dte} DTE, ${premium_flow:,.0f} flow in far-month {side}.")
+def _institutional_far_month(c):
+    return (c["dte"] > 90) & (c["vol"] > 1000) & (c["premium_flow"] > 100000)
+
+
+def scan_unusual(tickers: list[str], incremental: bool = False) -> list[dict]:
     """
     Scan tickers for unusual options activity.
 
@@ -22,166 +71,87 @@ def scan_unusual(tickers: list[str]) -> list[dict]:
     4. Extreme Put/Call volume ratios (>1.5 or <0.5)
     5. Unusual large orders in far-month contracts (institutional positioning)
 
+    With incremental=True, volume and flow are measured since each ticker's
+    previous incremental scan (the whole day so far for its first scan of
+    the day). Contract alerts then also carry day_volume, oi_change and
+    since; the OI magnet check, which isn't about flow, is skipped.
+
     Returns results sorted by premium flow (volume * midprice * 100) descending.
     """
     all_unusual = []
 
-    for ticker in tickers:
-        try:
-            alerts = _scan_ticker(ticker)
-            all_unusual.extend(alerts)
-        except Exception as e:
-            logger.warning("Error scanning %s: %s", ticker, e)
-        time.sleep(REQUEST_DELAY)
+    # One bulk snapshot warms the quote cache for every _scan_ticker call
+    get_current_prices(tickers)
+
+    for ticker, alerts in zip(tickers, fan_out(lambda t: _scan_ticker(t, incremental), tickers)):
+        if isinstance(alerts, Exception):
+            logger.warning("Error scanning %s: %s", ticker, alerts)
+            continue
+        all_unusual.extend(alerts)
 
     # Sort by premium flow descending
     all_unusual.sort(key=lambda x: x.get("premium_flow", 0), reverse=True)
     return all_unusual
 
 
-def _scan_ticker(ticker: str) -> list[dict]:
-    """Scan a single ticker for unusual activity using Polygon snapshot."""
+def _scan_ticker(ticker: str, incremental: bool = False) -> list[dict]:
+    """Scan a single ticker for unusual activity using Polygon snapshot (see scan_unusual)."""
     price = get_current_price(ticker)
     if price <= 0:
         return []
 
     # Scan all expirations from 0 to 180 DTE
-    exp_gte = datetime.now().strftime("%Y-%m-%d")
-    exp_lte = (datetime.now() + timedelta(days=180)).strftime("%Y-%m-%d")
-
-    alerts = []
-    total_call_vol = 0
-    total_put_vol = 0
-
-    # Track ATM OI for magnet detection
-    atm_oi_data = []
+    exp_gte, exp_lte = dte_window(0, 180)
 
     try:
-        for o in _client.list_snapshot_options_chain(
-            ticker,
-            params={
-                "expiration_date.gte": exp_gte,
-                "expiration_date.lte": exp_lte,
-            },
-        ):
-            details = o.details
-            if not details:
-                continue
-
-            side = "CALL" if details.contract_type == "call" else "PUT"
-            strike = float(details.strike_price or 0)
-            exp_date = details.expiration_date or ""
-            contract_symbol = details.ticker or ""
-
-            # Calculate DTE
-            try:
-                exp_dt = datetime.strptime(exp_date, "%Y-%m-%d").date()
-                dte = (exp_dt - datetime.now().date()).days
-            except (ValueError, TypeError):
-                dte = 0
-            is_far_month = dte > 90
-
-            vol = int(o.day.volume) if o.day and o.day.volume else 0
-            oi = int(o.open_interest) if o.open_interest else 0
-            iv = float(o.implied_volatility) if o.implied_volatility else 0
-            bid = float(o.last_quote.bid) if o.last_quote and o.last_quote.bid else 0
-            ask = float(o.last_quote.ask) if o.last_quote and o.last_quote.ask else 0
-            mid_price = (bid + ask) / 2
-            premium_flow = vol * mid_price * 100
-
-            if side == "CALL":
-                total_call_vol += vol
-            else:
-                total_put_vol += vol
-
-            # Track near-ATM OI
-            if price > 0 and abs(strike - price) / price < 0.05:
-                atm_oi_data.append({
-                    "strike": strike, "oi": oi, "type": side,
-                    "expiration": exp_date,
-                })
-
-            # --- Detection Rules ---
-
-            # Rule 1: Volume/OI > 3
-            if oi > 0 and vol / oi > 3 and vol > 100:
-                alerts.append({
-                    "ticker": ticker,
-                    "type": "VOL/OI_SURGE",
-                    "contract": contract_symbol,
-                    "side": side,
-                    "strike": strike,
-                    "expiration": exp_date,
-                    "dte": dte,
-                    "volume": vol,
-                    "open_interest": oi,
-                    "vol_oi_ratio": round(vol / oi, 1),
-                    "iv": round(iv * 100, 1),
-                    "mid_price": round(mid_price, 2),
-                    "premium_flow": round(premium_flow, 0),
-                    "interpretation": f"New positions surging: {vol/oi:.1f}x OI traded today. "
-                                      f"{'Bullish' if side == 'CALL' else 'Bearish'} signal.",
-                })
-
-            # Rule 2: High absolute volume
-            if vol > 5000 and mid_price > 0.10:
-                alerts.append({
-                    "ticker": ticker,
-                    "type": "HIGH_VOLUME",
-                    "contract": contract_symbol,
-                    "side": side,
-                    "strike": strike,
-                    "expiration": exp_date,
-                    "dte": dte,
-                    "volume": vol,
-                    "open_interest": oi,
-                    "iv": round(iv * 100, 1),
-                    "mid_price": round(mid_price, 2),
-                    "premium_flow": round(premium_flow, 0),
-                    "interpretation": f"Heavy {side} activity: {vol:,} contracts traded, "
-                                      f"${premium_flow:,.0f} premium flow.",
-                })
-
-            # Rule 5: Far-month large orders (institutional)
-            if is_far_month and vol > 1000 and premium_flow > 100000:
-                alerts.append({
-                    "ticker": ticker,
-                    "type": "INSTITUTIONAL_FAR_MONTH",
-                    "contract": contract_symbol,
-                    "side": side,
-                    "strike": strike,
-                    "expiration": exp_date,
-                    "dte": dte,
-                    "volume": vol,
-                    "open_interest": oi,
-                    "iv": round(iv * 100, 1),
-                    "mid_price": round(mid_price, 2),
-                    "premium_flow": round(premium_flow, 0),
-                    "interpretation": f"Possible institutional positioning: {dte} DTE, "
-                                      f"${premium_flow:,.0f} flow in far-month {side}.",
-                })
-
+        frame = get_chain(ticker, exp_gte, exp_lte)
     except Exception as e:
         logger.warning("Polygon scan error for %s: %s", ticker, e)
         return []
 
-    # Rule 3: ATM OI accumulation (magnet levels)
-    if atm_oi_data:
-        max_oi_entry = max(atm_oi_data, key=lambda x: x["oi"])
-        if max_oi_entry["oi"] > 10000:
+    if incremental:
+        interval_vol, oi_change, since = chain_diff.interval_flow(ticker, frame)
+        c = _columns(frame, price, volume=interval_vol)
+    else:
+        c = _columns(frame, price)
+    is_call, strike, vol, oi = c["is_call"], c["strike"], c["vol"], c["oi"]
+
+    # --- Contract rules: every mask at once, first matching rule wins ---
+    alerts = []
+    if RULES and len(frame):
+        masks = np.array([when(c) for when, _, _ in RULES.values()])
+        hit = masks.any(axis=0)
+        winner = masks.argmax(axis=0)
+        for r, (name, (_, interpretation, fields)) in enumerate(RULES.items()):
+            rows = np.flatnonzero(hit & (winner == r))
+            batch = _alerts(ticker, frame, c, rows, name, interpretation, fields)
+            if incremental:
+                day_volume = np.nan_to_num(frame.volume[rows]).astype(np.int64).tolist()
+                for a, day_vol, change in zip(batch, day_volume, oi_change[rows].tolist()):
+                    a.update(day_volume=day_vol, oi_change=change, since=since)
+            alerts.extend(batch)
+
+    # --- Chain-level rules ---
+    # ATM OI accumulation (magnet levels)
+    near_atm = np.abs(c["moneyness"]) < 0.05
+    if near_atm.any() and not incremental:
+        i = int(np.argmax(np.where(near_atm, oi, -1)))
+        if oi[i] > 10000:
             alerts.append({
                 "ticker": ticker,
                 "type": "ATM_OI_MAGNET",
-                "side": max_oi_entry["type"],
-                "strike": max_oi_entry["strike"],
-                "expiration": max_oi_entry["expiration"],
-                "open_interest": max_oi_entry["oi"],
+                "side": "CALL" if is_call[i] else "PUT",
+                "strike": float(strike[i]),
+                "expiration": str(frame.expiration[i]),
+                "open_interest": int(oi[i]),
                 "premium_flow": 0,
-                "interpretation": f"Large OI at ${max_oi_entry['strike']:.0f} "
-                                  f"({max_oi_entry['oi']:,} contracts) - potential price magnet.",
+                "interpretation": f"Large OI at ${strike[i]:.0f} "
+                                  f"({oi[i]:,} contracts) - potential price magnet.",
             })
 
-    # Rule 4: Extreme P/C volume ratio
+    # Extreme P/C volume ratio
+    total_call_vol = int(vol[is_call].sum())
+    total_put_vol = int(vol[~is_call].sum())
     if total_call_vol > 0:
         pc_ratio = total_put_vol / total_call_vol
         if pc_ratio > 1.5 or pc_ratio < 0.5:
@@ -196,15 +166,63 @@ def _scan_ticker(ticker: str) -> list[dict]:
                 "interpretation": f"Put/Call ratio {pc_ratio:.2f} - {sentiment}.",
             })
 
-    # Deduplicate: keep highest premium_flow per contract
-    seen = {}
-    for a in alerts:
-        key = a.get("contract", "") or f"{a['ticker']}_{a['type']}_{a.get('strike', '')}"
-        if key not in seen or a.get("premium_flow", 0) > seen[key].get("premium_flow", 0):
-            seen[key] = a
-    unique_alerts = list(seen.values())
+    return alerts
+
 
-    return unique_alerts
+def _columns(frame, price: float, volume: np.ndarray = None) -> dict[str, np.ndarray]:
+    """
+    Chain columns the rules are written against (one array per column,
+    aligned by contract). `volume` overrides the day volume, e.g. with the
+    interval volume; premium_flow and vol_oi follow it.
+    """
+    vol = np.nan_to_num(frame.volume if volume is None else volume).astype(np.int64)
+    oi = np.nan_to_num(frame.open_interest).astype(np.int64)
+    strike = np.nan_to_num(frame.strike)
+    mid = frame.mid()
+    return {
+        "is_call": frame.is_call,
+        "strike": strike,
+        "dte": frame.dte(),
+        "vol": vol,
+        "oi": oi,
+        "iv": np.nan_to_num(frame.iv),
+        "mid": mid,
+        "premium_flow": vol * mid * 100,
+        "vol_oi": np.divide(vol, oi, out=np.zeros(len(frame)), where=oi > 0),
+        "moneyness": (strike - price) / price,
+    }
+
+
+def _alerts(ticker: str, frame, c: dict, rows: np.ndarray, alert_type: str,
+            interpretation: str, fields: dict) -> list[dict]:
+    """Alert dicts for the contract rows reported by rule `alert_type` (columns sliced once)."""
+    is_call = c["is_call"][rows].tolist()
+    extra = {field: [round(v, digits) for v in c[column][rows].tolist()]
+             for field, (column, digits) in fields.items()}
+    alerts = []
+    for k, (symbol, strike, expiration, dte, volume, oi, iv, mid, flow) in enumerate(zip(
+            frame.symbol[rows].tolist(), c["strike"][rows].tolist(), frame.expiration[rows].tolist(),
+            c["dte"][rows].tolist(), c["vol"][rows].tolist(), c["oi"][rows].tolist(),
+            c["iv"][rows].tolist(), c["mid"][rows].tolist(), c["premium_flow"][rows].tolist())):
+        a = {
+            "ticker": ticker,
+            "type": alert_type,
+            "contract": symbol,
+            "side": "CALL" if is_call[k] else "PUT",
+            "strike": float(strike),
+            "expiration": str(expiration),
+            "dte": int(dte),
+            "volume": int(volume),
+            "open_interest": int(oi),
+            "iv": round(iv * 100, 1),
+            "mid_price": round(mid, 2),
+            "premium_flow": round(flow, 0),
+        }
+        for field, values in extra.items():
+            a[field] = values[k]
+        a["interpretation"] = interpretation.format(**a, bias="Bullish" if is_call[k] else "Bearish")
+        alerts.append(a)
+    return alerts
 
 
 if __name__ == "__main__":